@@ -0,0 +1,336 @@
+"""
+Image asset pipeline for the Discord Server Cloner.
+
+Emoji and server images are downloaded from the Discord CDN by a bounded
+pool of worker threads, streamed into a content-addressed disk cache and
+handed out as data URIs ready for upload. Emoji images never change for a
+given emoji ID and server images are named by their hash, so a cached file
+never has to be revalidated.
+"""
+
+import base64
+import json
+import logging
+import os
+import tempfile
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional, Dict, Any, Iterable
+
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+
+DISCORD_CDN_BASE_URL = os.environ.get("DISCORD_CDN_BASE_URL", "https://cdn.discordapp.com")
+DEFAULT_ASSET_DIR = os.path.join(".cache", "assets")
+DEFAULT_ASSET_WORKERS = 4  # Concurrent CDN downloads
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+CONTENT_TYPES = {
+    "png": "image/png",
+    "gif": "image/gif",
+    "jpg": "image/jpeg",
+    "webp": "image/webp"
+}
+
+# Server image fields and their CDN directories
+GUILD_ASSET_FIELDS = {
+    "icon": "icons",
+    "banner": "banners",
+    "splash": "splashes",
+    "discovery_splash": "discovery-splashes"
+}
+
+# Server features needed to set an image, the icon needs none
+GUILD_ASSET_FEATURES = {
+    "banner": "BANNER",
+    "splash": "INVITE_SPLASH",
+    "discovery_splash": "DISCOVERABLE"
+}
+
+
+def emoji_asset_path(emoji_id: str, animated: bool = False) -> str:
+    """
+    Get the CDN path of an emoji image.
+
+    Args:
+        emoji_id: ID of the emoji
+        animated: Whether the emoji is animated
+
+    Returns:
+        CDN path such as "emojis/123.png"
+    """
+    extension = "gif" if animated else "png"
+    return f"emojis/{emoji_id}.{extension}"
+
+
+def guild_asset_paths(server_info: Dict[str, Any]) -> Dict[str, str]:
+    """
+    Get the CDN paths of a server's icon, banner and splash images.
+
+    Args:
+        server_info: Server data
+
+    Returns:
+        Mapping of server field to CDN path, for the images that are set
+    """
+    paths = {}
+    for field, directory in GUILD_ASSET_FIELDS.items():
+        image_hash = server_info.get(field)
+        if image_hash:
+            extension = "gif" if image_hash.startswith("a_") else "png"
+            paths[field] = f"{directory}/{server_info['id']}/{image_hash}.{extension}"
+    return paths
+
+
+def to_data_uri(asset_path: str, content: bytes) -> str:
+    """
+    Encode an image as a data URI for the Discord API.
+
+    Args:
+        asset_path: CDN path of the image, its extension gives the type
+        content: Image bytes
+
+    Returns:
+        Data URI of the image
+    """
+    extension = asset_path.rsplit(".", 1)[-1].lower()
+    content_type = CONTENT_TYPES.get(extension, "image/png")
+    return f"data:{content_type};base64,{base64.b64encode(content).decode('ascii')}"
+
+
+class AssetCache:
+    """Disk cache of CDN images keyed by their CDN path."""
+
+    def __init__(self, directory: str = DEFAULT_ASSET_DIR) -> None:
+        """
+        Create a cache.
+
+        Args:
+            directory: Directory holding the cached images
+        """
+        self.directory = directory
+        self._uploads: Optional[Dict[str, str]] = None
+        self._lock = threading.Lock()
+
+    def path(self, asset_path: str) -> str:
+        """
+        Get the file holding an image.
+
+        Args:
+            asset_path: CDN path of the image
+
+        Returns:
+            Path of the cache file
+        """
+        return os.path.join(self.directory, *asset_path.split("/"))
+
+    def get(self, asset_path: str) -> Optional[bytes]:
+        """
+        Read a cached image.
+
+        Args:
+            asset_path: CDN path of the image
+
+        Returns:
+            Image bytes, None if the image is not cached
+        """
+        try:
+            with open(self.path(asset_path), "rb") as file:
+                return file.read()
+        except OSError:
+            return None
+
+    def put(self, asset_path: str, chunks: Iterable[bytes]) -> bytes:
+        """
+        Stream an image into the cache.
+
+        The image is written under a temporary name of its own and moved
+        into place when complete, so concurrent readers never see a partial
+        file and concurrent writers never write into the same one.
+
+        Args:
+            asset_path: CDN path of the image
+            chunks: Image bytes in chunks
+
+        Returns:
+            Image bytes
+        """
+        path = self.path(asset_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        file = tempfile.NamedTemporaryFile(
+            dir=os.path.dirname(path), prefix=f"{os.path.basename(path)}.", suffix=".tmp", delete=False
+        )
+        try:
+            with file:
+                for chunk in chunks:
+                    file.write(chunk)
+            os.replace(file.name, path)
+        except BaseException:
+            os.remove(file.name)
+            raise
+        return self.get(asset_path) or b""
+
+    def _uploads_path(self) -> str:
+        return os.path.join(self.directory, "uploads.json")
+
+    def _load_uploads(self) -> Dict[str, str]:
+        if self._uploads is None:
+            try:
+                with open(self._uploads_path(), encoding="utf-8") as file:
+                    self._uploads = json.load(file)
+            except (OSError, ValueError):
+                self._uploads = {}
+        return self._uploads
+
+    def uploaded_hash(self, source_hash: str) -> Optional[str]:
+        """
+        Get the hash Discord gave an image when it was uploaded before.
+
+        Args:
+            source_hash: Hash of the image in the source server
+
+        Returns:
+            Hash of the uploaded image, None if it was never uploaded
+        """
+        with self._lock:
+            return self._load_uploads().get(source_hash)
+
+    def record_upload(self, source_hash: str, target_hash: str) -> None:
+        """
+        Remember the hash Discord gave an uploaded image.
+
+        Args:
+            source_hash: Hash of the image in the source server
+            target_hash: Hash of the image in the target server
+        """
+        with self._lock:
+            uploads = self._load_uploads()
+            if uploads.get(source_hash) == target_hash:
+                return
+            uploads[source_hash] = target_hash
+            temporary_path = f"{self._uploads_path()}.tmp"
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                with open(temporary_path, "w", encoding="utf-8") as file:
+                    json.dump(uploads, file)
+                os.replace(temporary_path, self._uploads_path())
+            except OSError as e:
+                logging.warning(f"Could not record uploaded image {source_hash}: {e}")
+
+
+class AssetFetcher:
+    """
+    Downloads CDN images on a bounded worker pool.
+
+    prefetch() starts downloads in the background, so they overlap with role
+    and channel creation; get() then waits only for images that are not done
+    yet.
+    """
+
+    def __init__(
+        self,
+        cdn_base_url: str = DISCORD_CDN_BASE_URL,
+        cache: Optional[AssetCache] = None,
+        workers: int = DEFAULT_ASSET_WORKERS,
+        timeout: float = 30.0,
+        transport: Optional[BaseAdapter] = None
+    ) -> None:
+        """
+        Create a fetcher.
+
+        Args:
+            cdn_base_url: Discord CDN base URL
+            cache: Disk cache to read from and fill, None to always download
+            workers: Number of concurrent downloads
+            timeout: Download timeout in seconds
+            transport: Adapter sending the requests, such as a cassette
+                recorder or player, pooled connections by default
+        """
+        self.cdn_base_url = cdn_base_url.rstrip("/")
+        self.cache = cache
+        self.timeout = timeout
+        self.hits = 0
+        self.downloads = 0
+        self._lock = threading.Lock()
+
+        # The CDN needs no authorization, so the bot token is never sent there
+        self.session = requests.Session()
+        adapter = transport or HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="assets")
+        self._futures: Dict[str, Future] = {}
+
+    def fetch(self, asset_path: str) -> Optional[str]:
+        """
+        Get an image as a data URI, from the cache or the CDN.
+
+        Args:
+            asset_path: CDN path of the image
+
+        Returns:
+            Data URI of the image, None if it could not be downloaded
+        """
+        content = self.cache.get(asset_path) if self.cache else None
+        if content is not None:
+            with self._lock:
+                self.hits += 1
+            return to_data_uri(asset_path, content)
+
+        url = f"{self.cdn_base_url}/{asset_path}"
+        try:
+            with self.session.get(url, stream=True, timeout=self.timeout) as response:
+                response.raise_for_status()
+                chunks = response.iter_content(DOWNLOAD_CHUNK_SIZE)
+                if self.cache:
+                    content = self.cache.put(asset_path, chunks)
+                else:
+                    content = b"".join(chunks)
+        except (requests.exceptions.RequestException, OSError) as e:
+            logging.error(f"Failed to download {asset_path}: {e}")
+            return None
+
+        with self._lock:
+            self.downloads += 1
+        return to_data_uri(asset_path, content)
+
+    def prefetch(self, asset_paths: Iterable[str]) -> None:
+        """
+        Start downloading images in the background.
+
+        Args:
+            asset_paths: CDN paths of the images
+        """
+        for asset_path in asset_paths:
+            self._future(asset_path)
+
+    def get(self, asset_path: str) -> Optional[str]:
+        """
+        Get an image as a data URI, waiting for its download if it was prefetched.
+
+        Args:
+            asset_path: CDN path of the image
+
+        Returns:
+            Data URI of the image, None if it could not be downloaded
+        """
+        return self._future(asset_path).result()
+
+    def _future(self, asset_path: str) -> Future:
+        # Targets cloned in parallel ask for the same images, each is downloaded once
+        with self._lock:
+            if asset_path not in self._futures:
+                self._futures[asset_path] = self._executor.submit(self.fetch, asset_path)
+            return self._futures[asset_path]
+
+    def close(self) -> None:
+        """Stop the workers and close the CDN connections."""
+        self._executor.shutdown(wait=True)
+        self.session.close()
+
+    def __enter__(self) -> "AssetFetcher":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
@@ -0,0 +1,395 @@
+"""
+Asyncio clone engine for the Discord Server Cloner.
+
+Runs the operation graph of a clone with aiohttp, starting independent
+Discord API calls concurrently. The number of requests in flight is capped,
+and the rate limiter and any adaptive concurrency controller are shared
+with the blocking client.
+"""
+
+import asyncio
+import functools
+import logging
+import time
+from typing import Optional, Any, Tuple
+
+import aiohttp
+import requests
+
+from cloner import (
+    DEFAULT_CONCURRENCY,
+    DEFAULT_CONNECT_TIMEOUT,
+    DEFAULT_TIMEOUT,
+    DISCORD_API_BASE_URL,
+    CREATE_CHECK_INTERVAL,
+    MAX_NETWORK_RETRIES,
+    MAX_RETRIES,
+    TRANSIENT_STATUS_CODES,
+    DiscordClient,
+    RateLimiter,
+    RATE_LIMITER,
+    get_headers,
+    is_global_limit,
+    network_retry_delay,
+    request_was_sent,
+    route_key,
+)
+from concurrency import ConcurrencyController
+from metrics import METRICS, Metrics
+from state import StateCache
+from scheduler import Task, TaskGraph
+
+
+class AsyncDiscordClient:
+    """
+    Asynchronous Discord API client with a bounded number of in-flight requests.
+
+    Must be used as an async context manager so the aiohttp session is
+    created inside the running event loop.
+    """
+
+    def __init__(
+        self,
+        token: str,
+        concurrency: int = DEFAULT_CONCURRENCY,
+        timeout: float = DEFAULT_TIMEOUT,
+        base_url: str = DISCORD_API_BASE_URL,
+        rate_limiter: Optional[RateLimiter] = None,
+        metrics: Optional[Metrics] = None,
+        concurrency_controller: Optional[ConcurrencyController] = None,
+        state_cache: Optional[StateCache] = None,
+        connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+        max_network_retries: int = MAX_NETWORK_RETRIES,
+        transport_session: Optional[requests.Session] = None
+    ) -> None:
+        """
+        Create a client.
+
+        Args:
+            token: Discord bot token
+            concurrency: Maximum number of requests in flight
+            timeout: Seconds to wait for each read of a response
+            base_url: Discord API base URL
+            rate_limiter: Rate limiter to use, shared RATE_LIMITER by default
+            metrics: Collector of request metrics, shared METRICS by default
+            concurrency_controller: Adaptive limit on the requests in flight
+                below concurrency, None to keep concurrency fixed
+            state_cache: Server states to apply writes to, a new one by default
+            connect_timeout: Seconds to wait for a connection
+            max_network_retries: Retries for requests that timed out, lost
+                their connection or got a 5xx response
+            transport_session: Blocking session whose transport, such as a
+                cassette recorder or player, sends the requests on worker
+                threads instead of aiohttp
+        """
+        self.token = token
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.max_network_retries = max_network_retries
+        self.transport_session = transport_session
+        self.base_url = base_url.rstrip("/")
+        self.rate_limiter = rate_limiter or RATE_LIMITER
+        self.metrics = metrics or METRICS
+        self.concurrency_controller = concurrency_controller
+        self.state_cache = state_cache if state_cache is not None else StateCache()
+        self.session: Optional[aiohttp.ClientSession] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    @classmethod
+    def from_client(cls, client: DiscordClient, concurrency: int = DEFAULT_CONCURRENCY) -> "AsyncDiscordClient":
+        """
+        Create an async client with the same settings, rate limiter, metrics,
+        concurrency controller and state cache as a blocking client.
+
+        Args:
+            client: Blocking Discord API client
+            concurrency: Maximum number of requests in flight
+
+        Returns:
+            New asynchronous client
+        """
+        return cls(
+            client.token,
+            concurrency=concurrency,
+            timeout=client.timeout,
+            base_url=client.base_url,
+            rate_limiter=client.rate_limiter,
+            metrics=client.metrics,
+            concurrency_controller=client.concurrency_controller,
+            state_cache=client.state_cache,
+            connect_timeout=client.connect_timeout,
+            max_network_retries=client.max_network_retries,
+            transport_session=client.session if client.transport is not None else None
+        )
+
+    def url(self, path: str) -> str:
+        """
+        Build the full URL for an API path.
+
+        Args:
+            path: API path starting with a slash, e.g. "/guilds/123"
+
+        Returns:
+            Full request URL
+        """
+        return f"{self.base_url}{path}"
+
+    async def __aenter__(self) -> "AsyncDiscordClient":
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self.session = aiohttp.ClientSession(
+            headers=get_headers(self.token),
+            timeout=aiohttp.ClientTimeout(sock_connect=self.connect_timeout, sock_read=self.timeout),
+            connector=aiohttp.TCPConnector(limit=self.concurrency)
+        )
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.session.close()
+
+
+async def make_request_async(
+    client: AsyncDiscordClient,
+    method: str,
+    path: str,
+    json_data: Optional[Any] = None,
+    operation_name: str = "API request"
+) -> Optional[Any]:
+    """
+    Make an asynchronous HTTP request to Discord API.
+
+    Behaves like cloner.make_request: rate limit buckets are shared with the
+    blocking path, 429 responses are retried up to MAX_RETRIES times,
+    network failures and 5xx responses are retried with jittered backoff
+    once a create is known not to have gone through, and successful writes
+    are applied to the state cache.
+
+    Args:
+        client: Asynchronous Discord API client
+        method: HTTP method (GET, POST, PUT, DELETE, PATCH)
+        path: API path starting with a slash
+        json_data: Optional JSON data for request body
+        operation_name: Description of operation for logging
+
+    Returns:
+        Response JSON for successful requests, status code for DELETE and
+        empty responses, None on error
+    """
+    method = method.upper()
+    url = client.url(path)
+    route = route_key(method, url)
+    controller = client.concurrency_controller
+    rate_limit_retries = 0
+    network_retries = 0
+
+    # Lost creates are told apart from identical ones still in flight (see StateCache.creating)
+    with client.state_cache.creating(method, path, json_data):
+        while True:
+            retried = rate_limit_retries + network_retries > 0
+            status, headers, body, error = None, {}, None, None
+            # The slot is held per attempt, so backoff sleeps and the checks
+            # before a retry do not keep other requests from being sent
+            async with client._semaphore:
+                throttled = 0.0
+                delay = client.rate_limiter.reserve(route)
+                while delay > 0:
+                    await asyncio.sleep(delay)
+                    throttled += delay
+                    delay = client.rate_limiter.reserve(route)
+                if controller:
+                    await controller.acquire_async()
+
+                started = time.monotonic()
+                try:
+                    if client.transport_session is not None:
+                        status, headers, body = await send_with_transport(client, method, url, json_data)
+                    else:
+                        async with client.session.request(method, url, json=json_data) as response:
+                            status = response.status
+                            headers = response.headers
+                            if response.content_type == "application/json":
+                                body = await response.json()
+                except (aiohttp.ClientError, asyncio.TimeoutError, requests.exceptions.RequestException) as e:
+                    error = e
+                finally:
+                    # Also give the slot back when the request is cancelled
+                    if controller:
+                        controller.release(
+                            started, time.monotonic() - started, status,
+                            status == 429 and is_global_limit(headers, body)
+                        )
+                client.metrics.record_request(method, path, status, time.monotonic() - started, throttled, retried)
+
+            if error is not None or status in TRANSIENT_STATUS_CODES:
+                failure = f"Request error during {operation_name}: {error!r}" if error is not None \
+                    else f"HTTP error during {operation_name}: {status} {body}"
+                if network_retries < client.max_network_retries:
+                    # A request that never connected cannot have created anything
+                    if isinstance(error, requests.exceptions.RequestException):
+                        sent = request_was_sent(error)
+                    else:
+                        sent = not isinstance(error, aiohttp.ClientConnectorError)
+                    safe, created = await retry_safety_async(client, method, path, json_data, operation_name) \
+                        if sent else (True, None)
+                    if created is not None:
+                        return created
+                    if safe:
+                        delay = network_retry_delay(network_retries)
+                        network_retries += 1
+                        logging.warning(f"{failure}. Retrying in {delay:.2f}s.")
+                        await asyncio.sleep(delay)
+                        continue
+                logging.error(failure)
+                return None
+
+            retry_after = client.rate_limiter.update(route, headers, status, body)
+
+            if status == 429:
+                if rate_limit_retries < MAX_RETRIES:
+                    rate_limit_retries += 1
+                    logging.warning(f"Rate limited during {operation_name}, retrying in {retry_after:.2f}s.")
+                    continue
+                logging.error(f"Rate limited during {operation_name}, giving up after {MAX_RETRIES} retries.")
+                return None
+
+            if status == 403:
+                logging.warning(f"Insufficient permissions for {operation_name}.")
+                return None
+            if status >= 400:
+                logging.error(f"HTTP error during {operation_name}: {status} {body}")
+                return None
+
+            # Return status code for DELETE and empty responses, JSON for others
+            result = status if method == "DELETE" or body is None else body
+            client.state_cache.record(method, path, json_data, result)
+            return result
+
+
+async def send_with_transport(
+    client: AsyncDiscordClient,
+    method: str,
+    url: str,
+    json_data: Optional[Any]
+) -> Tuple[int, Any, Optional[Any]]:
+    """
+    Send a request through the client's blocking transport session on a worker thread.
+
+    Args:
+        client: Asynchronous Discord API client with a transport_session
+        method: HTTP method
+        url: Full request URL
+        json_data: Optional JSON data for request body
+
+    Returns:
+        Tuple of (status code, response headers, decoded JSON body or None)
+    """
+    response = await asyncio.get_running_loop().run_in_executor(None, functools.partial(
+        client.transport_session.request, method, url, json=json_data,
+        timeout=(client.connect_timeout, client.timeout)
+    ))
+    body = None
+    if response.headers.get("Content-Type", "").split(";")[0] == "application/json":
+        try:
+            body = response.json()
+        except ValueError:
+            body = None
+    return response.status_code, response.headers, body
+
+
+async def retry_safety_async(
+    client: AsyncDiscordClient,
+    method: str,
+    path: str,
+    json_data: Optional[Any],
+    operation_name: str
+) -> Tuple[bool, Optional[Any]]:
+    """
+    Check whether a failed request may be retried without duplicating a create.
+
+    Asynchronous version of cloner.retry_safety.
+
+    Args:
+        client: Asynchronous Discord API client
+        method: HTTP method of the failed request
+        path: API path of the failed request
+        json_data: JSON body that was sent
+        operation_name: Description of operation for logging
+
+    Returns:
+        Tuple of (whether the request can be sent again, the object it
+        created if it went through)
+    """
+    if method != "POST":
+        return True, None
+    list_path = client.state_cache.create_list_path(method, path)
+    listed = None
+    with client.state_cache.checking(path, json_data):
+        if list_path is not None:
+            deadline = time.monotonic() + client.timeout
+            while client.state_cache.awaiting_response(path, json_data) and time.monotonic() < deadline:
+                await asyncio.sleep(CREATE_CHECK_INTERVAL)
+            listed = await make_request_async(
+                client, "GET", list_path, operation_name=f"checking whether {operation_name} went through"
+            )
+        if not isinstance(listed, list):
+            logging.warning(f"Not retrying {operation_name}, it may have gone through.")
+            return False, None
+        safe, created = client.state_cache.find_created(path, json_data, listed)
+    if created is not None:
+        operation = operation_name[:1].upper() + operation_name[1:]
+        logging.info(f"{operation} went through before the error, not sending it again.")
+    return safe, created
+
+
+async def run_graph_async(client: AsyncDiscordClient, graph: TaskGraph) -> None:
+    """
+    Run every task of a graph, starting each one as soon as its dependencies are done.
+
+    The number of requests in flight is capped by the client's concurrency.
+
+    Args:
+        client: Asynchronous Discord API client
+        graph: Tasks to run
+    """
+    async def run(task: Task) -> Tuple[Task, Optional[Any]]:
+        task.started_at = time.monotonic()
+        try:
+            if task.blocking:
+                # Keep the event loop free while build() waits, e.g. on a download
+                spec = await asyncio.get_running_loop().run_in_executor(None, task.build)
+            else:
+                spec = task.build()
+            if spec is None:
+                task.skipped = True
+                return task, None
+            path, json_data = spec
+            return task, await make_request_async(client, task.method, path, json_data, task.operation_name)
+        except Exception as e:
+            logging.error(f"Unexpected error during {task.operation_name}: {e}")
+            return task, None
+        finally:
+            task.finished_at = time.monotonic()
+
+    running = {asyncio.ensure_future(run(task)) for task in graph.ready()}
+    while running:
+        finished, running = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+        for future in finished:
+            task, result = future.result()
+            for ready_task in graph.complete(task, result):
+                running.add(asyncio.ensure_future(run(ready_task)))
+
+
+def run_graph_with_client(client: DiscordClient, graph: TaskGraph, concurrency: int = DEFAULT_CONCURRENCY) -> None:
+    """
+    Run a task graph with the asyncio engine from blocking code.
+
+    Args:
+        client: Blocking client whose token, settings and rate limiter are reused
+        graph: Tasks to run
+        concurrency: Maximum number of requests in flight
+    """
+    async def run() -> None:
+        async with AsyncDiscordClient.from_client(client, concurrency) as async_client:
+            await run_graph_async(async_client, graph)
+
+    asyncio.run(run())
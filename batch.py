@@ -0,0 +1,378 @@
+"""
+Non-interactive batch runner for the Discord Server Cloner.
+
+Runs the clone jobs listed in a JSON job file without any prompts, so bulk
+re-syncs can run from cron or CI. The bot token is read from the
+DISCORD_BOT_TOKEN environment variable. Jobs run on a bounded worker pool,
+a failing job never stops the others, and the result of every job is
+written as one JSON line.
+
+Job file format:
+
+    {
+        "defaults": {"mode": "reconcile", "engine": "async"},
+        "jobs": [
+            {"id": "eu", "source": "111", "targets": ["222", "333"]},
+            {"snapshot": "template.snapshot", "target": "444", "notify": "555"}
+        ]
+    }
+
+Job options: id, source or snapshot, target or targets, mode ("full" or
+"reconcile"), engine ("sync" or "async"), concurrency, resume, cache_ttl,
+notify (ID of a user to DM the outcome to) and filter (a partial clone's
+patterns, e.g. {"include_categories": ["events"], "exclude_types": ["voice"]},
+see filters.CloneFilter). Options missing from a job are taken from
+"defaults".
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, List, Any
+
+from colorama import Fore
+
+from assets import DISCORD_CDN_BASE_URL, AssetCache, AssetFetcher
+from cache import SourceCache
+from cloner import (
+    DEFAULT_CONCURRENCY,
+    DEFAULT_PARALLEL_TARGETS,
+    DEFAULT_POOL_SIZE,
+    DISCORD_API_BASE_URL,
+    MAX_ADAPTIVE_CONCURRENCY,
+    TOKEN_ENV_VAR,
+    DiscordClient,
+    add_network_arguments,
+    clone_to_targets,
+    network_options,
+    report_metrics,
+)
+from concurrency import ConcurrencyController
+from filters import CloneFilter
+from journal import DEFAULT_JOURNAL_DIR
+from metrics import METRICS
+
+DEFAULT_JOB_WORKERS = 2  # Jobs run at the same time
+
+JOB_DEFAULTS = {
+    "mode": "full",
+    "engine": "sync",
+    "concurrency": 1,
+    "resume": False,
+    "cache_ttl": 0
+}
+
+
+class JobError(Exception):
+    """Raised when a job file or a job in it is invalid."""
+
+
+def load_jobs(path: str) -> List[Dict[str, Any]]:
+    """
+    Read a job file and fill in the defaults of every job.
+
+    Args:
+        path: Job file to read
+
+    Returns:
+        Jobs with all options set
+
+    Jobs that clone into the same server as another job would write the
+    same journal at once, they are marked so that they fail alone when run.
+
+    Raises:
+        JobError: If the file cannot be read, has no jobs or its defaults
+            are not an object
+    """
+    try:
+        with open(path, encoding="utf-8") as file:
+            document = json.load(file)
+    except (OSError, ValueError) as e:
+        raise JobError(f"Could not read job file {path}: {e}")
+
+    if isinstance(document, list):
+        document = {"jobs": document}
+    if not isinstance(document, dict) or not isinstance(document.get("jobs"), list):
+        raise JobError(f"{path} has no list of jobs.")
+    if not document["jobs"]:
+        raise JobError(f"{path} lists no jobs.")
+
+    if not isinstance(document.get("defaults", {}), dict):
+        raise JobError(f"{path} has defaults that are not an object.")
+
+    defaults = dict(JOB_DEFAULTS, **document.get("defaults", {}))
+    jobs = []
+    for index, job in enumerate(document["jobs"]):
+        job = dict(defaults, **job) if isinstance(job, dict) else {"invalid": job}
+        job["id"] = str(job.get("id", index + 1))
+        jobs.append(job)
+
+    owners: Dict[str, Dict[str, Any]] = {}
+    for job in jobs:
+        for target in set(job_targets(job)):
+            owner = owners.setdefault(target, job)
+            if owner is not job:
+                conflict = f"jobs {owner['id']} and {job['id']} both clone into server {target}"
+                owner.setdefault("conflict", conflict)
+                job.setdefault("conflict", conflict)
+    return jobs
+
+
+def job_targets(job: Dict[str, Any]) -> List[str]:
+    """
+    Get the target server IDs of a job.
+
+    Args:
+        job: Job with defaults filled in
+
+    Returns:
+        IDs from "targets", or from "target" when there is no list
+    """
+    targets = job.get("targets") or ([job["target"]] if job.get("target") else [])
+    return [str(target) for target in targets] if isinstance(targets, list) else [str(targets)]
+
+
+def validate_job(job: Dict[str, Any]) -> List[str]:
+    """
+    Check a job and normalise its target list and filter.
+
+    Args:
+        job: Job with defaults filled in, its "targets" is set from "target"
+            and its "filter" replaced by a CloneFilter
+
+    Returns:
+        Target server IDs of the job
+
+    Raises:
+        JobError: If an option is missing or invalid
+    """
+    if "invalid" in job:
+        raise JobError("a job must be an object")
+    if "conflict" in job:
+        raise JobError(job["conflict"])
+
+    targets = job_targets(job)
+    if not targets:
+        raise JobError("no target server")
+    if len(set(targets)) < len(targets):
+        raise JobError("a target server is listed twice")
+    if not job.get("snapshot") and not job.get("source"):
+        raise JobError("no source server or snapshot")
+
+    ids = targets + [str(job[field]) for field in ("source", "notify") if job.get(field)]
+    for value in ids:
+        if not value.isdigit():
+            raise JobError(f"server and user IDs must be numeric, got {value!r}")
+    if job["mode"] not in ("full", "reconcile"):
+        raise JobError(f"unknown mode {job['mode']!r}")
+    if job["engine"] not in ("sync", "async"):
+        raise JobError(f"unknown engine {job['engine']!r}")
+    if job.get("filter") and not isinstance(job["filter"], CloneFilter):
+        if not isinstance(job["filter"], dict):
+            raise JobError("filter must be an object")
+        try:
+            clone_filter = CloneFilter.from_dict(job["filter"])
+        except ValueError as e:
+            raise JobError(str(e))
+        job["filter"] = None if clone_filter.is_empty() else clone_filter
+    return targets
+
+
+def run_job(client: DiscordClient, job: Dict[str, Any], assets: AssetFetcher) -> Dict[str, Any]:
+    """
+    Run one job.
+
+    Args:
+        client: Discord API client shared by all jobs
+        job: Job with defaults filled in
+        assets: Asset fetcher shared by all jobs
+
+    Returns:
+        Result of the job with one entry per target
+    """
+    started = time.monotonic()
+    result: Dict[str, Any] = {"job": job.get("id"), "success": False, "targets": [], "error": None}
+
+    try:
+        targets = validate_job(job)
+        source_id = str(job["source"]) if job.get("source") else None
+        source_cache = SourceCache(float(job["cache_ttl"])) if float(job["cache_ttl"]) > 0 else None
+
+        logging.info(Fore.CYAN + f"Job {job['id']}: cloning {source_id or job['snapshot']} "
+                     f"into {len(targets)} servers.")
+        clone_results = clone_to_targets(
+            client, source_id, targets,
+            str(job["notify"]) if job.get("notify") else None,
+            engine=job["engine"],
+            concurrency=int(job["concurrency"]),
+            mode=job["mode"],
+            snapshot_path=job.get("snapshot"),
+            source_cache=source_cache,
+            assets=assets,
+            journal_dir=DEFAULT_JOURNAL_DIR,
+            resume=bool(job["resume"]),
+            parallel_targets=min(DEFAULT_PARALLEL_TARGETS, len(targets)),
+            clone_filter=job.get("filter") or None
+        )
+        result["targets"] = [clone_result.to_dict() for clone_result in clone_results]
+        result["success"] = all(clone_result.success for clone_result in clone_results)
+    except Exception as e:
+        logging.error(Fore.RED + f"Job {job.get('id')} failed: {e}")
+        result["error"] = str(e)
+
+    result["elapsed"] = round(time.monotonic() - started, 3)
+    return result
+
+
+def run_jobs(
+    jobs: List[Dict[str, Any]],
+    token: str,
+    results_path: Optional[str] = None,
+    workers: int = DEFAULT_JOB_WORKERS,
+    base_url: str = DISCORD_API_BASE_URL,
+    cdn_base_url: str = DISCORD_CDN_BASE_URL,
+    concurrency_controller: Optional[ConcurrencyController] = None,
+    client_options: Optional[Dict[str, Any]] = None
+) -> List[Dict[str, Any]]:
+    """
+    Run clone jobs on a worker pool.
+
+    All jobs share one client, so they share one rate limiter and
+    concurrency controller, and one asset fetcher, so an image used by
+    several jobs is downloaded once.
+
+    Args:
+        jobs: Jobs with defaults filled in (see load_jobs)
+        token: Discord bot token
+        results_path: JSON Lines file the result of every job is appended
+            to as soon as the job finishes, None to not write results
+        workers: Number of jobs run at the same time
+        base_url: Discord API base URL
+        cdn_base_url: Discord CDN base URL
+        concurrency_controller: Adaptive limit on the requests in flight
+            over all jobs, None to use the concurrency of each job
+        client_options: Further DiscordClient arguments, such as timeouts
+
+    Returns:
+        Result of every job, in the order of jobs
+    """
+    write_lock = threading.Lock()
+    results_file = open(results_path, "a", encoding="utf-8") if results_path else None
+
+    # Enough pooled connections for every request that can be in flight
+    pool_size = max(DEFAULT_POOL_SIZE, workers * DEFAULT_PARALLEL_TARGETS * DEFAULT_CONCURRENCY)
+
+    try:
+        with DiscordClient(
+            token, pool_size=pool_size, base_url=base_url, concurrency_controller=concurrency_controller,
+            **(client_options or {})
+        ) as client, \
+                AssetFetcher(cdn_base_url, cache=AssetCache()) as assets:
+            def run(job: Dict[str, Any]) -> Dict[str, Any]:
+                result = run_job(client, job, assets)
+                if results_file:
+                    with write_lock:
+                        results_file.write(json.dumps(result) + "\n")
+                        results_file.flush()
+                return result
+
+            with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+                return list(executor.map(run, jobs))
+    finally:
+        if results_file:
+            results_file.close()
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """
+    Parse command line options.
+
+    Args:
+        argv: Arguments to parse, sys.argv by default
+
+    Returns:
+        Parsed options
+    """
+    parser = argparse.ArgumentParser(
+        description=f"Run the clone jobs of a job file. The bot token is read from {TOKEN_ENV_VAR}."
+    )
+    parser.add_argument("jobs", metavar="JOB_FILE", help="JSON file listing the clone jobs")
+    parser.add_argument(
+        "--results", metavar="FILE", default="results.jsonl",
+        help="JSON Lines file the result of every job is appended to (default: results.jsonl)"
+    )
+    parser.add_argument(
+        "--workers", metavar="N", type=int, default=DEFAULT_JOB_WORKERS,
+        help=f"number of jobs run at the same time (default: {DEFAULT_JOB_WORKERS})"
+    )
+    parser.add_argument(
+        "--adaptive-concurrency", action="store_true",
+        help=f"adapt the number of requests in flight over all jobs to 429s and latency, "
+             f"up to {MAX_ADAPTIVE_CONCURRENCY}"
+    )
+    parser.add_argument(
+        "--api-base-url", metavar="URL", default=DISCORD_API_BASE_URL,
+        help="send Discord API requests to this URL, such as a local mock server"
+    )
+    parser.add_argument(
+        "--cdn-base-url", metavar="URL", default=DISCORD_CDN_BASE_URL,
+        help="download emoji and server images from this CDN"
+    )
+    parser.add_argument(
+        "--metrics-json", metavar="FILE",
+        help="write request and phase metrics of all jobs to a JSON file"
+    )
+    parser.add_argument(
+        "--metrics-prom", metavar="FILE",
+        help="write request and phase metrics of all jobs in Prometheus text format"
+    )
+    add_network_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Entry point of the batch runner.
+
+    Args:
+        argv: Command line arguments, sys.argv by default
+
+    Returns:
+        Exit status: 0 if every job succeeded, 1 if any failed, 2 if no job ran
+    """
+    args = parse_args(argv)
+
+    token = os.environ.get(TOKEN_ENV_VAR, "").strip()
+    if not token:
+        logging.error(Fore.RED + f"Set the bot token in the {TOKEN_ENV_VAR} environment variable.")
+        return 2
+
+    try:
+        jobs = load_jobs(args.jobs)
+    except JobError as e:
+        logging.error(Fore.RED + str(e))
+        return 2
+
+    controller = ConcurrencyController(MAX_ADAPTIVE_CONCURRENCY) if args.adaptive_concurrency else None
+    results = run_jobs(
+        jobs, token, args.results, args.workers,
+        base_url=args.api_base_url, cdn_base_url=args.cdn_base_url, concurrency_controller=controller,
+        client_options=network_options(args)
+    )
+    report_metrics(METRICS, args.metrics_json, args.metrics_prom, controller)
+    failed = [result["job"] for result in results if not result["success"]]
+    if failed:
+        logging.error(Fore.RED + f"{len(failed)} of {len(results)} jobs failed: {', '.join(failed)}")
+        return 1
+
+    logging.info(Fore.GREEN + f"All {len(results)} jobs succeeded.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
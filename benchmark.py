@@ -0,0 +1,221 @@
+"""
+End-to-end clone benchmark for the Discord Server Cloner.
+
+Runs complete clones with clone_server() against the local mock API in
+mock_discord.py, on synthetic source servers of increasing size, and
+reports the wall time, the number of API calls, the 429s and whether the
+target ended up matching the source. Every run gets a fresh mock server,
+rate limiter and metrics collector, so runs do not influence each other.
+
+    python benchmark.py
+    python benchmark.py --channels 10 100 --engines async --latency 0.05 --json results.json
+"""
+
+import argparse
+import json
+import logging
+import time
+from typing import Optional, Dict, List, Any
+
+from colorama import Fore
+
+from assets import AssetFetcher
+from cloner import DEFAULT_CONCURRENCY, DiscordClient, RateLimiter, clone_server
+from concurrency import ConcurrencyController
+from metrics import Metrics
+from mock_discord import MockDiscordServer, RateLimits
+
+DEFAULT_CHANNEL_COUNTS = [10, 100, 500]
+DEFAULT_ROLE_COUNT = 249  # Plus @everyone, Discord's limit of 250 roles
+DEFAULT_OVERWRITE_COUNT = 50
+DEFAULT_EMOJI_COUNT = 10
+DEFAULT_ENGINES = ["sync", "async"]
+BENCHMARK_TOKEN = "benchmark"
+
+
+def target_matches(server: MockDiscordServer, source_id: str, target_id: str) -> bool:
+    """
+    Check that a clone reproduced the source's roles, channels and overwrites.
+
+    Args:
+        server: Mock server holding both guilds
+        source_id: ID of the source guild
+        target_id: ID of the target guild
+
+    Returns:
+        True if the target has the same roles, channels and emojis
+    """
+    source = server.state.guilds[source_id]
+    target = server.state.guilds[target_id]
+
+    def roles(guild: Dict[str, Any]) -> List[Any]:
+        return sorted((role["name"], role["permissions"]) for role in guild["roles"][1:])
+
+    def channels(guild: Dict[str, Any]) -> List[Any]:
+        return sorted((channel["name"], channel["type"], len(channel["permission_overwrites"]))
+                      for channel in guild["channels"])
+
+    return (
+        roles(source) == roles(target)
+        and channels(source) == channels(target)
+        and sorted(emoji["name"] for emoji in source["emojis"]) == sorted(emoji["name"] for emoji in target["emojis"])
+    )
+
+
+def run_benchmark(
+    channels: int,
+    engine: str = "sync",
+    mode: str = "full",
+    roles: int = DEFAULT_ROLE_COUNT,
+    overwrites: int = DEFAULT_OVERWRITE_COUNT,
+    emojis: int = DEFAULT_EMOJI_COUNT,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    latency: float = 0.0,
+    rate_limits: Optional[RateLimits] = None,
+    adaptive: bool = False,
+    fault_rate: float = 0.0,
+    synced: float = 0.0
+) -> Dict[str, Any]:
+    """
+    Clone a synthetic server once on a fresh mock API.
+
+    Args:
+        channels: Number of channels in the source server
+        engine: "sync" or "async", see clone_server
+        mode: "full" or "reconcile", see clone_server
+        roles: Number of roles in the source server besides @everyone
+        overwrites: Role overwrites per channel
+        emojis: Number of emojis in the source server
+        concurrency: Requests in flight for the async engine
+        latency: Seconds the mock delays every response by
+        rate_limits: Rate limits of the mock, Discord-like defaults
+        adaptive: Let a concurrency controller adapt the requests in flight
+            below concurrency
+        fault_rate: Share of requests the mock fails with a 502 or a
+            dropped connection
+        synced: Share of the source channels whose overwrites are those
+            of their category
+
+    Returns:
+        Size, timing, call counts and outcome of the run
+    """
+    with MockDiscordServer(latency=latency, rate_limits=rate_limits, fault_rate=fault_rate) as server:
+        source_id = server.state.add_guild("Source", channels, roles, overwrites, emojis, synced=synced)
+        target_id = server.state.add_guild("Target", 0, 0)
+        metrics = Metrics()
+        controller = ConcurrencyController(concurrency) if adaptive else None
+
+        started = time.monotonic()
+        with DiscordClient(
+            BENCHMARK_TOKEN, pool_size=max(concurrency, 1), base_url=server.api_base_url,
+            rate_limiter=RateLimiter(), metrics=metrics, concurrency_controller=controller
+        ) as client, AssetFetcher(server.base_url) as assets:
+            success = clone_server(
+                client, source_id, target_id, None,
+                engine=engine, concurrency=concurrency if engine == "async" else 1,
+                mode=mode, assets=assets
+            )
+        elapsed = time.monotonic() - started
+
+        totals = metrics.to_dict()["totals"]
+        return {
+            "channels": channels,
+            "roles": roles,
+            "overwrites": overwrites,
+            "synced": synced,
+            "emojis": emojis,
+            "engine": engine,
+            "mode": mode,
+            "success": success,
+            "matches": success and target_matches(server, source_id, target_id),
+            "elapsed": round(elapsed, 3),
+            "requests": sum(server.state.calls.values()),
+            "rate_limited": server.state.rate_limited,
+            "faults": server.state.faults,
+            "retries": totals["retries"],
+            "throttle_seconds": totals["throttle_seconds"],
+            "concurrency": controller.to_dict() if controller else None,
+            "calls": dict(sorted(server.state.calls.items()))
+        }
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """
+    Parse command line options.
+
+    Args:
+        argv: Arguments to parse, sys.argv by default
+
+    Returns:
+        Parsed options
+    """
+    parser = argparse.ArgumentParser(description="Benchmark complete clones against a local mock Discord API.")
+    parser.add_argument(
+        "--channels", metavar="N", type=int, nargs="+", default=DEFAULT_CHANNEL_COUNTS,
+        help=f"channel counts of the source servers (default: {DEFAULT_CHANNEL_COUNTS})"
+    )
+    parser.add_argument("--roles", metavar="N", type=int, default=DEFAULT_ROLE_COUNT,
+                        help=f"roles besides @everyone (default: {DEFAULT_ROLE_COUNT})")
+    parser.add_argument("--overwrites", metavar="N", type=int, default=DEFAULT_OVERWRITE_COUNT,
+                        help=f"permission overwrites per channel (default: {DEFAULT_OVERWRITE_COUNT})")
+    parser.add_argument("--synced", metavar="SHARE", type=float, default=0.0,
+                        help="share of channels with exactly their category's overwrites (default: 0)")
+    parser.add_argument("--emojis", metavar="N", type=int, default=DEFAULT_EMOJI_COUNT,
+                        help=f"emojis (default: {DEFAULT_EMOJI_COUNT})")
+    parser.add_argument("--engines", nargs="+", choices=DEFAULT_ENGINES, default=DEFAULT_ENGINES,
+                        help="engines to benchmark (default: both)")
+    parser.add_argument("--mode", choices=["full", "reconcile"], default="full",
+                        help="clone mode (default: full)")
+    parser.add_argument("--concurrency", metavar="N", type=int, default=DEFAULT_CONCURRENCY,
+                        help=f"requests in flight for the async engine (default: {DEFAULT_CONCURRENCY})")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="adapt the requests in flight of the async engine up to --concurrency")
+    parser.add_argument("--latency", metavar="SECONDS", type=float, default=0.0,
+                        help="delay of every mock response (default: 0)")
+    parser.add_argument("--route-limit", metavar="N", type=int, default=50,
+                        help="mock requests per second per route, 0 for none (default: 50)")
+    parser.add_argument("--global-limit", metavar="N", type=int, default=50,
+                        help="mock requests per second overall, 0 for none (default: 50)")
+    parser.add_argument("--fault-rate", metavar="SHARE", type=float, default=0.0,
+                        help="share of mock requests failing with a 502 or a dropped connection (default: 0)")
+    parser.add_argument("--json", metavar="FILE", help="write the results to a JSON file")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Entry point of the benchmark.
+
+    Args:
+        argv: Command line arguments, sys.argv by default
+
+    Returns:
+        Exit status: 0 if every clone matched its source, 1 otherwise
+    """
+    args = parse_args(argv)
+
+    results = []
+    for channels in args.channels:
+        for engine in args.engines:
+            logging.info(Fore.CYAN + f"Cloning {channels} channels, {args.roles} roles with the {engine} engine...")
+            results.append(run_benchmark(
+                channels, engine, args.mode, args.roles, args.overwrites, args.emojis, args.concurrency,
+                args.latency, RateLimits(args.route_limit, 1.0, args.global_limit),
+                args.adaptive and engine == "async", args.fault_rate, args.synced
+            ))
+
+    print(f"\n{'channels':>8} {'engine':>6} {'seconds':>8} {'requests':>8} {'429s':>5} {'faults':>6} {'throttled':>9}  result")
+    for result in results:
+        outcome = Fore.GREEN + "ok" if result["matches"] else Fore.RED + "MISMATCH"
+        print(f"{result['channels']:>8} {result['engine']:>6} {result['elapsed']:>8.2f} {result['requests']:>8} "
+              f"{result['rate_limited']:>5} {result['faults']:>6} {result['throttle_seconds']:>8.2f}s  {outcome}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+
+    return 0 if all(result["matches"] for result in results) else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
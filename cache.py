@@ -0,0 +1,88 @@
+"""
+On-disk cache of source server reads.
+
+Repeated clones of the same source within the TTL window reuse the cached
+server info, channels, roles and emojis instead of fetching them again.
+"""
+
+import json
+import logging
+import os
+import time
+from typing import Optional, Dict, List, Any, Tuple
+
+DEFAULT_CACHE_DIR = ".cache"
+
+ServerData = Tuple[Dict[str, Any], List[Dict[str, Any]], List[Dict[str, Any]], List[Dict[str, Any]]]
+
+
+class SourceCache:
+    """Cache of source server data with a time-to-live."""
+
+    def __init__(self, ttl: float, directory: str = DEFAULT_CACHE_DIR) -> None:
+        """
+        Create a cache.
+
+        Args:
+            ttl: Seconds a cached read stays valid
+            directory: Directory holding the cache files
+        """
+        self.ttl = ttl
+        self.directory = os.path.join(directory, "servers")
+
+    def _path(self, server_id: str) -> str:
+        return os.path.join(self.directory, f"{server_id}.json")
+
+    def get(self, server_id: str) -> Optional[ServerData]:
+        """
+        Read cached data of a server.
+
+        Args:
+            server_id: ID of the server
+
+        Returns:
+            Tuple of (server_info, channels, roles, emojis), None if the
+            server is not cached or the entry expired
+        """
+        try:
+            with open(self._path(server_id), encoding="utf-8") as file:
+                entry = json.load(file)
+        except (OSError, ValueError):
+            return None
+
+        age = time.time() - entry.get("fetched_at", 0)
+        if age > self.ttl:
+            return None
+
+        logging.info(f"Using cached data of server {server_id} ({age:.0f}s old).")
+        server_info, channels, roles, emojis = entry["data"]
+        return server_info, channels, roles, emojis
+
+    def put(self, server_id: str, data: ServerData) -> None:
+        """
+        Store data of a server.
+
+        Args:
+            server_id: ID of the server
+            data: Tuple of (server_info, channels, roles, emojis)
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        temporary_path = f"{self._path(server_id)}.tmp"
+        try:
+            with open(temporary_path, "w", encoding="utf-8") as file:
+                json.dump({"fetched_at": time.time(), "data": list(data)}, file)
+            os.replace(temporary_path, self._path(server_id))
+        except OSError as e:
+            logging.warning(f"Could not cache data of server {server_id}: {e}")
+
+    def invalidate(self, server_id: str) -> None:
+        """
+        Drop cached data of a server.
+
+        Args:
+            server_id: ID of the server
+        """
+        try:
+            os.remove(self._path(server_id))
+        except FileNotFoundError:
+            pass
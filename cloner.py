@@ -0,0 +1,2585 @@
+"""
+Core of the Discord Server Cloner.
+
+The Discord API client with its rate limiter, the request helpers and the
+planners that turn a source and a target server into clone operations.
+main.py is the command line entry point, the other modules import the
+cloner from here.
+"""
+
+import argparse
+import requests
+import logging
+import os
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, List, Any, Callable, Iterable, Set, Tuple
+from urllib.parse import urlparse
+from colorama import init, Fore
+from requests.adapters import BaseAdapter, HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+from assets import (
+    GUILD_ASSET_FEATURES,
+    GUILD_ASSET_FIELDS,
+    AssetCache,
+    AssetFetcher,
+    emoji_asset_path,
+    guild_asset_paths,
+)
+from cache import SourceCache
+from concurrency import ConcurrencyController
+from filters import CloneFilter
+from journal import Journal, JournalError, JournalState, journal_path, read_journal
+from metrics import METRICS, Metrics
+from model import ROLE_OVERWRITE, Channel, Emoji, Guild, Overwrite, Role
+from reconcile import Reconciliation, channel_changes, overwrite_set, role_changes, synced_channel_ids
+from scheduler import Task, TaskGraph, RequestSpec, run_graph, log_critical_path
+from snapshot import SnapshotError, read_snapshot, write_snapshot
+from state import StateCache
+
+init(autoreset=True)
+
+# Constants
+DISCORD_API_BASE_URL = os.environ.get("DISCORD_API_BASE_URL", "https://discord.com/api/v9")
+TOKEN_ENV_VAR = "DISCORD_BOT_TOKEN"  # Bot token for runs without a prompt
+MAX_RETRIES = 5  # Retries for a request that was rate limited
+DEFAULT_POOL_SIZE = 10  # Pooled keep-alive connections per client
+DEFAULT_TIMEOUT = 30.0  # Seconds to wait for a Discord API response
+DEFAULT_CONNECT_TIMEOUT = 10.0  # Seconds to wait for a connection to the Discord API
+MAX_NETWORK_RETRIES = 3  # Retries for a request that timed out, lost its connection or got a 5xx
+RETRY_BASE_DELAY = 0.5  # Most seconds before the first network retry, doubled for each further one
+MAX_RETRY_DELAY = 15.0  # Cap of the network retry backoff in seconds
+CREATE_CHECK_INTERVAL = 0.1  # Seconds between checks for identical creates still waiting for a response
+TRANSIENT_STATUS_CODES = (500, 502, 503, 504)
+DEFAULT_CONCURRENCY = 10  # Requests in flight for the async engine
+MAX_ADAPTIVE_CONCURRENCY = 50  # Most requests in flight an adaptive limit can grow to
+DEFAULT_PARALLEL_TARGETS = 4  # Targets cloned at the same time by a fan-out clone
+MAX_ROLES = 250  # Role limit of a Discord server
+MAX_CHANNELS = 500  # Channel limit of a Discord server
+SUCCESS_COLOR = 0x00ff00
+FOOTER_TEXT = "#codebyemreconf"
+
+
+class InfoFilter(logging.Filter):
+    """Filter to hide logs below INFO level."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        """
+        Filter log records to show INFO, WARNING and ERROR levels.
+
+        Args:
+            record: The log record to filter
+
+        Returns:
+            True if record is INFO level or above, False otherwise
+        """
+        return record.levelno >= logging.INFO
+
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+logger = logging.getLogger()
+logger.addFilter(InfoFilter())
+
+
+def get_headers(token: str) -> Dict[str, str]:
+    """
+    Generate HTTP headers for Discord API requests.
+
+    Args:
+        token: Discord bot token
+
+    Returns:
+        Dictionary containing authorization and content-type headers
+    """
+    return {
+        "Authorization": f"Bot {token}",
+        "Content-Type": "application/json"
+    }
+
+
+def validate_id(value: str, field_name: str) -> bool:
+    """
+    Validate that a Discord ID is numeric and non-empty.
+
+    Args:
+        value: The ID string to validate
+        field_name: Name of the field being validated (for error messages)
+
+    Returns:
+        True if valid, False otherwise
+    """
+    if not value or not value.strip():
+        logging.error(f"{field_name} cannot be empty.")
+        return False
+
+    if not value.isdigit():
+        logging.error(f"{field_name} must be numeric.")
+        return False
+
+    return True
+
+
+# Top-level resources whose ID is part of the rate limit bucket
+MAJOR_PARAMETER_PATTERN = re.compile(r"^(?:guilds|channels|webhooks)/(\d+)")
+
+
+def route_key(method: str, url: str) -> str:
+    """
+    Build the rate limit route key for a request.
+
+    Discord buckets are shared by requests to the same route with the same
+    major parameter (guild, channel or webhook ID), so every other ID in the
+    path is replaced with a placeholder.
+
+    Args:
+        method: HTTP method
+        url: Full URL of the request
+
+    Returns:
+        Route key such as "POST guilds/123/roles/{id}"
+    """
+    parts = urlparse(url).path.strip("/").split("/")
+
+    # Drop the "api/v9" prefix so keys do not depend on the API version
+    if len(parts) >= 2 and parts[0] == "api" and parts[1].startswith("v"):
+        parts = parts[2:]
+
+    for index, part in enumerate(parts):
+        is_major = index == 1 and parts[0] in ("guilds", "channels", "webhooks")
+        if part.isdigit() and not is_major:
+            parts[index] = "{id}"
+
+    return f"{method.upper()} {'/'.join(parts)}"
+
+
+def is_global_limit(headers: Any, body: Optional[Any] = None) -> bool:
+    """
+    Check whether a 429 response is a global limit rather than a route's.
+
+    Cloudflare bans come without Discord's rate limit headers, and they
+    throttle every request from the IP, so they count as global too.
+
+    Args:
+        headers: Response headers (case-insensitive mapping)
+        body: Decoded JSON body of the response
+
+    Returns:
+        True if the limit applies to all routes
+    """
+    body = body if isinstance(body, dict) else {}
+    return bool(
+        body.get("global")
+        or headers.get("X-RateLimit-Global") == "true"
+        or headers.get("X-RateLimit-Scope") == "global"
+        or "X-RateLimit-Limit" not in headers
+    )
+
+
+def network_retry_delay(retry: int) -> float:
+    """
+    Get the backoff before retrying a request that failed on the network or with a 5xx.
+
+    The delay grows exponentially with full jitter, so clients that failed
+    together do not retry together.
+
+    Args:
+        retry: Number of network retries already made for the request
+
+    Returns:
+        Seconds to wait
+    """
+    return random.uniform(0, min(MAX_RETRY_DELAY, RETRY_BASE_DELAY * 2 ** retry))
+
+
+class RateLimitBucket:
+    """State of a single Discord rate limit bucket."""
+
+    __slots__ = ("limit", "remaining", "reset_at", "reset_after")
+
+    def __init__(self, limit: int, remaining: int, reset_at: float, reset_after: float):
+        self.limit = limit
+        self.remaining = remaining
+        self.reset_at = reset_at
+        self.reset_after = reset_after
+
+
+class RateLimiter:
+    """
+    Track Discord rate limit buckets from response headers.
+
+    Routes are mapped to buckets as soon as Discord reports their
+    X-RateLimit-Bucket hash. A request only waits when its bucket is
+    exhausted or a global rate limit is active. The limiter is thread-safe
+    and never sleeps itself, so it can be shared with asyncio code.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._routes: Dict[str, str] = {}
+        self._buckets: Dict[str, RateLimitBucket] = {}
+        self._global_reset_at = 0.0
+
+    def reserve(self, route: str) -> float:
+        """
+        Reserve a request slot for a route.
+
+        Args:
+            route: Route key from route_key()
+
+        Returns:
+            0 if the request may be sent now, otherwise the number of seconds
+            to wait before calling reserve() again
+        """
+        with self._lock:
+            now = time.monotonic()
+            if now < self._global_reset_at:
+                return self._global_reset_at - now
+
+            bucket = self._buckets.get(self._routes.get(route, route))
+            if bucket is None:
+                return 0.0
+
+            if now >= bucket.reset_at:
+                # The window has passed, assume a fresh one until headers say otherwise
+                bucket.remaining = bucket.limit
+                bucket.reset_at = now + bucket.reset_after
+
+            if bucket.remaining > 0:
+                bucket.remaining -= 1
+                return 0.0
+            return bucket.reset_at - now
+
+    def known_limit(self, route: str) -> Optional[Tuple[int, float]]:
+        """
+        Get the limit Discord last reported for a route's bucket.
+
+        Args:
+            route: Route key from route_key()
+
+        Returns:
+            Tuple of (requests per window, window seconds), None if the
+            route has not been seen yet
+        """
+        with self._lock:
+            bucket = self._buckets.get(self._routes.get(route, route))
+            if bucket is None:
+                return None
+            return bucket.limit, bucket.reset_after
+
+    def wait(self, route: str) -> float:
+        """
+        Block until a request slot for a route is available.
+
+        Args:
+            route: Route key from route_key()
+
+        Returns:
+            Total number of seconds spent waiting
+        """
+        waited = 0.0
+        delay = self.reserve(route)
+        while delay > 0:
+            time.sleep(delay)
+            waited += delay
+            delay = self.reserve(route)
+        return waited
+
+    def update(
+        self,
+        route: str,
+        headers: Any,
+        status_code: int,
+        body: Optional[Any] = None
+    ) -> float:
+        """
+        Update bucket state from a response.
+
+        Args:
+            route: Route key from route_key()
+            headers: Response headers (case-insensitive mapping)
+            status_code: HTTP status code of the response
+            body: Decoded JSON body, used for 429 responses
+
+        Returns:
+            Number of seconds to wait before retrying if the response was a
+            429, otherwise 0
+        """
+        now = time.monotonic()
+        bucket_hash = headers.get("X-RateLimit-Bucket")
+
+        with self._lock:
+            if bucket_hash:
+                major = MAJOR_PARAMETER_PATTERN.match(route.split(" ", 1)[1])
+                bucket_key = f"{bucket_hash}:{major.group(1) if major else ''}"
+                self._routes[route] = bucket_key
+            else:
+                bucket_key = self._routes.get(route, route)
+
+            limit = headers.get("X-RateLimit-Limit")
+            remaining = headers.get("X-RateLimit-Remaining")
+            reset_after = headers.get("X-RateLimit-Reset-After")
+
+            bucket = self._buckets.get(bucket_key)
+            if limit is not None and remaining is not None and reset_after is not None:
+                if bucket is None:
+                    bucket = RateLimitBucket(int(limit), int(remaining), 0.0, float(reset_after))
+                    self._buckets[bucket_key] = bucket
+                bucket.limit = int(limit)
+                bucket.reset_after = float(reset_after)
+                bucket.reset_at = now + float(reset_after)
+                # Concurrent reservations may already have used part of the window
+                bucket.remaining = min(bucket.remaining, int(remaining))
+
+            if status_code != 429:
+                return 0.0
+
+            details = body if isinstance(body, dict) else {}
+            retry_after = float(details.get("retry_after") or headers.get("Retry-After") or 1.0)
+
+            if is_global_limit(headers, body):
+                self._global_reset_at = max(self._global_reset_at, now + retry_after)
+            else:
+                if bucket is None:
+                    bucket = RateLimitBucket(1, 0, 0.0, retry_after)
+                    self._buckets[bucket_key] = bucket
+                bucket.remaining = 0
+                bucket.reset_at = max(bucket.reset_at, now + retry_after)
+
+            return retry_after
+
+
+# Shared by every client that is not given its own limiter
+RATE_LIMITER = RateLimiter()
+
+
+class DiscordClient:
+    """
+    Discord API client owning a pooled keep-alive HTTP session.
+
+    Every helper takes a client instead of a raw token so that all calls of a
+    clone reuse the same connections, auth headers, timeouts and rate limiter.
+    """
+
+    def __init__(
+        self,
+        token: str,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        timeout: float = DEFAULT_TIMEOUT,
+        base_url: str = DISCORD_API_BASE_URL,
+        rate_limiter: Optional[RateLimiter] = None,
+        metrics: Optional[Metrics] = None,
+        concurrency_controller: Optional[ConcurrencyController] = None,
+        state_cache: Optional[StateCache] = None,
+        connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+        max_network_retries: int = MAX_NETWORK_RETRIES,
+        transport: Optional[BaseAdapter] = None
+    ) -> None:
+        """
+        Create a client.
+
+        Args:
+            token: Discord bot token
+            pool_size: Maximum number of pooled connections
+            timeout: Seconds to wait for a response once connected
+            base_url: Discord API base URL
+            rate_limiter: Rate limiter to use, shared RATE_LIMITER by default
+            metrics: Collector of request metrics, shared METRICS by default
+            concurrency_controller: Adaptive limit on the requests in flight,
+                None to only cap them by the number of workers
+            state_cache: State of the servers fetched with fetch_guild(),
+                kept up to date by every write. A new one by default.
+            connect_timeout: Seconds to wait for a connection
+            max_network_retries: Retries for requests that timed out, lost
+                their connection or got a 5xx response
+            transport: Adapter sending the requests, such as a cassette
+                recorder or player from transport.py. Pooled connections
+                of pool_size by default.
+        """
+        self.token = token
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.max_network_retries = max_network_retries
+        self.base_url = base_url.rstrip("/")
+        self.rate_limiter = rate_limiter or RATE_LIMITER
+        self.metrics = metrics or METRICS
+        self.concurrency_controller = concurrency_controller
+        self.state_cache = state_cache if state_cache is not None else StateCache()
+
+        self.session = requests.Session()
+        self.session.headers.update(get_headers(token))
+        self.transport = transport
+        adapter = transport or HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def url(self, path: str) -> str:
+        """
+        Build the full URL for an API path.
+
+        Args:
+            path: API path starting with a slash, e.g. "/guilds/123"
+
+        Returns:
+            Full request URL
+        """
+        return f"{self.base_url}{path}"
+
+    def close(self) -> None:
+        """Close all pooled connections."""
+        self.session.close()
+
+    def __enter__(self) -> "DiscordClient":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+
+class DiscordAPIError(Exception):
+    """A Discord API request that failed."""
+
+    def __init__(
+        self,
+        operation_name: str,
+        status_code: Optional[int] = None,
+        message: str = "",
+        code: Optional[int] = None
+    ) -> None:
+        """
+        Create an error.
+
+        Args:
+            operation_name: Description of the failed operation
+            status_code: HTTP status code, None if no response was received
+            message: Error message from Discord or the HTTP library
+            code: Discord JSON error code, if any
+        """
+        self.operation_name = operation_name
+        self.status_code = status_code
+        self.message = message
+        self.code = code
+        super().__init__(str(self))
+
+    def __str__(self) -> str:
+        status = f"HTTP {self.status_code}" if self.status_code else "no response"
+        code = f", code {self.code}" if self.code else ""
+        return f"{self.operation_name} failed ({status}{code}): {self.message}"
+
+
+def make_request(
+    client: DiscordClient,
+    method: str,
+    path: str,
+    json_data: Optional[Any] = None,
+    operation_name: str = "API request",
+    raise_on_error: bool = False
+) -> Optional[Any]:
+    """
+    Make an HTTP request to Discord API with error handling and rate limiting.
+
+    Requests wait only when their rate limit bucket is exhausted, and 429
+    responses are retried up to MAX_RETRIES times after the advertised delay.
+    Timeouts, dropped connections and 5xx responses are retried up to the
+    client's max_network_retries times with jittered exponential backoff.
+    A create that may have reached Discord is only retried once a listing
+    of the target shows it did not go through (see retry_safety).
+    With a concurrency controller on the client, requests also wait for a
+    slot and report their outcome to it. Successful writes are applied to
+    the client's state cache.
+
+    Args:
+        client: Discord API client
+        method: HTTP method (GET, POST, PUT, DELETE, PATCH)
+        path: API path starting with a slash, e.g. "/guilds/123/roles"
+        json_data: Optional JSON data for request body
+        operation_name: Description of operation for logging
+        raise_on_error: Raise DiscordAPIError instead of logging and
+            returning None
+
+    Returns:
+        Response JSON for successful requests, status code for DELETE and
+        empty responses, None on error
+    """
+    def fail(error: DiscordAPIError, level: int, message: str) -> None:
+        if raise_on_error:
+            raise error
+        logging.log(level, message)
+
+    method = method.upper()
+    if method not in ("GET", "POST", "PUT", "DELETE", "PATCH"):
+        logging.error(f"Unsupported HTTP method: {method}")
+        return None
+
+    url = client.url(path)
+    route = route_key(method, url)
+    controller = client.concurrency_controller
+    rate_limit_retries = 0
+    network_retries = 0
+
+    # Lost creates are told apart from identical ones still in flight (see StateCache.creating)
+    with client.state_cache.creating(method, path, json_data):
+        while True:
+            retried = rate_limit_retries + network_retries > 0
+            throttled = client.rate_limiter.wait(route)
+            if controller:
+                controller.acquire()
+
+            started = time.monotonic()
+            response, body, error = None, None, None
+            try:
+                response = client.session.request(
+                    method, url, json=json_data, timeout=(client.connect_timeout, client.timeout)
+                )
+                if response.status_code >= 400:
+                    try:
+                        body = response.json()
+                    except ValueError:
+                        body = None
+            except requests.exceptions.RequestException as e:
+                error = e
+            finally:
+                latency = time.monotonic() - started
+                # Also give the slot back on unexpected errors, or the limit would shrink for good
+                if controller:
+                    status_code = response.status_code if response is not None else None
+                    controller.release(
+                        started, latency, status_code,
+                        status_code == 429 and is_global_limit(response.headers, body)
+                    )
+
+            if error is not None:
+                client.metrics.record_request(method, path, None, latency, throttled, retried)
+                transient = isinstance(error, (requests.exceptions.Timeout, requests.exceptions.ConnectionError))
+                if transient and network_retries < client.max_network_retries:
+                    safe, created = retry_safety(client, method, path, json_data, operation_name) \
+                        if request_was_sent(error) else (True, None)
+                    if created is not None:
+                        return created
+                    if safe:
+                        delay = network_retry_delay(network_retries)
+                        network_retries += 1
+                        logging.warning(f"Request error during {operation_name}: {error}. Retrying in {delay:.2f}s.")
+                        time.sleep(delay)
+                        continue
+                fail(DiscordAPIError(operation_name, message=str(error)),
+                     logging.ERROR, f"Request error during {operation_name}: {error}")
+                return None
+            client.metrics.record_request(method, path, response.status_code, latency, throttled, retried)
+
+            retry_after = client.rate_limiter.update(route, response.headers, response.status_code, body)
+
+            if response.status_code == 429:
+                if rate_limit_retries < MAX_RETRIES:
+                    rate_limit_retries += 1
+                    logging.warning(f"Rate limited during {operation_name}, retrying in {retry_after:.2f}s.")
+                    continue
+                fail(DiscordAPIError(operation_name, 429, "Rate limited"),
+                     logging.ERROR, f"Rate limited during {operation_name}, giving up after {MAX_RETRIES} retries.")
+                return None
+
+            if response.status_code in TRANSIENT_STATUS_CODES and network_retries < client.max_network_retries:
+                safe, created = retry_safety(client, method, path, json_data, operation_name)
+                if created is not None:
+                    return created
+                if safe:
+                    delay = network_retry_delay(network_retries)
+                    network_retries += 1
+                    logging.warning(f"HTTP {response.status_code} during {operation_name}, retrying in {delay:.2f}s.")
+                    time.sleep(delay)
+                    continue
+
+            try:
+                response.raise_for_status()
+
+                # Return status code for DELETE and empty responses, JSON for others
+                if method == "DELETE" or response.status_code == 204:
+                    result = response.status_code
+                else:
+                    result = response.json()
+                client.state_cache.record(method, path, json_data, result)
+                return result
+
+            except requests.exceptions.HTTPError as e:
+                details = body if isinstance(body, dict) else {}
+                error = DiscordAPIError(
+                    operation_name, response.status_code, details.get("message", str(e)), details.get("code")
+                )
+                if response.status_code == 403:
+                    fail(error, logging.WARNING, f"Insufficient permissions for {operation_name}.")
+                else:
+                    fail(error, logging.ERROR, f"HTTP error during {operation_name}: {e}")
+                return None
+
+            except ValueError as e:
+                fail(DiscordAPIError(operation_name, response.status_code, f"Invalid JSON response: {e}"),
+                     logging.ERROR, f"Unexpected error during {operation_name}: {e}")
+                return None
+
+
+def request_was_sent(error: requests.exceptions.RequestException) -> bool:
+    """
+    Check whether a failed request may have reached Discord.
+
+    Args:
+        error: Error raised by the request
+
+    Returns:
+        False if no connection was made, so the request cannot have had any
+        effect, True otherwise
+    """
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return False
+    reason = getattr(error.args[0], "reason", None) if error.args else None
+    return not isinstance(reason, NewConnectionError)
+
+
+def retry_safety(
+    client: DiscordClient,
+    method: str,
+    path: str,
+    json_data: Optional[Any],
+    operation_name: str
+) -> Tuple[bool, Optional[Any]]:
+    """
+    Check whether a failed request may be retried without duplicating a create.
+
+    Reads, updates, overwrites and deletes can be repeated safely. A POST may
+    have reached Discord before its connection dropped or it got a 5xx, and
+    sending it again would create the role, channel or emoji twice. For
+    creates in a server whose state is cached, the collection is listed
+    and an object matching the request that the state does not know yet
+    is taken as the result (see StateCache.find_created), once creates
+    with the same fields still waiting for their response are done, up to
+    the read timeout. Other POSTs are not retried.
+
+    Args:
+        client: Discord API client
+        method: HTTP method of the failed request
+        path: API path of the failed request
+        json_data: JSON body that was sent
+        operation_name: Description of operation for logging
+
+    Returns:
+        Tuple of (whether the request can be sent again, the object it
+        created if it went through)
+    """
+    if method != "POST":
+        return True, None
+    list_path = client.state_cache.create_list_path(method, path)
+    listed = None
+    with client.state_cache.checking(path, json_data):
+        if list_path is not None:
+            deadline = time.monotonic() + client.timeout
+            while client.state_cache.awaiting_response(path, json_data) and time.monotonic() < deadline:
+                time.sleep(CREATE_CHECK_INTERVAL)
+            listed = make_request(
+                client, "GET", list_path, operation_name=f"checking whether {operation_name} went through"
+            )
+        if not isinstance(listed, list):
+            logging.warning(f"Not retrying {operation_name}, it may have gone through.")
+            return False, None
+        safe, created = client.state_cache.find_created(path, json_data, listed)
+    if created is not None:
+        operation = operation_name[:1].upper() + operation_name[1:]
+        logging.info(f"{operation} went through before the error, not sending it again.")
+    return safe, created
+
+
+# Endpoints read for every server, relative to /guilds/{id}
+SERVER_DATA_ENDPOINTS = (("info", ""), ("channels", "/channels"), ("roles", "/roles"), ("emojis", "/emojis"))
+
+
+def get_server_data(
+    client: DiscordClient,
+    server_id: str
+) -> Tuple[Optional[Dict], Optional[List], Optional[List], Optional[List]]:
+    """
+    Fetch all data from a Discord server.
+
+    The four reads are issued concurrently. Each failed read is logged with
+    its own status and Discord error message.
+
+    Args:
+        client: Discord API client
+        server_id: ID of the server to fetch data from
+
+    Returns:
+        Tuple of (server_info, channels, roles, emojis) or (None, None, None, None) on error
+    """
+    def fetch(name: str, suffix: str) -> Any:
+        return make_request(
+            client,
+            "GET",
+            f"/guilds/{server_id}{suffix}",
+            operation_name=f"fetching server {server_id} {name}",
+            raise_on_error=True
+        )
+
+    with ThreadPoolExecutor(max_workers=len(SERVER_DATA_ENDPOINTS)) as executor:
+        futures = [executor.submit(fetch, name, suffix) for name, suffix in SERVER_DATA_ENDPOINTS]
+
+    results = []
+    errors = []
+    for future in futures:
+        try:
+            results.append(future.result())
+        except DiscordAPIError as e:
+            logging.error(Fore.RED + f"Error: {e}")
+            errors.append(e)
+
+    if errors:
+        if any(e.status_code in (401, 403, 404) for e in errors):
+            logging.error(Fore.RED + "Check the bot token, the bot's permissions and the server ID.")
+        return None, None, None, None
+
+    server_info, channels, roles, emojis = results
+    return server_info, channels, roles, emojis
+
+
+def fetch_source_data(
+    client: DiscordClient,
+    server_id: str,
+    cache: Optional[SourceCache] = None
+) -> Tuple[Optional[Dict], Optional[List], Optional[List], Optional[List]]:
+    """
+    Fetch the data of a source server, going through the read cache if one is given.
+
+    Args:
+        client: Discord API client
+        server_id: ID of the source server
+        cache: Cache of source reads, None to always fetch
+
+    Returns:
+        Tuple of (server_info, channels, roles, emojis) or (None, None, None, None) on error
+    """
+    if cache is not None:
+        cached = cache.get(server_id)
+        if cached is not None:
+            return cached
+
+    data = get_server_data(client, server_id)
+    if cache is not None and data[0] is not None:
+        cache.put(server_id, data)
+    return data
+
+
+def role_payload(role: Role) -> Dict[str, Any]:
+    """
+    Build the request body for creating a role.
+
+    Args:
+        role: Source role
+
+    Returns:
+        JSON body for POST /guilds/{id}/roles
+    """
+    return {
+        "name": role.name,
+        "permissions": str(role.permissions),
+        "color": role.color,
+        "hoist": role.hoist,
+        "mentionable": role.mentionable
+    }
+
+
+def channel_payload(channel: Channel) -> Dict[str, Any]:
+    """
+    Build the request body for creating a channel.
+
+    Args:
+        channel: Channel with its parent and overwrites in the target server
+
+    Returns:
+        JSON body for POST /guilds/{id}/channels
+    """
+    return {
+        "name": channel.name,
+        "type": channel.type,
+        "topic": channel.topic or "",
+        "nsfw": channel.nsfw,
+        "parent_id": channel.parent_id,
+        "permission_overwrites": [overwrite.to_dict() for overwrite in channel.overwrites]
+    }
+
+
+def server_info_payload(guild: Guild) -> Dict[str, Any]:
+    """
+    Build the request body for updating server info.
+
+    Server images are sent separately as data URIs (see plan_guild_assets).
+
+    Args:
+        guild: Source server
+
+    Returns:
+        JSON body for PATCH /guilds/{id}
+    """
+    return {
+        "name": guild.name or "Cloned Server"
+    }
+
+
+def emoji_payload(emoji: Emoji) -> Dict[str, Any]:
+    """
+    Build the request body for creating an emoji.
+
+    Args:
+        emoji: Source emoji with its image
+
+    Returns:
+        JSON body for POST /guilds/{id}/emojis
+    """
+    return {
+        "name": emoji.name,
+        "image": emoji.image
+    }
+
+
+def dm_payload(message: str) -> Dict[str, Any]:
+    """
+    Build the completion notification message.
+
+    Args:
+        message: Message content
+
+    Returns:
+        JSON body for POST /channels/{id}/messages
+    """
+    return {
+        "embeds": [
+            {
+                "title": "Server Cloning Completed!",
+                "description": message,
+                "color": SUCCESS_COLOR,
+                "footer": {
+                    "text": FOOTER_TEXT
+                }
+            }
+        ]
+    }
+
+
+def remap_overwrite(overwrite: Overwrite, role_mapping: Dict[str, str]) -> Overwrite:
+    """
+    Get a permission overwrite with its role ID remapped to the target server.
+
+    Args:
+        overwrite: Source permission overwrite
+        role_mapping: Mapping of source role IDs to target role IDs
+
+    Returns:
+        Permission overwrite for the target server
+    """
+    return overwrite.with_id(role_mapping.get(overwrite.id, overwrite.id))
+
+
+def remap_overwrites(
+    overwrites: Iterable[Overwrite],
+    role_mapping: Dict[str, str],
+    channel_name: str
+) -> List[Overwrite]:
+    """
+    Remap the permission overwrites of a channel to the target server.
+
+    Role overwrites whose role was not created in the target are dropped,
+    since Discord rejects the whole channel when one overwrite is unknown.
+    Member overwrites keep their user ID.
+
+    Args:
+        overwrites: Source permission overwrites
+        role_mapping: Mapping of source role IDs (including the source server
+            ID for @everyone) to target role IDs
+        channel_name: Name of the channel for logging
+
+    Returns:
+        Permission overwrites for the target server
+    """
+    remapped = []
+    for overwrite in overwrites:
+        if overwrite.type == ROLE_OVERWRITE and overwrite.id not in role_mapping:
+            logging.warning(f"Skipping overwrite for missing role {overwrite.id} on channel {channel_name}.")
+            continue
+        remapped.append(remap_overwrite(overwrite, role_mapping))
+    return remapped
+
+
+def delete_role(client: DiscordClient, target_server_id: str, role_id: str) -> bool:
+    """
+    Delete a role from a server.
+
+    Args:
+        client: Discord API client
+        target_server_id: ID of the server containing the role
+        role_id: ID of the role to delete
+
+    Returns:
+        True if successful, False otherwise
+    """
+    result = make_request(
+        client,
+        "DELETE",
+        f"/guilds/{target_server_id}/roles/{role_id}",
+        operation_name=f"deleting role {role_id}"
+    )
+    return result is not None
+
+
+def delete_channel(client: DiscordClient, target_server_id: str, channel_id: str) -> bool:
+    """
+    Delete a channel from a server.
+
+    Args:
+        client: Discord API client
+        target_server_id: ID of the server containing the channel
+        channel_id: ID of the channel to delete
+
+    Returns:
+        True if successful, False otherwise
+    """
+    result = make_request(
+        client,
+        "DELETE",
+        f"/channels/{channel_id}",
+        operation_name=f"deleting channel {channel_id}"
+    )
+    return result is not None
+
+
+def create_role(
+    client: DiscordClient,
+    target_server_id: str,
+    role_data: Dict[str, Any]
+) -> Optional[Dict[str, Any]]:
+    """
+    Create a new role in a server.
+
+    Args:
+        client: Discord API client
+        target_server_id: ID of the server to create the role in
+        role_data: Dictionary containing role configuration
+
+    Returns:
+        Created role data if successful, None otherwise
+    """
+    return make_request(
+        client,
+        "POST",
+        f"/guilds/{target_server_id}/roles",
+        json_data=role_payload(Role.from_dict(role_data)),
+        operation_name=f"creating role {role_data.get('name', 'unknown')}"
+    )
+
+
+def create_channel(
+    client: DiscordClient,
+    target_server_id: str,
+    channel_data: Dict[str, Any]
+) -> Optional[Dict[str, Any]]:
+    """
+    Create a new channel in a server.
+
+    Args:
+        client: Discord API client
+        target_server_id: ID of the server to create the channel in
+        channel_data: Dictionary containing channel configuration
+
+    Returns:
+        Created channel data if successful, None otherwise
+    """
+    return make_request(
+        client,
+        "POST",
+        f"/guilds/{target_server_id}/channels",
+        json_data=channel_payload(Channel.from_dict(channel_data)),
+        operation_name=f"creating channel {channel_data.get('name', 'unknown')}"
+    )
+
+
+def update_server_info(
+    client: DiscordClient,
+    target_server_id: str,
+    server_info: Dict[str, Any]
+) -> Optional[Dict[str, Any]]:
+    """
+    Update server name.
+
+    Args:
+        client: Discord API client
+        target_server_id: ID of the server to update
+        server_info: Dictionary containing server configuration
+
+    Returns:
+        Updated server data if successful, None otherwise
+    """
+    return make_request(
+        client,
+        "PATCH",
+        f"/guilds/{target_server_id}",
+        json_data=server_info_payload(Guild(server_info)),
+        operation_name="updating server info"
+    )
+
+
+def create_emoji(
+    client: DiscordClient,
+    target_server_id: str,
+    emoji_data: Dict[str, Any]
+) -> Optional[Dict[str, Any]]:
+    """
+    Create a new emoji in a server.
+
+    Args:
+        client: Discord API client
+        target_server_id: ID of the server to create the emoji in
+        emoji_data: Dictionary containing emoji configuration
+
+    Returns:
+        Created emoji data if successful, None otherwise
+    """
+    return make_request(
+        client,
+        "POST",
+        f"/guilds/{target_server_id}/emojis",
+        json_data=emoji_payload(Emoji.from_dict(emoji_data)),
+        operation_name=f"creating emoji {emoji_data.get('name', 'unknown')}"
+    )
+
+
+def delete_emoji(client: DiscordClient, target_server_id: str, emoji_id: str) -> bool:
+    """
+    Delete an emoji from a server.
+
+    Args:
+        client: Discord API client
+        target_server_id: ID of the server containing the emoji
+        emoji_id: ID of the emoji to delete
+
+    Returns:
+        True if successful, False otherwise
+    """
+    result = make_request(
+        client,
+        "DELETE",
+        f"/guilds/{target_server_id}/emojis/{emoji_id}",
+        operation_name=f"deleting emoji {emoji_id}"
+    )
+    return result is not None
+
+
+def send_dm(client: DiscordClient, user_id: str, message: str) -> bool:
+    """
+    Send a DM notification to a user.
+
+    Args:
+        client: Discord API client
+        user_id: ID of the user to send DM to
+        message: Message content
+
+    Returns:
+        True if successful, False otherwise
+    """
+    create_dm_data = {"recipient_id": user_id}
+
+    # Create DM channel
+    dm_channel = make_request(
+        client,
+        "POST",
+        "/users/@me/channels",
+        json_data=create_dm_data,
+        operation_name="creating DM channel"
+    )
+
+    if not dm_channel:
+        return False
+
+    # Send message
+    result = make_request(
+        client,
+        "POST",
+        f"/channels/{dm_channel['id']}/messages",
+        json_data=dm_payload(message),
+        operation_name="sending DM notification"
+    )
+
+    if result:
+        logging.info(Fore.GREEN + "DM notification sent successfully!")
+        return True
+    return False
+
+
+def update_channel_permissions(
+    client: DiscordClient,
+    channel_id: str,
+    overwrite_data: Dict[str, Any]
+) -> bool:
+    """
+    Update permission overwrites for a channel.
+
+    Args:
+        client: Discord API client
+        channel_id: ID of the channel to update
+        overwrite_data: Permission overwrite data
+
+    Returns:
+        True if successful, False otherwise
+    """
+    result = make_request(
+        client,
+        "PUT",
+        f"/channels/{channel_id}/permissions/{overwrite_data['id']}",
+        json_data=overwrite_data,
+        operation_name=f"updating permissions for channel {channel_id}"
+    )
+    return result is not None
+
+
+def list_and_delete_emojis(client: DiscordClient, server_id: str) -> None:
+    """
+    List all emojis in a server and optionally delete one.
+
+    Args:
+        client: Discord API client
+        server_id: ID of the server
+    """
+    state = client.state_cache.get(server_id)
+    if state:
+        # Known since the clone fetched the server, no need to ask Discord again
+        emojis = [emoji.to_dict() for emoji in state.snapshot().emojis.values()]
+    else:
+        emojis = make_request(
+            client,
+            "GET",
+            f"/guilds/{server_id}/emojis",
+            operation_name="listing emojis"
+        )
+
+    if not emojis:
+        logging.info(Fore.YELLOW + "No emojis found.")
+        return
+
+    logging.info(Fore.YELLOW + "List of Emojis:")
+    for emoji in emojis:
+        logging.info(f"{emoji.get('name', 'unknown')} ({emoji.get('id', 'unknown')})")
+
+    emoji_to_delete = input(Fore.BLUE + "Enter the ID of the emoji to delete (leave blank to skip): ").strip()
+
+    if emoji_to_delete:
+        if delete_emoji(client, server_id, emoji_to_delete):
+            logging.info(Fore.GREEN + f"Emoji {emoji_to_delete} deleted successfully.")
+        else:
+            logging.error(Fore.RED + f"Failed to delete emoji {emoji_to_delete}.")
+    else:
+        logging.info(Fore.BLUE + "No emoji deleted.")
+
+
+def request_spec(path: str, json_data: Optional[Any] = None) -> Callable[[], RequestSpec]:
+    """
+    Build a task request that does not depend on other tasks.
+
+    Args:
+        path: API path of the request
+        json_data: Optional JSON data for request body
+
+    Returns:
+        Function returning the request path and body
+    """
+    return lambda: (path, json_data)
+
+
+def role_positions(
+    roles: Iterable[Role],
+    id_mapping: Dict[str, str],
+    target_roles: Iterable[Role]
+) -> List[Dict[str, Any]]:
+    """
+    Build the bulk role position update for roles that are out of place.
+
+    Args:
+        roles: Source roles
+        id_mapping: Source to target IDs of matched and created objects
+        target_roles: Roles that were in the target server before the clone
+
+    Returns:
+        JSON body for PATCH /guilds/{id}/roles
+    """
+    current = {role.id: role.position for role in target_roles}
+    positions = []
+    for role in roles:
+        target_id = id_mapping.get(role.id)
+        if target_id is None or role.name == '@everyone':
+            continue
+        if current.get(target_id) != role.position:
+            positions.append({"id": target_id, "position": role.position})
+    return positions
+
+
+def channel_positions(
+    channels: Iterable[Channel],
+    id_mapping: Dict[str, str],
+    target_channels: Iterable[Channel],
+    synced_ids: Iterable[str] = ()
+) -> List[Dict[str, Any]]:
+    """
+    Build the bulk channel position and parent update for channels that are out of place.
+
+    Channels that were already in the target, are synced with their
+    category in the source and move to another category get their
+    overwrites synced with the new category in the same update, when they
+    differ. Discord applies lock_permissions only along with a new parent,
+    so synced channels that keep theirs are patched by plan_channel_update.
+
+    Args:
+        channels: Source channels
+        id_mapping: Source to target IDs of matched and created objects
+        target_channels: Channels that were in the target server before the clone
+        synced_ids: IDs of the source channels synced with their category
+
+    Returns:
+        JSON body for PATCH /guilds/{id}/channels
+    """
+    target_channels = {channel.id: channel for channel in target_channels}
+    synced_ids = set(synced_ids)
+    positions = []
+    for channel in channels:
+        target_id = id_mapping.get(channel.id)
+        if target_id is None:
+            continue
+        parent_id = id_mapping.get(channel.parent_id) if channel.parent_id else None
+        target_channel = target_channels.get(target_id)
+        if target_channel is not None and (target_channel.position, target_channel.parent_id) == (
+            channel.position, parent_id
+        ):
+            continue
+        position = {"id": target_id, "position": channel.position, "parent_id": parent_id}
+        unsynced = (
+            target_channel is not None and target_channel.parent_id != parent_id and channel.id in synced_ids
+            and overwrite_set(target_channel.overwrites) != overwrite_set(
+                remap_overwrite(overwrite, id_mapping) for overwrite in channel.overwrites
+                if overwrite.type != ROLE_OVERWRITE or overwrite.id in id_mapping
+            )
+        )
+        if unsynced:
+            position["lock_permissions"] = True
+        positions.append(position)
+    return positions
+
+
+def positions_request(path: str, positions: List[Dict[str, Any]]) -> RequestSpec:
+    """
+    Build a bulk position request, skipped when there is nothing to order.
+
+    Args:
+        path: API path of the bulk endpoint
+        positions: Position updates
+
+    Returns:
+        Request path and body, or None to skip the request
+    """
+    return (path, positions) if positions else None
+
+
+def plan_channel_create(
+    target_server_id: str,
+    channel: Channel,
+    id_mapping: Dict[str, str],
+    synced: bool = False
+) -> Tuple[Callable[[], RequestSpec], Callable[[Optional[Dict[str, Any]]], Optional[List[Task]]]]:
+    """
+    Build the request and result handler of a channel create task.
+
+    The channel is created with its parent and overwrites remapped to the
+    target server. If Discord rejects the create, it is retried without
+    overwrites and each overwrite is then applied with its own PUT, so one
+    bad overwrite does not lose the channel or the other overwrites. A
+    synced channel is created without overwrites, so Discord syncs it with
+    its category.
+
+    Args:
+        target_server_id: ID of the server to create the channel in
+        channel: Source channel
+        id_mapping: Source to target IDs of created objects
+        synced: Whether the channel's overwrites are those of its category
+
+    Returns:
+        Tuple of (build, on_result) for the task
+    """
+    name = channel.name
+    path = f"/guilds/{target_server_id}/channels"
+    sent: Dict[str, Any] = {}
+
+    def build() -> RequestSpec:
+        parent_id = id_mapping.get(channel.parent_id) if channel.parent_id else None
+        if synced:
+            sent.update(channel_payload(channel.remapped(parent_id, ())))
+            del sent['permission_overwrites']
+        else:
+            sent.update(channel_payload(channel.remapped(
+                parent_id, remap_overwrites(channel.overwrites, id_mapping, name)
+            )))
+        return path, dict(sent)
+
+    def on_result(created: Optional[Dict[str, Any]]) -> Optional[List[Task]]:
+        if created:
+            id_mapping[channel.id] = created['id']
+            return None
+        if not sent.get('permission_overwrites'):
+            return None
+
+        logging.warning(f"Creating channel {name} with overwrites failed, retrying without them.")
+        return [Task(
+            f"create_channel_plain:{channel.id}", "POST",
+            request_spec(path, dict(sent, permission_overwrites=[])),
+            on_result=on_plain_result,
+            operation_name=f"creating channel {name}"
+        )]
+
+    def on_plain_result(created: Optional[Dict[str, Any]]) -> Optional[List[Task]]:
+        if not created:
+            return None
+        id_mapping[channel.id] = created['id']
+        return [
+            Task(
+                f"overwrite:{channel.id}:{overwrite['id']}", "PUT",
+                request_spec(f"/channels/{created['id']}/permissions/{overwrite['id']}", overwrite),
+                operation_name=f"updating permissions for channel {name}"
+            )
+            for overwrite in sent['permission_overwrites']
+        ]
+
+    return build, on_result
+
+
+def plan_emoji_create(
+    target_server_id: str,
+    emoji: Emoji,
+    assets: Optional[AssetFetcher]
+) -> Callable[[], RequestSpec]:
+    """
+    Plan the create request of an emoji.
+
+    Args:
+        target_server_id: ID of the server to create the emoji in
+        emoji: Source emoji, with its image attached if it came from a snapshot
+        assets: Fetcher downloading the image otherwise
+
+    Returns:
+        build() of the create task, waiting for the image download. The task
+        is skipped when the image could not be downloaded.
+    """
+    def build() -> RequestSpec:
+        image = emoji.image
+        if not image and assets:
+            image = assets.get(emoji_asset_path(emoji.id, emoji.animated))
+        if not image:
+            logging.warning(Fore.YELLOW + f"Skipping emoji {emoji.name}: no image available.")
+            return None
+        return f"/guilds/{target_server_id}/emojis", emoji_payload(Emoji(emoji.id, emoji.name, emoji.animated, image))
+
+    return build
+
+
+def record_mapping(
+    id_mapping: Dict[str, str],
+    source_id: str
+) -> Callable[[Optional[Dict[str, Any]]], None]:
+    """
+    Build a task result handler storing the ID of a created object.
+
+    Args:
+        id_mapping: Source to target IDs of created objects
+        source_id: ID of the source object
+
+    Returns:
+        Result handler for the task
+    """
+    def on_result(created: Optional[Dict[str, Any]]) -> None:
+        if created:
+            id_mapping[source_id] = created['id']
+    return on_result
+
+
+def plan_deletes(
+    graph: TaskGraph,
+    target_server_id: str,
+    target_roles: Iterable[Role],
+    target_channels: Iterable[Channel]
+) -> Tuple[List[str], List[str]]:
+    """
+    Add delete tasks for target roles and channels.
+
+    Args:
+        graph: Graph to add the tasks to
+        target_server_id: ID of the server to delete from
+        target_roles: Roles to delete, @everyone is always kept
+        target_channels: Channels to delete
+
+    Returns:
+        Tuple of (role delete task keys, channel delete task keys)
+    """
+    role_deletes = [
+        graph.add(Task(
+            f"delete_role:{role.id}", "DELETE",
+            request_spec(f"/guilds/{target_server_id}/roles/{role.id}"),
+            operation_name=f"deleting role {role.id}"
+        )).key
+        for role in target_roles
+        if role.id != target_server_id
+    ]
+
+    channel_deletes = [
+        graph.add(Task(
+            f"delete_channel:{channel.id}", "DELETE",
+            request_spec(f"/channels/{channel.id}"),
+            operation_name=f"deleting channel {channel.id}"
+        )).key
+        for channel in target_channels
+    ]
+
+    return role_deletes, channel_deletes
+
+
+def plan_creates(
+    graph: TaskGraph,
+    target_server_id: str,
+    roles: Iterable[Role],
+    channels: Iterable[Channel],
+    emojis: Iterable[Emoji],
+    id_mapping: Dict[str, str],
+    role_deps: List[str],
+    channel_deps: List[str],
+    assets: Optional[AssetFetcher] = None,
+    synced_ids: Iterable[str] = ()
+) -> None:
+    """
+    Add create tasks for roles, emojis and channels.
+
+    A channel depends only on its parent category and the roles named in its
+    overwrites, which are remapped and sent in the create call. Emoji images
+    start downloading right away and the emoji tasks are added last, so the
+    downloads overlap with role and channel creation.
+
+    Args:
+        graph: Graph to add the tasks to
+        target_server_id: ID of the server to create in
+        roles: Source roles to create
+        channels: Source channels to create
+        emojis: Source emojis to create
+        id_mapping: Source to target IDs, filled as objects are created
+        role_deps: Tasks every role create waits for
+        channel_deps: Tasks every channel create waits for
+        assets: Fetcher downloading emoji images that are not attached to
+            the emojis, None to only create emojis with attached images
+        synced_ids: IDs of the channels synced with their category (see
+            reconcile.synced_channel_ids). They are created without
+            overwrites once the category's overwrites are set.
+    """
+    synced_ids = set(synced_ids)
+    for role in roles:
+        graph.add(Task(
+            f"create_role:{role.id}", "POST",
+            request_spec(f"/guilds/{target_server_id}/roles", role_payload(role)),
+            deps=role_deps,
+            on_result=record_mapping(id_mapping, role.id),
+            operation_name=f"creating role {role.name}"
+        ))
+
+    for channel in channels:
+        synced = channel.id in synced_ids
+        deps = list(channel_deps)
+        if channel.parent_id:
+            deps.append(f"create_channel:{channel.parent_id}")
+        if synced:
+            # A matched category may have its overwrites patched first
+            deps.append(f"update_channel:{channel.parent_id}")
+        else:
+            deps.extend(
+                f"create_role:{overwrite.id}" for overwrite in channel.overwrites
+                if overwrite.type == ROLE_OVERWRITE
+            )
+
+        build, on_result = plan_channel_create(target_server_id, channel, id_mapping, synced)
+        graph.add(Task(
+            f"create_channel:{channel.id}", "POST", build,
+            deps=deps,
+            on_result=on_result,
+            operation_name=f"creating channel {channel.name}"
+        ))
+
+    emojis = list(emojis)
+    if assets:
+        assets.prefetch(emoji_asset_path(emoji.id, emoji.animated) for emoji in emojis if not emoji.image)
+
+    for emoji in emojis:
+        graph.add(Task(
+            f"create_emoji:{emoji.id}", "POST",
+            plan_emoji_create(target_server_id, emoji, assets),
+            on_result=record_mapping(id_mapping, emoji.id),
+            operation_name=f"creating emoji {emoji.name}",
+            blocking=True
+        ))
+
+
+def plan_position_sync(
+    graph: TaskGraph,
+    target_server_id: str,
+    roles: Iterable[Role],
+    channels: Iterable[Channel],
+    id_mapping: Dict[str, str],
+    target_roles: Iterable[Role],
+    target_channels: Iterable[Channel],
+    synced_ids: Iterable[str] = ()
+) -> None:
+    """
+    Add one bulk position update for roles and one for channels.
+
+    They run once every role and channel task is done and only carry the
+    objects whose position or parent differs from the source, and the
+    channels to sync with their category.
+
+    Args:
+        graph: Graph to add the tasks to
+        target_server_id: ID of the server to order
+        roles: Source roles
+        channels: Source channels
+        id_mapping: Source to target IDs of matched and created objects
+        target_roles: Roles that were in the target server before the clone
+        target_channels: Channels that were in the target server before the clone
+        synced_ids: IDs of the source channels synced with their category
+    """
+    roles, channels = list(roles), list(channels)
+    target_roles, target_channels = list(target_roles), list(target_channels)
+    synced_ids = set(synced_ids)
+    graph.add(Task(
+        "sync_role_positions", "PATCH",
+        lambda: positions_request(
+            f"/guilds/{target_server_id}/roles", role_positions(roles, id_mapping, target_roles)
+        ),
+        deps=[key for key in graph.tasks if key.startswith(("create_role:", "update_role:"))],
+        operation_name="syncing role positions"
+    ))
+    graph.add(Task(
+        "sync_channel_positions", "PATCH",
+        lambda: positions_request(
+            f"/guilds/{target_server_id}/channels",
+            channel_positions(channels, id_mapping, target_channels, synced_ids)
+        ),
+        deps=[key for key in graph.tasks if key.startswith(("create_channel:", "update_channel:"))],
+        operation_name="syncing channel positions"
+    ))
+
+
+def plan_guild_assets(
+    graph: TaskGraph,
+    target_server_id: str,
+    server_info: Dict[str, Any],
+    target_info: Dict[str, Any],
+    assets: Optional[AssetFetcher]
+) -> None:
+    """
+    Add a task copying the server icon, banner and splash images.
+
+    An image is only downloaded and sent when the target hash differs from
+    both the source hash and the hash the same image got when it was
+    uploaded before, so re-syncing an unchanged server sends nothing.
+    Images the target server lacks the feature for are skipped, because
+    they would fail the whole update.
+
+    Args:
+        graph: Graph to add the task to
+        target_server_id: ID of the server to update
+        server_info: Source server data, with "images" attached if it came
+            from a snapshot
+        target_info: Target server data
+        assets: Fetcher downloading the images
+    """
+    source_paths = guild_asset_paths(server_info)
+    images = server_info.get("images") or {}
+    features = set(target_info.get("features") or [])
+    cache = assets.cache if assets else None
+
+    changed: Dict[str, Optional[str]] = {}
+    for field in GUILD_ASSET_FIELDS:
+        source_hash = server_info.get(field)
+        current = target_info.get(field)
+        if current == source_hash:
+            continue
+        if current and source_hash and cache and current == cache.uploaded_hash(source_hash):
+            continue
+
+        feature = GUILD_ASSET_FEATURES.get(field)
+        if source_hash and source_hash.startswith("a_") and field in ("icon", "banner"):
+            feature = f"ANIMATED_{field.upper()}"
+        if source_hash and feature and feature not in features:
+            logging.info(Fore.YELLOW + f"Skipping server {field.replace('_', ' ')}: "
+                         f"the target server lacks the {feature} feature.")
+            continue
+        if source_hash and not images.get(field) and not assets:
+            continue
+        changed[field] = source_paths.get(field)
+
+    if not changed:
+        return
+    if assets:
+        assets.prefetch(path for field, path in changed.items() if path and not images.get(field))
+
+    def build() -> RequestSpec:
+        payload = {}
+        for field, asset_path in changed.items():
+            if asset_path is None:
+                # Cleared in the source
+                payload[field] = None
+                continue
+            image = images.get(field) or assets.get(asset_path)
+            if image:
+                payload[field] = image
+        return (f"/guilds/{target_server_id}", payload) if payload else None
+
+    def on_result(updated: Optional[Dict[str, Any]]) -> None:
+        if not cache or not isinstance(updated, dict):
+            return
+        for field in changed:
+            if server_info.get(field) and updated.get(field):
+                cache.record_upload(server_info[field], updated[field])
+
+    graph.add(Task(
+        "update_server_images", "PATCH", build,
+        on_result=on_result,
+        operation_name="updating server images",
+        blocking=True
+    ))
+
+
+def plan_everyone_update(
+    graph: TaskGraph,
+    target_server_id: str,
+    everyone: Role
+) -> None:
+    """
+    Add a task copying the @everyone permissions to the target server.
+
+    Args:
+        graph: Graph to add the task to
+        target_server_id: ID of the server to update
+        everyone: Source @everyone role
+    """
+    graph.add(Task(
+        "update_everyone_role", "PATCH",
+        request_spec(
+            f"/guilds/{target_server_id}/roles/{target_server_id}",
+            {"permissions": str(everyone.permissions)}
+        ),
+        operation_name="updating @everyone permissions"
+    ))
+
+
+def plan_clone(
+    source: Guild,
+    target: Guild,
+    id_mapping: Dict[str, str],
+    assets: Optional[AssetFetcher] = None,
+    kept_ids: Iterable[str] = (),
+    clone_filter: Optional[CloneFilter] = None
+) -> TaskGraph:
+    """
+    Build the operation graph of a full clone.
+
+    Every target role and channel is deleted and the source ones are
+    created. Creates wait for the deletes of their kind only when the target
+    would otherwise go over Discord's role or channel limit. Role and
+    channel order is set at the end with one bulk position update each.
+
+    With a filter only the target objects it selects are deleted and the
+    selected source objects created again. The roles and categories they
+    depend on are reconciled instead, since they are outside the clone.
+
+    Args:
+        source: Server to clone from
+        target: Server to clone to, as it is now
+        id_mapping: Filled with source to target IDs as objects are created
+        assets: Fetcher downloading emoji and server images
+        kept_ids: IDs of target roles and channels that are not deleted,
+            e.g. because an interrupted clone created them
+        clone_filter: Filter selecting the part of the server to clone,
+            None to clone all of it
+
+    Returns:
+        Task graph of the clone
+    """
+    kept_ids = set(kept_ids)
+    if clone_filter:
+        return plan_reconcile(
+            source, target, id_mapping, assets, clone_filter,
+            replaced_ids=clone_filter.scope(target) - kept_ids
+        )
+
+    graph = TaskGraph()
+
+    # The @everyone role shares its ID with the server
+    id_mapping[source.id] = target.id
+
+    target_roles = [role for role in target.roles.values() if role.id not in kept_ids]
+    target_channels = [channel for channel in target.channels.values() if channel.id not in kept_ids]
+    role_deletes, channel_deletes = plan_deletes(graph, target.id, target_roles, target_channels)
+    role_capacity_deps = role_deletes if len(target_roles) + len(source.roles) > MAX_ROLES else []
+    channel_capacity_deps = (
+        channel_deletes if len(target_channels) + len(source.channels) > MAX_CHANNELS else []
+    )
+
+    graph.add(Task(
+        "update_server_info", "PATCH",
+        request_spec(f"/guilds/{target.id}", server_info_payload(source)),
+        operation_name="updating server info"
+    ))
+    plan_guild_assets(graph, target.id, source.info, target.info, assets)
+
+    if source.everyone:
+        plan_everyone_update(graph, target.id, source.everyone)
+
+    plan_creates(
+        graph, target.id,
+        source.other_roles(), source.channels.values(), source.emojis.values(), id_mapping,
+        role_capacity_deps, channel_capacity_deps, assets, synced_channel_ids(source)
+    )
+    plan_position_sync(graph, target.id, source.roles.values(), source.channels.values(), id_mapping, [], [])
+
+    return graph
+
+
+def plan_channel_update(
+    graph: TaskGraph,
+    channel: Channel,
+    target_channel: Channel,
+    id_mapping: Dict[str, str],
+    synced: bool = False
+) -> None:
+    """
+    Add a task patching a target channel that differs from its source channel.
+
+    The task waits for the roles named in the overwrites that are still to
+    be created. Without such roles the changes are already known, so no
+    task is added when there are none.
+
+    Args:
+        graph: Graph to add the task to
+        channel: Source channel
+        target_channel: Matched target channel
+        id_mapping: Source to target IDs, filled as roles are created
+        synced: Whether the channel's overwrites are those of its category.
+            When the channel moves to another category, they are left to
+            the channel position sync, which syncs the channel with its new
+            category. Discord ignores lock_permissions without a parent
+            change, so a channel staying in its category gets the
+            category's overwrites here.
+    """
+    def build() -> RequestSpec:
+        parent_id = id_mapping.get(channel.parent_id) if channel.parent_id else None
+        if synced and parent_id != target_channel.parent_id:
+            overwrites = None
+        else:
+            overwrites = remap_overwrites(channel.overwrites, id_mapping, channel.name)
+        changes = channel_changes(channel, target_channel, overwrites)
+        return (f"/channels/{target_channel.id}", changes) if changes else None
+
+    deps = [
+        f"create_role:{overwrite.id}"
+        for overwrite in channel.overwrites
+        if overwrite.type == ROLE_OVERWRITE and f"create_role:{overwrite.id}" in graph
+    ]
+    if synced and f"create_channel:{channel.parent_id}" in graph:
+        # The new parent has to be known to tell whether the channel moves
+        deps.append(f"create_channel:{channel.parent_id}")
+    if not deps and build() is None:
+        return
+
+    graph.add(Task(
+        f"update_channel:{channel.id}", "PATCH", build,
+        deps=deps,
+        operation_name=f"updating channel {channel.name}"
+    ))
+
+
+def plan_reconcile(
+    source: Guild,
+    target: Guild,
+    id_mapping: Dict[str, str],
+    assets: Optional[AssetFetcher] = None,
+    clone_filter: Optional[CloneFilter] = None,
+    replaced_ids: Iterable[str] = ()
+) -> TaskGraph:
+    """
+    Build the minimal operation graph that makes the target match the source.
+
+    Objects are matched by name, type and parent (see reconcile.Reconciliation).
+    Matched objects are patched only when they differ, missing ones are
+    created and extra ones deleted. Extra emojis are kept, as in a full clone.
+
+    With a filter only the selected part of the source and its dependencies
+    are reconciled, and only extra target objects the filter selects are
+    deleted. Server settings and emojis are then left alone.
+
+    Args:
+        source: Server to clone from
+        target: Server to clone to, as it is now
+        id_mapping: Filled with source to target IDs of matched and created objects
+        assets: Fetcher downloading images of missing emojis and changed
+            server images
+        clone_filter: Filter selecting the part of the server to clone,
+            None to clone all of it
+        replaced_ids: IDs of target roles and channels that are deleted
+            and never matched, so their source objects are created again
+
+    Returns:
+        Task graph of the reconcile
+    """
+    graph = TaskGraph()
+    scope: Optional[Set[str]] = None
+    if clone_filter:
+        source = clone_filter.select(source)
+        scope = clone_filter.scope(target)
+
+    # The @everyone role shares its ID with the server
+    id_mapping[source.id] = target.id
+
+    replaced_roles: List[Role] = []
+    replaced_channels: List[Channel] = []
+    full_target = target
+    if replaced_ids:
+        target = target.copy()
+        for object_id in replaced_ids:
+            role = full_target.roles.get(object_id)
+            if role is not None and not role.managed and object_id != target.id:
+                replaced_roles.append(target.remove_role(object_id))
+            elif object_id in full_target.channels:
+                replaced_channels.append(target.remove_channel(object_id))
+
+    matching = Reconciliation(source, target)
+    id_mapping.update(matching.id_mapping())
+    synced_ids = synced_channel_ids(source)
+
+    role_deletes, channel_deletes = plan_deletes(
+        graph, target.id,
+        replaced_roles + [role for role in matching.roles_extra if scope is None or role.id in scope],
+        replaced_channels + [channel for channel in matching.channels_extra if scope is None or channel.id in scope]
+    )
+    role_capacity_deps = (
+        role_deletes if len(full_target.roles) + len(matching.roles_missing) > MAX_ROLES else []
+    )
+    channel_capacity_deps = (
+        channel_deletes if len(full_target.channels) + len(matching.channels_missing) > MAX_CHANNELS else []
+    )
+
+    if not clone_filter:
+        if target.name != source.name:
+            graph.add(Task(
+                "update_server_info", "PATCH",
+                request_spec(f"/guilds/{target.id}", server_info_payload(source)),
+                operation_name="updating server info"
+            ))
+        plan_guild_assets(graph, target.id, source.info, target.info, assets)
+
+    # Patch matched roles that differ
+    for source_id, target_role in matching.role_matches.items():
+        role = source.roles[source_id]
+        changes = role_changes(role, target_role)
+        if source_id == source.id:
+            if 'permissions' in changes:
+                plan_everyone_update(graph, target.id, role)
+            continue
+        if changes:
+            graph.add(Task(
+                f"update_role:{source_id}", "PATCH",
+                request_spec(f"/guilds/{target.id}/roles/{target_role.id}", changes),
+                operation_name=f"updating role {role.name}"
+            ))
+
+    plan_creates(
+        graph, target.id,
+        matching.roles_missing, matching.channels_missing, matching.emojis_missing,
+        id_mapping, role_capacity_deps, channel_capacity_deps, assets, synced_ids
+    )
+
+    # Patch matched channels that differ
+    for source_id, target_channel in matching.channel_matches.items():
+        plan_channel_update(
+            graph, source.channels[source_id], target_channel, id_mapping, source_id in synced_ids
+        )
+
+    plan_position_sync(
+        graph, target.id, source.roles.values(), source.channels.values(), id_mapping,
+        target.roles.values(), target.channels.values(), synced_ids
+    )
+
+    return graph
+
+
+def resume_plan(
+    graph: TaskGraph,
+    state: JournalState,
+    source: Guild,
+    target: Guild,
+    id_mapping: Dict[str, str]
+) -> int:
+    """
+    Drop the operations an interrupted clone already finished.
+
+    Besides the operations the journal recorded as finished, creates of
+    objects the journal mapped are dropped: the object exists even if the
+    create went through a fallback. Such channels are patched instead when
+    they still differ from their source, e.g. because the fallback was
+    interrupted before their overwrites were set.
+
+    Args:
+        graph: Plan of the resumed clone
+        state: Progress read from the journal
+        source: Server cloned from
+        target: Server cloned to, as it is now
+        id_mapping: Source to target IDs, seeded from the journal
+
+    Returns:
+        Number of dropped operations
+    """
+    dropped = 0
+    for key in list(graph.tasks):
+        kind, _, source_id = key.partition(":")
+        if key in state.completed or (kind.startswith("create_") and source_id in state.id_mapping):
+            graph.remove(key)
+            dropped += 1
+
+    for channel in source.channels.values():
+        target_channel = target.channels.get(state.id_mapping.get(channel.id))
+        if target_channel and f"update_channel:{channel.id}" not in graph:
+            plan_channel_update(graph, channel, target_channel, id_mapping)
+
+    return dropped
+
+
+def export_snapshot(
+    client: DiscordClient,
+    server_id: str,
+    path: str,
+    assets: Optional[AssetFetcher] = None
+) -> bool:
+    """
+    Save a server and its emoji and server images to a snapshot file.
+
+    Args:
+        client: Discord API client
+        server_id: ID of the server to export
+        path: Snapshot file to write
+        assets: Fetcher downloading the images, a cached one by default
+
+    Returns:
+        True if successful, False otherwise
+    """
+    logging.info(Fore.CYAN + f"Fetching server {server_id} for the snapshot...")
+    server_info, channels, roles, emojis = get_server_data(client, server_id)
+    if server_info is None or channels is None or roles is None:
+        logging.error(Fore.RED + "Failed to fetch server data. Aborting.")
+        return False
+
+    asset_paths = list(guild_asset_paths(server_info).values())
+    asset_paths.extend(emoji_asset_path(emoji['id'], emoji.get('animated')) for emoji in emojis or [])
+
+    fetcher = assets or AssetFetcher(cache=AssetCache())
+    fetcher.prefetch(asset_paths)
+
+    def downloaded_assets() -> Any:
+        for asset_path in asset_paths:
+            data_uri = fetcher.get(asset_path)
+            if data_uri:
+                yield asset_path, data_uri
+
+    try:
+        write_snapshot(path, server_info, channels, roles, emojis or [], downloaded_assets())
+    except OSError as e:
+        logging.error(Fore.RED + f"Failed to write snapshot {path}: {e}")
+        return False
+    finally:
+        if not assets:
+            fetcher.close()
+
+    logging.info(Fore.GREEN + f"Snapshot of {len(channels)} channels, {len(roles)} roles "
+                 f"and {len(emojis or [])} emojis saved to {path}.")
+    return True
+
+
+def load_snapshot_source(
+    path: str
+) -> Tuple[Optional[Dict], Optional[List], Optional[List], Optional[List]]:
+    """
+    Load the source server data of a clone from a snapshot file.
+
+    Emoji and server images stored in the snapshot are attached to their
+    emojis and to the server info, so they can be uploaded without touching
+    the source server.
+
+    Args:
+        path: Snapshot file to read
+
+    Returns:
+        Tuple of (server_info, channels, roles, emojis) or (None, None, None, None) on error
+    """
+    try:
+        snapshot = read_snapshot(path)
+    except SnapshotError as e:
+        logging.error(Fore.RED + str(e))
+        return None, None, None, None
+
+    for emoji in snapshot.emojis:
+        emoji["image"] = snapshot.assets.get(emoji_asset_path(emoji['id'], emoji.get('animated')))
+    snapshot.server_info["images"] = {
+        field: snapshot.assets[asset_path]
+        for field, asset_path in guild_asset_paths(snapshot.server_info).items()
+        if asset_path in snapshot.assets
+    }
+
+    logging.info(Fore.CYAN + f"Loaded snapshot of server {snapshot.server_info.get('id')} "
+                 f"taken at {snapshot.created_at}.")
+    return snapshot.server_info, snapshot.channels, snapshot.roles, snapshot.emojis
+
+
+class CloneResult:
+    """Outcome of a clone into one target server."""
+
+    def __init__(
+        self,
+        target_server_id: str,
+        success: bool = False,
+        operations: int = 0,
+        failed: int = 0,
+        elapsed: float = 0.0,
+        error: Optional[str] = None,
+        differences: Optional[Dict[str, int]] = None
+    ) -> None:
+        """
+        Create a clone result.
+
+        Args:
+            target_server_id: ID of the server cloned to
+            success: Whether the clone ran to the end
+            operations: Number of operations planned
+            failed: Number of operations that failed
+            elapsed: Seconds the clone took
+            error: Why the clone did not run to the end
+            differences: What still differs from the source after the
+                clone (see verify_clone), None if it was not verified
+        """
+        self.target_server_id = target_server_id
+        self.success = success
+        self.operations = operations
+        self.failed = failed
+        self.elapsed = elapsed
+        self.error = error
+        self.differences = differences
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Convert the result to JSON-serialisable data.
+
+        Returns:
+            Result fields keyed by name
+        """
+        return {
+            "target_server_id": self.target_server_id,
+            "success": self.success,
+            "operations": self.operations,
+            "failed": self.failed,
+            "elapsed": round(self.elapsed, 3),
+            "error": self.error,
+            "differences": self.differences
+        }
+
+
+def load_source(
+    client: DiscordClient,
+    source_server_id: Optional[str],
+    snapshot_path: Optional[str] = None,
+    source_cache: Optional[SourceCache] = None
+) -> Optional[Guild]:
+    """
+    Load the server to clone from.
+
+    Args:
+        client: Discord API client
+        source_server_id: ID of the server to clone from, unused with a snapshot
+        snapshot_path: Snapshot file to clone from instead of the source server
+        source_cache: Cache of source reads, None to always fetch the source
+
+    Returns:
+        Source server, or None on error
+    """
+    with client.metrics.phase("fetch_source"):
+        if snapshot_path:
+            server_info, channels, roles, emojis = load_snapshot_source(snapshot_path)
+        else:
+            server_info, channels, roles, emojis = fetch_source_data(client, source_server_id, source_cache)
+    if server_info is None or channels is None or roles is None:
+        return None
+    return Guild.from_data(server_info, channels, roles, emojis)
+
+
+def fetch_guild(client: DiscordClient, server_id: str) -> Optional[Guild]:
+    """
+    Fetch a server with its roles, channels and emojis.
+
+    The server is put in the client's state cache, so the state after later
+    writes can be read without fetching it again.
+
+    Args:
+        client: Discord API client
+        server_id: ID of the server
+
+    Returns:
+        The server, or None on error
+    """
+    server_info, channels, roles, emojis = get_server_data(client, server_id)
+    if server_info is None or channels is None or roles is None:
+        return None
+    guild = Guild.from_data(server_info, channels, roles, emojis)
+    client.state_cache.put(guild)
+    return guild
+
+
+def apply_clone(
+    client: DiscordClient,
+    source: Guild,
+    target_server_id: str,
+    engine: str = "sync",
+    concurrency: int = 1,
+    mode: str = "full",
+    assets: Optional[AssetFetcher] = None,
+    journal_path: Optional[str] = None,
+    resume: bool = False,
+    target: Optional[Guild] = None,
+    clone_filter: Optional[CloneFilter] = None
+) -> CloneResult:
+    """
+    Clone a loaded source server into one target server.
+
+    The source is only read, so one load can be applied to several targets
+    at once.
+
+    Args:
+        client: Discord API client
+        source: Server to clone
+        target_server_id: ID of the server to clone to
+        engine: "sync" or "async", see clone_server
+        concurrency: Maximum number of requests in flight
+        mode: "full" or "reconcile", see clone_server
+        assets: Fetcher downloading emoji and server images, a cached one
+            by default
+        journal_path: File recording the progress of the clone, None to not
+            record it
+        resume: Continue the clone recorded in journal_path instead of
+            starting over
+        target: Target server if already fetched
+        clone_filter: Filter selecting the part of the server to clone,
+            None to clone all of it
+
+    Returns:
+        Result of the clone
+    """
+    if engine == "async":
+        # aiohttp is only needed for the async engine
+        from async_engine import run_graph_with_client
+
+    result = CloneResult(target_server_id)
+
+    if target is None:
+        with client.metrics.phase("fetch_target"):
+            target = fetch_guild(client, target_server_id)
+    if target is None:
+        logging.error(Fore.RED + f"Failed to fetch target server {target_server_id} data. Aborting.")
+        result.error = "failed to fetch target server data"
+        return result
+
+    filter_data = clone_filter.to_dict() if clone_filter else {}
+    state = None
+    if resume and journal_path:
+        try:
+            state = read_journal(journal_path)
+        except JournalError as e:
+            logging.error(Fore.RED + str(e))
+            result.error = str(e)
+            return result
+        header = state.header
+        recorded = (header.get("source_server_id"), header.get("target_server_id"), header.get("mode"))
+        if recorded != (source.id, target_server_id, mode):
+            result.error = (f"The journal {journal_path} belongs to a {recorded[2]} clone of server "
+                            f"{recorded[0]} into server {recorded[1]}, it cannot be resumed by this clone.")
+        elif (header.get("filter") or {}) != filter_data:
+            result.error = (f"The journal {journal_path} belongs to a clone with other include and "
+                            f"exclude filters, it cannot be resumed by this clone.")
+        if result.error:
+            logging.error(Fore.RED + result.error)
+            return result
+        logging.info(Fore.CYAN + f"Resuming from {journal_path}: {len(state.completed)} operations "
+                     f"and {len(state.id_mapping)} created objects recorded.")
+
+    journal = None
+    id_mapping: Dict[str, str] = {}
+    if journal_path:
+        journal = Journal(journal_path, {
+            "source_server_id": source.id,
+            "target_server_id": target_server_id,
+            "mode": mode,
+            "filter": filter_data
+        }, state)
+        id_mapping = journal.mapping
+
+    fetcher = assets or AssetFetcher(cache=AssetCache())
+    started = time.monotonic()
+    try:
+        with client.metrics.phase("plan"):
+            if mode == "reconcile":
+                graph = plan_reconcile(source, target, id_mapping, fetcher, clone_filter)
+            else:
+                # Objects the interrupted clone created are not deleted again
+                created = state.id_mapping.values() if state else ()
+                graph = plan_clone(source, target, id_mapping, fetcher, created, clone_filter)
+
+            if state:
+                dropped = resume_plan(graph, state, source, target, id_mapping)
+                logging.info(Fore.CYAN + f"Skipping {dropped} operations finished before the interruption.")
+        if journal:
+            graph.listeners.append(journal.record_task)
+
+        logging.info(Fore.CYAN + f"Running {len(graph)} operations on server {target_server_id}...")
+        run_started = time.monotonic()
+        with client.metrics.phase("run"):
+            if engine == "async":
+                run_graph_with_client(client, graph, concurrency)
+            else:
+                run_graph(
+                    graph,
+                    lambda method, path, json_data, operation_name: make_request(
+                        client, method, path, json_data, operation_name
+                    ),
+                    workers=concurrency
+                )
+        log_critical_path(graph, time.monotonic() - run_started)
+    finally:
+        if not assets:
+            fetcher.close()
+        if journal:
+            journal.close()
+
+    result.success = True
+    result.operations = len(graph)
+    result.failed = sum(
+        1 for task in graph.tasks.values()
+        if task.finished_at is not None and task.result is None and not task.skipped
+    )
+    result.elapsed = time.monotonic() - started
+    result.differences = verify_clone(client, source, target_server_id, clone_filter)
+    return result
+
+
+def verify_clone(
+    client: DiscordClient,
+    source: Guild,
+    target_server_id: str,
+    clone_filter: Optional[CloneFilter] = None
+) -> Optional[Dict[str, int]]:
+    """
+    Check a cloned target against its source, without any request.
+
+    The target is read from the client's state cache, which the clone's own
+    responses kept up to date.
+
+    Args:
+        client: Discord API client that ran the clone
+        source: Server cloned from
+        target_server_id: ID of the server cloned to
+        clone_filter: Filter of a partial clone, only the part it selects
+            is checked
+
+    Returns:
+        What still differs (see Reconciliation.differences), None if the
+        target is not in the state cache
+    """
+    state = client.state_cache.get(target_server_id)
+    if state is None:
+        return None
+    target = state.snapshot()
+    scope = None
+    if clone_filter:
+        source = clone_filter.select(source)
+        scope = clone_filter.scope(target)
+    differences = Reconciliation(source, target).differences(source, target, scope)
+    if differences:
+        summary = ", ".join(f"{count} {kind.replace('_', ' ')}" for kind, count in differences.items())
+        logging.warning(Fore.YELLOW + f"Server {target_server_id} still differs from the source: {summary}.")
+    else:
+        logging.info(Fore.GREEN + f"Verified server {target_server_id}: it matches the source.")
+    return differences
+
+
+def check_drift(client: DiscordClient, server_id: str) -> Optional[Dict[str, List[str]]]:
+    """
+    Find changes made to a server outside the cloner.
+
+    The server is fetched again and compared with its cached state, which
+    then becomes the fresh one.
+
+    Args:
+        client: Discord API client
+        server_id: ID of the server
+
+    Returns:
+        Added, removed and changed object IDs (see GuildState.drift), empty
+        if the server was not cached before, None if it could not be fetched
+    """
+    state = client.state_cache.get(server_id)
+    server_info, channels, roles, emojis = get_server_data(client, server_id)
+    if server_info is None or channels is None or roles is None:
+        return None
+    fresh = Guild.from_data(server_info, channels, roles, emojis)
+    if state is None:
+        client.state_cache.put(fresh)
+        return {}
+
+    drift = state.drift(fresh)
+    state.replace(fresh)
+    if drift:
+        summary = ", ".join(f"{len(ids)} {kind.replace('_', ' ')}" for kind, ids in drift.items())
+        logging.warning(Fore.YELLOW + f"Server {server_id} changed outside the cloner: {summary}.")
+    return drift
+
+
+def clone_server(
+    client: DiscordClient,
+    source_server_id: Optional[str],
+    target_server_id: str,
+    user_id: Optional[str],
+    engine: str = "sync",
+    concurrency: int = 1,
+    mode: str = "full",
+    snapshot_path: Optional[str] = None,
+    source_cache: Optional[SourceCache] = None,
+    assets: Optional[AssetFetcher] = None,
+    journal_path: Optional[str] = None,
+    resume: bool = False,
+    clone_filter: Optional[CloneFilter] = None
+) -> bool:
+    """
+    Clone a Discord server from source to target.
+
+    Args:
+        client: Discord API client
+        source_server_id: ID of the server to clone from, unused with a snapshot
+        target_server_id: ID of the server to clone to
+        user_id: ID of the user to notify upon completion, None to not notify
+        engine: "sync" to run operations on worker threads with blocking
+            calls, "async" to run them with the asyncio engine
+        concurrency: Maximum number of requests in flight, 1 makes one call
+            at a time
+        mode: "full" to delete everything in the target and recreate it,
+            "reconcile" to only patch, create and delete what differs
+        snapshot_path: Snapshot file to clone from instead of the source
+            server, which then gets no requests at all
+        source_cache: Cache of source reads, None to always fetch the source
+        assets: Fetcher downloading emoji and server images, a cached one
+            by default
+        journal_path: File recording the progress of the clone, None to not
+            record it
+        resume: Continue the clone recorded in journal_path instead of
+            starting over
+        clone_filter: Filter selecting the part of the server to clone,
+            None to clone all of it
+
+    Returns:
+        True if successful, False otherwise
+    """
+    # Fetch source and target server data concurrently
+    logging.info(Fore.CYAN + "Fetching source and target server data...")
+    with ThreadPoolExecutor(max_workers=1) as executor, client.metrics.phase("fetch"):
+        target_future = executor.submit(fetch_guild, client, target_server_id)
+        source = load_source(client, source_server_id, snapshot_path, source_cache)
+        target = target_future.result()
+
+    if source is None:
+        logging.error(Fore.RED + "Failed to fetch source server data. Aborting.")
+        return False
+
+    result = apply_clone(
+        client, source, target_server_id, engine, concurrency, mode,
+        assets, journal_path, resume, target, clone_filter
+    )
+    if not result.success:
+        return False
+
+    # Send completion notification
+    logging.info(Fore.GREEN + "Server cloning completed!")
+    if user_id:
+        with client.metrics.phase("notify"):
+            send_dm(client, user_id, "The server has been successfully cloned.")
+
+    return True
+
+
+def clone_to_targets(
+    client: DiscordClient,
+    source_server_id: Optional[str],
+    target_server_ids: List[str],
+    user_id: Optional[str] = None,
+    engine: str = "sync",
+    concurrency: int = 1,
+    mode: str = "full",
+    snapshot_path: Optional[str] = None,
+    source_cache: Optional[SourceCache] = None,
+    assets: Optional[AssetFetcher] = None,
+    journal_dir: Optional[str] = None,
+    resume: bool = False,
+    parallel_targets: int = DEFAULT_PARALLEL_TARGETS,
+    clone_filter: Optional[CloneFilter] = None
+) -> List[CloneResult]:
+    """
+    Clone one source server into many target servers.
+
+    The source is loaded and its images are downloaded once, then the
+    clones run concurrently. They share the client's rate limiter, so
+    per-route buckets and the global limit are respected across all of them.
+    A failing target does not stop the others.
+
+    Args:
+        client: Discord API client
+        source_server_id: ID of the server to clone from, unused with a snapshot
+        target_server_ids: IDs of the servers to clone to
+        user_id: ID of the user to notify with the report, None to not notify
+        engine: "sync" or "async", see clone_server
+        concurrency: Maximum number of requests in flight per target
+        mode: "full" or "reconcile", see clone_server
+        snapshot_path: Snapshot file to clone from instead of the source server
+        source_cache: Cache of source reads, None to always fetch the source
+        assets: Fetcher downloading emoji and server images, a cached one
+            by default
+        journal_dir: Directory of the per-target journals, None to not
+            record progress
+        resume: Continue the clones recorded in the journals
+        parallel_targets: Number of targets cloned at the same time
+        clone_filter: Filter selecting the part of the server to clone,
+            None to clone all of it
+
+    Returns:
+        Result of every target, in the order of target_server_ids
+    """
+    logging.info(Fore.CYAN + "Fetching source server data...")
+    source = load_source(client, source_server_id, snapshot_path, source_cache)
+    if source is None:
+        logging.error(Fore.RED + "Failed to fetch source server data. Aborting.")
+        error = "failed to fetch source server data"
+        return [CloneResult(target_id, error=error) for target_id in target_server_ids]
+
+    fetcher = assets or AssetFetcher(cache=AssetCache())
+
+    def clone(target_server_id: str) -> CloneResult:
+        try:
+            return apply_clone(
+                client, source, target_server_id, engine, concurrency, mode, fetcher,
+                journal_path(target_server_id, journal_dir) if journal_dir else None, resume,
+                clone_filter=clone_filter
+            )
+        except Exception as e:
+            logging.error(Fore.RED + f"Clone into server {target_server_id} failed: {e}")
+            return CloneResult(target_server_id, error=str(e))
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, parallel_targets)) as executor:
+            results = list(executor.map(clone, target_server_ids))
+    finally:
+        if not assets:
+            fetcher.close()
+
+    log_clone_report(results)
+    if user_id:
+        succeeded = sum(1 for result in results if result.success)
+        send_dm(client, user_id, f"The server has been cloned into {succeeded} of {len(results)} servers.")
+    return results
+
+
+def log_clone_report(results: List[CloneResult]) -> None:
+    """
+    Log the outcome of every target of a fan-out clone.
+
+    Args:
+        results: Results of the clones
+    """
+    logging.info(Fore.CYAN + "Clone report:")
+    for result in results:
+        if not result.success:
+            logging.info(Fore.RED + f"  {result.target_server_id}: failed ({result.error})")
+        elif result.failed:
+            logging.info(Fore.YELLOW + f"  {result.target_server_id}: done in {result.elapsed:.1f}s, "
+                         f"{result.failed} of {result.operations} operations failed")
+        else:
+            logging.info(Fore.GREEN + f"  {result.target_server_id}: done in {result.elapsed:.1f}s, "
+                         f"{result.operations} operations")
+
+
+def report_metrics(
+    metrics: Metrics,
+    json_path: Optional[str] = None,
+    prometheus_path: Optional[str] = None,
+    concurrency_controller: Optional[ConcurrencyController] = None
+) -> None:
+    """
+    Log a summary of a run's request metrics and write them to files.
+
+    Args:
+        metrics: Collected metrics
+        json_path: File for the JSON report, None to skip it
+        prometheus_path: File for the Prometheus text, None to skip it
+        concurrency_controller: Adaptive concurrency limit of the run, if any
+    """
+    metrics.log_summary()
+    if concurrency_controller:
+        concurrency_controller.log_summary()
+    try:
+        metrics.write(json_path, prometheus_path)
+    except OSError as e:
+        logging.error(Fore.RED + f"Failed to write metrics: {e}")
+
+
+def add_network_arguments(parser: argparse.ArgumentParser) -> None:
+    """
+    Add the timeout and network retry options of DiscordClient to a parser.
+
+    Args:
+        parser: Command line parser to extend
+    """
+    parser.add_argument(
+        "--connect-timeout", metavar="SECONDS", type=float, default=DEFAULT_CONNECT_TIMEOUT,
+        help=f"seconds to wait for a connection to the API (default: {DEFAULT_CONNECT_TIMEOUT:g})"
+    )
+    parser.add_argument(
+        "--read-timeout", metavar="SECONDS", type=float, default=DEFAULT_TIMEOUT,
+        help=f"seconds to wait for an API response once connected (default: {DEFAULT_TIMEOUT:g})"
+    )
+    parser.add_argument(
+        "--network-retries", metavar="N", type=int, default=MAX_NETWORK_RETRIES,
+        help=f"retries for requests that time out, lose their connection or get a 5xx "
+             f"(default: {MAX_NETWORK_RETRIES})"
+    )
+
+
+def network_options(args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    Get the DiscordClient arguments of the options added by add_network_arguments.
+
+    Args:
+        args: Parsed options
+
+    Returns:
+        Keyword arguments for DiscordClient
+    """
+    return {
+        "timeout": args.read_timeout,
+        "connect_timeout": args.connect_timeout,
+        "max_network_retries": args.network_retries
+    }
@@ -0,0 +1,231 @@
+"""
+Adaptive concurrency control for the Discord Server Cloner.
+
+A fixed number of requests in flight is either too cautious or, when
+several cloners share one egress IP, keeps running into Discord's and
+Cloudflare's shared limits. The ConcurrencyController adjusts the number
+of requests in flight from the responses it sees, AIMD style: the limit
+grows by one per second while responses are fast and successful and the
+limit is in use, and is cut by a factor on a 429, a global rate limit, a
+server error or a latency spike. Independent cloners that each run a controller converge on
+a fair share of the capacity they compete for.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from typing import Optional, Dict, List, Any, Tuple
+
+DEFAULT_MIN_LIMIT = 1
+DEFAULT_INITIAL_LIMIT = 4
+
+# The limit grows by one at most this often. Discord rate limit windows are
+# whole seconds, so growing once per round trip would overshoot them long
+# before a 429 reports it.
+INCREASE_INTERVAL = 1.0
+
+# Multiplicative decreases per kind of congestion signal
+RATE_LIMIT_BACKOFF = 0.5
+GLOBAL_LIMIT_BACKOFF = 0.25
+LATENCY_BACKOFF = 0.8
+SERVER_ERROR_BACKOFF = 0.8
+
+# A latency spike is a recent latency this many times the baseline...
+LATENCY_TOLERANCE = 2.0
+# ...and at least this many seconds above it, so jitter on fast responses is ignored
+MIN_LATENCY_SPIKE = 0.05
+BASELINE_SMOOTHING = 0.05
+RECENT_SMOOTHING = 0.3
+
+
+class ConcurrencyController:
+    """
+    AIMD limit on the number of requests in flight.
+
+    Requests take a slot with acquire() or acquire_async() and give it back
+    with release(), reporting how the request went. Only responses to
+    requests sent after the last decrease can cause another one, so a burst
+    of 429s from requests that were already in flight counts once. The
+    controller is thread-safe and can be shared by blocking and asyncio
+    clients, like the rate limiter.
+    """
+
+    def __init__(
+        self,
+        max_limit: int,
+        min_limit: int = DEFAULT_MIN_LIMIT,
+        initial_limit: Optional[int] = None
+    ) -> None:
+        """
+        Create a controller.
+
+        Args:
+            max_limit: Most requests in flight the limit can grow to
+            min_limit: Fewest requests in flight the limit can shrink to
+            initial_limit: Limit to start at, DEFAULT_INITIAL_LIMIT capped
+                to max_limit by default
+        """
+        self.max_limit = max(1, max_limit)
+        self.min_limit = max(1, min(min_limit, self.max_limit))
+        start = initial_limit if initial_limit is not None else DEFAULT_INITIAL_LIMIT
+        self._limit = float(min(max(start, self.min_limit), self.max_limit))
+        self._condition = threading.Condition()
+        self._waiters: List[Tuple[asyncio.AbstractEventLoop, "asyncio.Future[None]"]] = []
+        self.in_flight = 0
+        self.peak_limit = int(self._limit)
+        self.baseline_latency: Optional[float] = None
+        self.recent_latency: Optional[float] = None
+        self._last_decrease_at = 0.0
+        self._last_change_at = time.monotonic()
+        self.increases = 0
+        self.decreases: Dict[str, int] = {}
+
+    @property
+    def limit(self) -> int:
+        """Current number of requests allowed in flight."""
+        return int(self._limit)
+
+    def try_acquire(self) -> bool:
+        """
+        Take a slot if one is free.
+
+        Returns:
+            True if the request may be sent now
+        """
+        with self._condition:
+            if self.in_flight < self.limit:
+                self.in_flight += 1
+                return True
+            return False
+
+    def acquire(self) -> None:
+        """Block until a slot is free and take it."""
+        with self._condition:
+            while self.in_flight >= self.limit:
+                self._condition.wait()
+            self.in_flight += 1
+
+    async def acquire_async(self) -> None:
+        """Wait in the running event loop until a slot is free and take it."""
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._condition:
+                if self.in_flight < self.limit:
+                    self.in_flight += 1
+                    return
+                future = loop.create_future()
+                self._waiters.append((loop, future))
+            await future
+
+    def release(
+        self,
+        started: float,
+        latency: float,
+        status_code: Optional[int],
+        global_limit: bool = False
+    ) -> None:
+        """
+        Give a slot back and adjust the limit to the outcome of its request.
+
+        Args:
+            started: time.monotonic() when the request was sent
+            latency: Seconds the request took
+            status_code: HTTP status code, None if no response was received
+            global_limit: Whether a 429 was a global or Cloudflare limit
+        """
+        with self._condition:
+            self.in_flight -= 1
+            if status_code == 429:
+                if global_limit:
+                    self._decrease(started, "global rate limit", GLOBAL_LIMIT_BACKOFF)
+                else:
+                    self._decrease(started, "rate limit", RATE_LIMIT_BACKOFF)
+            elif status_code is None or status_code >= 500:
+                self._decrease(started, "server error", SERVER_ERROR_BACKOFF)
+            elif self._latency_spike(latency):
+                self._decrease(
+                    started, "latency spike", LATENCY_BACKOFF,
+                    f" ({self.recent_latency * 1000:.0f}ms against {self.baseline_latency * 1000:.0f}ms)"
+                )
+            elif self.in_flight + 1 >= self.limit:
+                # Only grow while the limit is actually used, otherwise it says nothing
+                self._increase()
+            self._notify()
+
+    def _latency_spike(self, latency: float) -> bool:
+        """Fold a latency into the averages and check it against the baseline."""
+        if self.baseline_latency is None:
+            self.baseline_latency = self.recent_latency = latency
+            return False
+        self.recent_latency += RECENT_SMOOTHING * (latency - self.recent_latency)
+        spike = (self.recent_latency > self.baseline_latency * LATENCY_TOLERANCE
+                 and self.recent_latency - self.baseline_latency > MIN_LATENCY_SPIKE)
+        # The baseline follows slowly, so a lasting change of latency stops counting as a spike
+        self.baseline_latency += BASELINE_SMOOTHING * (latency - self.baseline_latency)
+        return spike
+
+    def _increase(self) -> None:
+        now = time.monotonic()
+        if self.limit >= self.max_limit or now - self._last_change_at < INCREASE_INTERVAL:
+            return
+        self._limit = float(self.limit + 1)
+        self._last_change_at = now
+        self.increases += 1
+        self.peak_limit = max(self.peak_limit, self.limit)
+        logging.debug(f"Concurrency limit raised to {self.limit}.")
+
+    def _decrease(self, started: float, reason: str, factor: float, details: str = "") -> None:
+        if started < self._last_decrease_at:
+            return
+        previous = self.limit
+        self._limit = max(float(self.min_limit), self._limit * factor)
+        self._last_decrease_at = self._last_change_at = time.monotonic()
+        self.decreases[reason] = self.decreases.get(reason, 0) + 1
+        if self.limit < previous:
+            logging.info(f"Concurrency limit cut from {previous} to {self.limit} after a {reason}{details}.")
+
+    def _notify(self) -> None:
+        """Wake blocked and awaiting acquirers so they check the limit again."""
+        self._condition.notify_all()
+        waiters, self._waiters = self._waiters, []
+        for loop, future in waiters:
+            try:
+                loop.call_soon_threadsafe(_wake, future)
+            except RuntimeError:
+                # The waiter's event loop has closed
+                pass
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Convert the controller state to JSON-serialisable data.
+
+        Returns:
+            Limits, adjustment counts and latency averages
+        """
+        with self._condition:
+            return {
+                "limit": self.limit,
+                "min_limit": self.min_limit,
+                "max_limit": self.max_limit,
+                "peak_limit": self.peak_limit,
+                "increases": self.increases,
+                "decreases": dict(self.decreases),
+                "baseline_latency": self.baseline_latency,
+                "recent_latency": self.recent_latency
+            }
+
+    def log_summary(self) -> None:
+        """Log the current limit and how often it was adjusted."""
+        state = self.to_dict()
+        decreases = ", ".join(f"{count} on {kind}" for kind, count in sorted(state["decreases"].items()))
+        logging.info(
+            f"Concurrency: limit {state['limit']} of {state['min_limit']}-{state['max_limit']}, "
+            f"peak {state['peak_limit']}, {state['increases']} increases, "
+            f"{sum(state['decreases'].values())} decreases{f' ({decreases})' if decreases else ''}"
+        )
+
+
+def _wake(future: "asyncio.Future[None]") -> None:
+    if not future.done():
+        future.set_result(None)
@@ -0,0 +1,309 @@
+"""
+Dry-run planner for the Discord Server Cloner.
+
+Fetches the source and target servers, builds the operation graph a clone
+would run and walks it with simulated responses instead of sending
+anything, so the exact list of write requests is known without touching
+the target. The requests are grouped by rate limit bucket and the clone
+time is estimated from the bucket limits, the request latency and the
+longest chain of dependent operations. Full and reconcile plans are
+compared, so large clones can be scheduled and cheap incremental syncs
+spotted before anything is changed.
+"""
+
+import logging
+import math
+from typing import Optional, Dict, List, Any, Tuple
+
+from colorama import Fore
+
+from assets import AssetCache, AssetFetcher
+from cache import SourceCache
+from cloner import (
+    DiscordClient,
+    fetch_guild,
+    load_source,
+    plan_clone,
+    plan_reconcile,
+    route_key,
+)
+from filters import CloneFilter
+from metrics import route_template
+from scheduler import TaskGraph, run_graph
+
+# Assumed when Discord has not reported a route's limit yet: its usual
+# per-route limit of 5 requests per 5 seconds
+DEFAULT_BUCKET_LIMIT = (5, 5.0)
+GLOBAL_RATE_LIMIT = 50  # Requests per second over all routes
+DEFAULT_LATENCY = 0.25  # Seconds per request when none was measured
+
+
+class PlannedRequest:
+    """A write request a clone would send."""
+
+    __slots__ = ("method", "path", "route", "operation_name")
+
+    def __init__(self, method: str, path: str, route: str, operation_name: str) -> None:
+        self.method = method
+        self.path = path
+        self.route = route
+        self.operation_name = operation_name
+
+
+class BucketEstimate:
+    """Requests of one rate limit bucket and the time its limit imposes."""
+
+    __slots__ = ("route", "requests", "limit", "window", "measured")
+
+    def __init__(self, route: str, limit: int, window: float, measured: bool) -> None:
+        self.route = route
+        self.requests = 0
+        self.limit = limit
+        self.window = window
+        self.measured = measured
+
+    @property
+    def seconds(self) -> float:
+        """Time the limit stretches the bucket's requests over at least."""
+        if self.requests <= self.limit:
+            return 0.0
+        return math.ceil(self.requests / self.limit - 1) * self.window
+
+
+class PlanEstimate:
+    """Requests and estimated duration of a clone plan."""
+
+    def __init__(
+        self,
+        mode: str,
+        requests: List[PlannedRequest],
+        buckets: Dict[str, BucketEstimate],
+        seconds: float,
+        critical_path: List[str]
+    ) -> None:
+        """
+        Create a plan estimate.
+
+        Args:
+            mode: "full" or "reconcile"
+            requests: Write requests of the plan, in the order they would start
+            buckets: Requests per rate limit bucket
+            seconds: Estimated wall-clock duration
+            critical_path: Task keys of the longest dependency chain
+        """
+        self.mode = mode
+        self.requests = requests
+        self.buckets = buckets
+        self.seconds = seconds
+        self.critical_path = critical_path
+
+    def routes(self) -> List[Dict[str, Any]]:
+        """
+        Summarise the buckets per method and route template.
+
+        Routes with the channel ID as major parameter get one bucket per
+        channel, so they are listed once with their bucket count.
+
+        Returns:
+            One entry per route, the most requested first
+        """
+        routes: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        for request in self.requests:
+            key = (request.method, route_template(request.path))
+            entry = routes.setdefault(key, {"method": key[0], "route": key[1], "requests": 0,
+                                            "buckets": set(), "seconds": 0.0})
+            entry["requests"] += 1
+            entry["buckets"].add(request.route)
+        for entry in routes.values():
+            bucket_estimates = [self.buckets[route] for route in entry["buckets"]]
+            entry["seconds"] = max(bucket.seconds for bucket in bucket_estimates)
+            entry["limit"] = f"{bucket_estimates[0].limit}/{bucket_estimates[0].window:g}s"
+            entry["measured"] = all(bucket.measured for bucket in bucket_estimates)
+            entry["buckets"] = len(entry["buckets"])
+        return sorted(routes.values(), key=lambda entry: entry["requests"], reverse=True)
+
+
+def simulate_plan(graph: TaskGraph, latency: float) -> List[PlannedRequest]:
+    """
+    Walk a plan with simulated responses and collect its requests.
+
+    Every request "succeeds" with a placeholder ID, so tasks that need IDs
+    of created objects are built exactly as in a real run. Nothing is sent.
+    Each task is then given the latency as its duration, so the graph's
+    critical path is the dependency chain at that latency.
+
+    Args:
+        graph: Plan to walk
+        latency: Assumed seconds per request
+
+    Returns:
+        Requests of the plan, in the order they would start
+    """
+    requests: List[PlannedRequest] = []
+
+    def request(method: str, path: str, json_data: Optional[Any], operation_name: str) -> Dict[str, Any]:
+        requests.append(PlannedRequest(method, path, route_key(method, path), operation_name))
+        return {"id": f"{len(requests):018d}"}
+
+    run_graph(graph, request, workers=1)
+    for task in graph.tasks.values():
+        task.started_at, task.finished_at = 0.0, (0.0 if task.skipped else latency)
+    return requests
+
+
+def estimate_plan(
+    mode: str,
+    graph: TaskGraph,
+    client: DiscordClient,
+    latency: float,
+    concurrency: int = 1
+) -> PlanEstimate:
+    """
+    Estimate the requests and duration of a plan.
+
+    With one request at a time the clone takes the latency of every request
+    plus the waits of buckets that run out. With more in flight it takes at
+    least the longest of: the requests spread over the concurrency, the
+    slowest bucket, the global limit and the critical path.
+
+    Args:
+        mode: "full" or "reconcile"
+        graph: Plan to estimate, it is consumed by the simulation
+        client: Client whose rate limiter holds the limits Discord reported
+        latency: Assumed seconds per request
+        concurrency: Requests in flight
+
+    Returns:
+        Estimate of the plan
+    """
+    requests = simulate_plan(graph, latency)
+
+    buckets: Dict[str, BucketEstimate] = {}
+    for request in requests:
+        bucket = buckets.get(request.route)
+        if bucket is None:
+            known = client.rate_limiter.known_limit(request.route)
+            limit, window = known or DEFAULT_BUCKET_LIMIT
+            # Discord reports the time left in the current window, windows are whole seconds
+            window = float(math.ceil(window))
+            bucket = buckets[request.route] = BucketEstimate(request.route, limit, window, known is not None)
+        bucket.requests += 1
+
+    critical_seconds, critical_path = graph.critical_path()
+    if concurrency <= 1:
+        seconds = sum(max(bucket.requests * latency, bucket.seconds + latency) for bucket in buckets.values())
+    else:
+        seconds = max(
+            len(requests) * latency / concurrency,
+            max((bucket.seconds + latency for bucket in buckets.values()), default=0.0),
+            len(requests) / GLOBAL_RATE_LIMIT,
+            critical_seconds
+        )
+    return PlanEstimate(mode, requests, buckets, seconds, critical_path)
+
+
+def measured_latency(client: DiscordClient) -> float:
+    """
+    Get the mean latency of the requests the client has made so far.
+
+    Args:
+        client: Client that fetched the servers
+
+    Returns:
+        Mean seconds per request, DEFAULT_LATENCY if there were none
+    """
+    totals = client.metrics.to_dict()["totals"]
+    if not totals["requests"]:
+        return DEFAULT_LATENCY
+    return totals["latency_seconds"] / totals["requests"]
+
+
+def dry_run(
+    client: DiscordClient,
+    source_server_id: Optional[str],
+    target_server_id: str,
+    concurrency: int = 1,
+    snapshot_path: Optional[str] = None,
+    source_cache: Optional[SourceCache] = None,
+    assets: Optional[AssetFetcher] = None,
+    modes: Tuple[str, ...] = ("full", "reconcile"),
+    clone_filter: Optional[CloneFilter] = None
+) -> Optional[Dict[str, PlanEstimate]]:
+    """
+    Plan a clone in every mode without changing the target server.
+
+    Only the source and target servers are read. Emoji and server images
+    are downloaded into the asset cache, so the real clone does not have
+    to download them again.
+
+    Args:
+        client: Discord API client
+        source_server_id: ID of the server to clone from, unused with a snapshot
+        target_server_id: ID of the server to clone to
+        concurrency: Requests in flight the clone would use
+        snapshot_path: Snapshot file to clone from instead of the source server
+        source_cache: Cache of source reads, None to always fetch the source
+        assets: Fetcher downloading emoji and server images, a cached one
+            by default
+        modes: Clone modes to plan
+        clone_filter: Filter selecting the part of the server to clone,
+            None to plan cloning all of it
+
+    Returns:
+        Estimate per mode, or None if a server could not be fetched
+    """
+    source = load_source(client, source_server_id, snapshot_path, source_cache)
+    if source is None:
+        logging.error(Fore.RED + "Failed to fetch source server data. Aborting.")
+        return None
+
+    with client.metrics.phase("fetch_target"):
+        target = fetch_guild(client, target_server_id)
+    if target is None:
+        logging.error(Fore.RED + f"Failed to fetch target server {target_server_id} data. Aborting.")
+        return None
+
+    latency = measured_latency(client)
+    fetcher = assets or AssetFetcher(cache=AssetCache())
+    estimates = {}
+    try:
+        for mode in modes:
+            if mode == "reconcile":
+                graph = plan_reconcile(source, target, {}, fetcher, clone_filter)
+            else:
+                graph = plan_clone(source, target, {}, fetcher, clone_filter=clone_filter)
+            estimates[mode] = estimate_plan(mode, graph, client, latency, concurrency)
+    finally:
+        if not assets:
+            fetcher.close()
+
+    log_dry_run(target_server_id, estimates, latency)
+    return estimates
+
+
+def log_dry_run(target_server_id: str, estimates: Dict[str, PlanEstimate], latency: float, top: int = 10) -> None:
+    """
+    Log the plans of a dry run and which mode is cheaper.
+
+    Args:
+        target_server_id: ID of the planned target server
+        estimates: Estimate per mode
+        latency: Assumed seconds per request
+        top: Number of routes to list per plan
+    """
+    logging.info(Fore.CYAN + f"Dry run for server {target_server_id}, "
+                 f"assuming {latency * 1000:.0f}ms per request. Nothing was changed.")
+    for estimate in estimates.values():
+        logging.info(Fore.CYAN + f"{estimate.mode.title()} clone: {len(estimate.requests)} requests "
+                     f"in {len(estimate.buckets)} rate limit buckets, about {estimate.seconds:.0f}s")
+        for route in estimate.routes()[:top]:
+            source = "reported" if route["measured"] else "assumed"
+            logging.info(f"  {route['method']:<6} {route['route']:<45} {route['requests']:>5} requests, "
+                         f"{route['buckets']:>4} buckets, {route['limit']} {source}, "
+                         f"{route['seconds']:.0f}s of waits")
+        if estimate.requests:
+            logging.info(f"  Longest dependency chain: {len(estimate.critical_path)} requests")
+
+    if len(estimates) > 1:
+        cheapest = min(estimates.values(), key=lambda estimate: (estimate.seconds, len(estimate.requests)))
+        logging.info(Fore.GREEN + f"The {cheapest.mode} clone is the cheapest plan for this target.")
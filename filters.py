@@ -0,0 +1,303 @@
+"""
+Selective clone filters for the Discord Server Cloner.
+
+A CloneFilter picks the part of a server a clone copies: categories,
+channels by name pattern and type, and roles by name, each with include
+and exclude patterns. Dependencies are added automatically, so a channel
+brings its parent category and the roles named in its overwrites. The
+same filter applied to the target gives the scope of the clone: only
+target objects the filter selects are ever deleted, and dependencies are
+matched or created but never deleted. Server settings and emojis are left
+alone by filtered clones.
+"""
+
+import argparse
+import fnmatch
+from typing import Optional, Dict, List, Any, Iterable, Set
+
+from model import CATEGORY_TYPE, ROLE_OVERWRITE, Channel, Guild
+
+# Channel types by the names the filters accept
+CHANNEL_TYPES = {
+    "text": 0,
+    "voice": 2,
+    "category": CATEGORY_TYPE,
+    "announcement": 5,
+    "stage": 13,
+    "forum": 15,
+    "media": 16
+}
+
+FILTER_FIELDS = (
+    "include_categories", "exclude_categories",
+    "include_channels", "exclude_channels",
+    "include_types", "exclude_types",
+    "include_roles", "exclude_roles"
+)
+
+
+def matches(name: str, patterns: Iterable[str]) -> bool:
+    """
+    Check a name against shell-style patterns, ignoring case.
+
+    Args:
+        name: Name of a category, channel or role
+        patterns: Patterns such as "general" or "team-*"
+
+    Returns:
+        True if any pattern matches
+    """
+    name = name.lower()
+    return any(fnmatch.fnmatchcase(name, pattern.lower()) for pattern in patterns)
+
+
+def parse_channel_type(value: Any) -> int:
+    """
+    Parse a channel type given by name or number.
+
+    Args:
+        value: Name from CHANNEL_TYPES or a Discord channel type number
+
+    Returns:
+        Discord channel type
+
+    Raises:
+        ValueError: If the type is unknown
+    """
+    text = str(value).strip().lower()
+    if text in CHANNEL_TYPES:
+        return CHANNEL_TYPES[text]
+    if text.isdigit():
+        return int(text)
+    raise ValueError(f"Unknown channel type {value!r}, use a number or one of {', '.join(CHANNEL_TYPES)}.")
+
+
+class CloneFilter:
+    """
+    Include and exclude patterns selecting the part of a server to clone.
+
+    Objects of a kind without any pattern of its own are only cloned as
+    dependencies once another kind is filtered: a filter naming one
+    category clones that category, its channels and the roles they need,
+    not every role.
+    """
+
+    def __init__(
+        self,
+        include_categories: Iterable[str] = (),
+        exclude_categories: Iterable[str] = (),
+        include_channels: Iterable[str] = (),
+        exclude_channels: Iterable[str] = (),
+        include_types: Iterable[int] = (),
+        exclude_types: Iterable[int] = (),
+        include_roles: Iterable[str] = (),
+        exclude_roles: Iterable[str] = ()
+    ) -> None:
+        """
+        Create a filter.
+
+        Args:
+            include_categories: Category name patterns, a channel is only
+                cloned if its category matches one
+            exclude_categories: Category name patterns whose categories and
+                channels are not cloned
+            include_channels: Channel name patterns, a channel is only
+                cloned if it matches one
+            exclude_channels: Channel name patterns that are not cloned
+            include_types: Channel types, a channel is only cloned if it
+                has one of them
+            exclude_types: Channel types that are not cloned
+            include_roles: Role name patterns, a role is cloned if it
+                matches one ("@everyone" copies its permissions)
+            exclude_roles: Role name patterns that are not cloned
+        """
+        self.include_categories = list(include_categories)
+        self.exclude_categories = list(exclude_categories)
+        self.include_channels = list(include_channels)
+        self.exclude_channels = list(exclude_channels)
+        self.include_types = [int(channel_type) for channel_type in include_types]
+        self.exclude_types = [int(channel_type) for channel_type in exclude_types]
+        self.include_roles = list(include_roles)
+        self.exclude_roles = list(exclude_roles)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "CloneFilter":
+        """
+        Build a filter from JSON data, e.g. a batch job's "filter" option.
+
+        Args:
+            data: Lists of patterns keyed by the __init__ argument names,
+                channel types as names or numbers
+
+        Returns:
+            New filter
+
+        Raises:
+            ValueError: If a key or channel type is unknown or a value is
+                not a list
+        """
+        unknown = set(data) - set(FILTER_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown filter options: {', '.join(sorted(unknown))}.")
+        values: Dict[str, List[Any]] = {}
+        for field, value in data.items():
+            if not isinstance(value, list):
+                raise ValueError(f"Filter option {field} must be a list.")
+            values[field] = [parse_channel_type(item) for item in value] if field.endswith("_types") else value
+        return cls(**values)
+
+    def to_dict(self) -> Dict[str, List[Any]]:
+        """
+        Convert the filter to JSON-serialisable data.
+
+        Returns:
+            Non-empty pattern lists keyed by name, {} for an empty filter
+        """
+        return {field: getattr(self, field) for field in FILTER_FIELDS if getattr(self, field)}
+
+    @property
+    def filters_channels(self) -> bool:
+        """Whether any category, channel or channel type pattern is set."""
+        return bool(self.include_categories or self.exclude_categories or self.include_channels
+                    or self.exclude_channels or self.include_types or self.exclude_types)
+
+    @property
+    def filters_roles(self) -> bool:
+        """Whether any role pattern is set."""
+        return bool(self.include_roles or self.exclude_roles)
+
+    def is_empty(self) -> bool:
+        """Whether the filter selects the whole server."""
+        return not self.filters_channels and not self.filters_roles
+
+    def _category_selected(self, category: Channel) -> bool:
+        if self.include_channels or self.include_types or category.type in self.exclude_types:
+            # Categories then only come along as parents of selected channels
+            return False
+        if self.include_categories and not matches(category.name, self.include_categories):
+            return False
+        return not matches(category.name, self.exclude_categories)
+
+    def _channel_selected(self, channel: Channel, category: Optional[Channel]) -> bool:
+        if self.include_categories and (category is None or not matches(category.name, self.include_categories)):
+            return False
+        if category is not None and matches(category.name, self.exclude_categories):
+            return False
+        if self.include_channels and not matches(channel.name, self.include_channels):
+            return False
+        if self.include_types and channel.type not in self.include_types:
+            return False
+        return not matches(channel.name, self.exclude_channels) and channel.type not in self.exclude_types
+
+    def scope(self, guild: Guild) -> Set[str]:
+        """
+        Get the IDs of the roles and channels the filter selects itself.
+
+        Applied to the target, these are the objects a clone may delete.
+        A category holding a channel the filter leaves out is never part of
+        it, so that channel does not lose its parent; the category only
+        comes along as a parent of selected channels.
+
+        Args:
+            guild: Server to select from
+
+        Returns:
+            IDs of the selected roles and channels, without dependencies
+        """
+        selected: Set[str] = set()
+        if self.filters_channels:
+            parents_of_left_out: Set[str] = set()
+            for channel in guild.channels.values():
+                if channel.is_category:
+                    continue
+                if self._channel_selected(channel, guild.channels.get(channel.parent_id or "")):
+                    selected.add(channel.id)
+                elif channel.parent_id:
+                    parents_of_left_out.add(channel.parent_id)
+            selected.update(
+                channel.id for channel in guild.channels.values()
+                if channel.is_category and channel.id not in parents_of_left_out and self._category_selected(channel)
+            )
+        if self.filters_roles:
+            selected.update(
+                role.id for role in guild.roles.values()
+                if (not self.include_roles or matches(role.name, self.include_roles))
+                and not matches(role.name, self.exclude_roles)
+            )
+        return selected
+
+    def select(self, guild: Guild) -> Guild:
+        """
+        Get the part of a server the filter selects, with its dependencies.
+
+        Selected channels bring their parent categories, and selected
+        channels and categories bring the roles named in their overwrites.
+        @everyone is only part of it when a role pattern selects it, the
+        planners always map it. Emojis are never part of it.
+
+        Args:
+            guild: Server to select from
+
+        Returns:
+            New guild with the same info and only the selected objects
+        """
+        selected = self.scope(guild)
+        for object_id in list(selected):
+            channel = guild.channels.get(object_id)
+            if channel is not None and channel.parent_id in guild.channels:
+                selected.add(channel.parent_id)
+        for object_id in list(selected):
+            channel = guild.channels.get(object_id)
+            if channel is not None:
+                selected.update(
+                    overwrite.id for overwrite in channel.overwrites
+                    if overwrite.type == ROLE_OVERWRITE and overwrite.id in guild.roles and overwrite.id != guild.id
+                )
+        return Guild(
+            dict(guild.info),
+            (role for role in guild.roles.values() if role.id in selected),
+            (channel for channel in guild.channels.values() if channel.id in selected)
+        )
+
+
+def add_filter_arguments(parser: argparse.ArgumentParser) -> None:
+    """
+    Add the include and exclude options of a CloneFilter to a parser.
+
+    Args:
+        parser: Command line parser to extend
+    """
+    group = parser.add_argument_group(
+        "partial clones", "only clone part of the server; patterns are case-insensitive and may use * and ?"
+    )
+    for kind, metavar, help_text in (
+        ("category", "PATTERN", "categories by name, with their channels"),
+        ("channel", "PATTERN", "channels by name"),
+        ("type", "TYPE", f"channels by type ({', '.join(CHANNEL_TYPES)} or a number)"),
+        ("role", "PATTERN", "roles by name")
+    ):
+        for action in ("include", "exclude"):
+            group.add_argument(
+                f"--{action}-{kind}", metavar=metavar, action="append", default=[],
+                type=parse_channel_type if kind == "type" else str,
+                help=f"{action} {help_text}, can be repeated"
+            )
+
+
+def filter_from_args(args: argparse.Namespace) -> Optional[CloneFilter]:
+    """
+    Build the filter given by the options of add_filter_arguments.
+
+    Args:
+        args: Parsed options
+
+    Returns:
+        Filter, None if no option was given
+    """
+    clone_filter = CloneFilter(
+        args.include_category, args.exclude_category,
+        args.include_channel, args.exclude_channel,
+        args.include_type, args.exclude_type,
+        args.include_role, args.exclude_role
+    )
+    return None if clone_filter.is_empty() else clone_filter
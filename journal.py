@@ -0,0 +1,190 @@
+"""
+Checkpoint journal for the Discord Server Cloner.
+
+Every completed operation and every source to target ID mapping of a clone
+is appended to a JSON Lines file and flushed to disk before the clone goes
+on, so an interrupted clone can be resumed instead of started over. A
+truncated last line, left behind by a crash mid-write, is ignored.
+"""
+
+import json
+import os
+import threading
+from datetime import datetime, timezone
+from typing import Optional, Dict, Any, Set
+
+from scheduler import Task
+
+JOURNAL_VERSION = 1
+DEFAULT_JOURNAL_DIR = os.path.join(".cache", "journals")
+
+
+def journal_path(target_server_id: str, directory: str = DEFAULT_JOURNAL_DIR) -> str:
+    """
+    Get the default journal file of a clone into a server.
+
+    Args:
+        target_server_id: ID of the server cloned to
+        directory: Directory holding the journals
+
+    Returns:
+        Path of the journal file
+    """
+    return os.path.join(directory, f"{target_server_id}.jsonl")
+
+
+class JournalError(Exception):
+    """Raised when a journal file is missing or not a clone journal."""
+
+
+class JournalState:
+    """Progress of a clone as recorded in its journal."""
+
+    def __init__(self, header: Dict[str, Any], completed: Set[str], id_mapping: Dict[str, str]) -> None:
+        """
+        Create a journal state.
+
+        Args:
+            header: Journal header with the source, target and mode of the clone
+            completed: Keys of the operations that finished
+            id_mapping: Source to target IDs of the objects that were created
+        """
+        self.header = header
+        self.completed = completed
+        self.id_mapping = id_mapping
+
+
+def read_journal(path: str) -> JournalState:
+    """
+    Read the progress recorded in a journal file.
+
+    Args:
+        path: File to read
+
+    Returns:
+        Recorded progress
+
+    Raises:
+        JournalError: If the file cannot be read or is not a clone journal
+    """
+    completed: Set[str] = set()
+    id_mapping: Dict[str, str] = {}
+
+    try:
+        with open(path, encoding="utf-8") as file:
+            try:
+                header = json.loads(file.readline() or "null")
+            except ValueError:
+                header = None
+            if not isinstance(header, dict) or header.get("type") != "header":
+                raise JournalError(f"{path} is not a clone journal.")
+
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Cut off by a crash while it was written
+                    continue
+                if record.get("type") == "task":
+                    completed.add(record["key"])
+                elif record.get("type") == "map":
+                    id_mapping[record["source"]] = record["target"]
+
+    except FileNotFoundError:
+        raise JournalError(f"No journal found at {path}, there is nothing to resume.")
+    except (OSError, KeyError) as e:
+        raise JournalError(f"Could not read journal {path}: {e}")
+
+    return JournalState(header, completed, id_mapping)
+
+
+class JournalMapping(dict):
+    """Source to target ID mapping that records every new entry in a journal."""
+
+    def __init__(self, journal: "Journal", initial: Optional[Dict[str, str]] = None) -> None:
+        super().__init__(initial or {})
+        self._journal = journal
+
+    def __setitem__(self, source_id: str, target_id: str) -> None:
+        if self.get(source_id) != target_id:
+            super().__setitem__(source_id, target_id)
+            self._journal.record_mapping(source_id, target_id)
+
+    def update(self, *args: Any, **kwargs: Any) -> None:
+        for source_id, target_id in dict(*args, **kwargs).items():
+            self[source_id] = target_id
+
+
+class Journal:
+    """Append-only journal of a running clone."""
+
+    def __init__(self, path: str, header: Dict[str, Any], state: Optional[JournalState] = None) -> None:
+        """
+        Start a new journal or continue a resumed one.
+
+        Args:
+            path: Journal file
+            header: Source, target and mode of the clone, written to a new journal
+            state: Progress read from the file when resuming, None to start over
+        """
+        self.path = path
+        self._lock = threading.Lock()
+
+        if state is None:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._file = open(path, "w", encoding="utf-8")
+            self._write(dict(
+                header, type="header", version=JOURNAL_VERSION,
+                started_at=datetime.now(timezone.utc).isoformat()
+            ))
+        else:
+            with open(path, "rb") as file:
+                file.seek(0, os.SEEK_END)
+                cut_off = False
+                if file.tell() > 0:
+                    file.seek(-1, os.SEEK_END)
+                    cut_off = file.read(1) != b"\n"
+            self._file = open(path, "a", encoding="utf-8")
+            if cut_off:
+                # Start on a new line after a record cut off by a crash
+                self._file.write("\n")
+
+        self.mapping = JournalMapping(self, state.id_mapping if state else None)
+
+    def _write(self, record: Dict[str, Any]) -> None:
+        """Append a record and force it to disk."""
+        with self._lock:
+            self._file.write(json.dumps(record, separators=(",", ":")) + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def record_mapping(self, source_id: str, target_id: str) -> None:
+        """
+        Record that a source object has a target counterpart.
+
+        Args:
+            source_id: ID of the source object
+            target_id: ID of the target object
+        """
+        self._write({"type": "map", "source": source_id, "target": target_id})
+
+    def record_task(self, task: Task, result: Optional[Any]) -> None:
+        """
+        Record a finished operation, unless it failed.
+
+        Args:
+            task: Finished scheduler task
+            result: Response of its request, None if it failed or was skipped
+        """
+        if result is not None or task.skipped:
+            self._write({"type": "task", "key": task.key})
+
+    def close(self) -> None:
+        """Close the journal file."""
+        self._file.close()
+
+    def __enter__(self) -> "Journal":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
@@ -0,0 +1,264 @@
+"""
+Request metrics for the Discord Server Cloner.
+
+Every Discord API call is counted per method and route template (IDs
+replaced by {id}) with its status code, latency, 429s, retries and the
+time spent waiting on rate limits. Named phases of a clone are timed as
+well. A run's metrics can be written as a JSON report or in the Prometheus
+text exposition format.
+"""
+
+import json
+import logging
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional, Dict, List, Any, Iterator, Tuple
+
+# Upper bounds of the latency histogram buckets in seconds
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+METRIC_PREFIX = "discord_cloner"
+
+ID_SEGMENT_PATTERN = re.compile(r"/\d+")
+
+
+def route_template(path: str) -> str:
+    """
+    Replace the IDs in an API path so calls to the same endpoint group together.
+
+    Args:
+        path: API path, e.g. "/guilds/123/roles/456"
+
+    Returns:
+        Route template, e.g. "/guilds/{id}/roles/{id}"
+    """
+    return ID_SEGMENT_PATTERN.sub("/{id}", path.split("?", 1)[0])
+
+
+class RouteStats:
+    """Counters of one method and route template."""
+
+    __slots__ = ("requests", "statuses", "rate_limited", "retries", "throttle_seconds", "latency_sum", "buckets")
+
+    def __init__(self) -> None:
+        self.requests = 0
+        self.statuses: Dict[str, int] = {}
+        self.rate_limited = 0
+        self.retries = 0
+        self.throttle_seconds = 0.0
+        self.latency_sum = 0.0
+        # Non-cumulative counts per bucket, the last one is +Inf
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    def observe(self, latency: float) -> None:
+        """Add a latency to the histogram."""
+        self.latency_sum += latency
+        for index, bound in enumerate(LATENCY_BUCKETS):
+            if latency <= bound:
+                self.buckets[index] += 1
+                return
+        self.buckets[-1] += 1
+
+
+class Metrics:
+    """Thread-safe collector of request and phase metrics."""
+
+    def __init__(self) -> None:
+        self.routes: Dict[Tuple[str, str], RouteStats] = {}
+        self.phases: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def record_request(
+        self,
+        method: str,
+        path: str,
+        status: Optional[int],
+        latency: float,
+        throttled: float = 0.0,
+        retry: bool = False
+    ) -> None:
+        """
+        Record one HTTP attempt.
+
+        Args:
+            method: HTTP method
+            path: API path of the request
+            status: HTTP status code, None if no response arrived
+            latency: Seconds from sending the request to the response
+            throttled: Seconds waited on the rate limiter before sending
+            retry: Whether the attempt retried an earlier one
+        """
+        key = (method, route_template(path))
+        status_label = str(status) if status is not None else "error"
+        with self._lock:
+            stats = self.routes.get(key)
+            if stats is None:
+                stats = self.routes[key] = RouteStats()
+            stats.requests += 1
+            stats.statuses[status_label] = stats.statuses.get(status_label, 0) + 1
+            if status == 429:
+                stats.rate_limited += 1
+            if retry:
+                stats.retries += 1
+            stats.throttle_seconds += throttled
+            stats.observe(latency)
+
+    def record_phase(self, name: str, seconds: float) -> None:
+        """
+        Record the duration of a clone phase.
+
+        Args:
+            name: Phase name, e.g. "plan"
+            seconds: Duration of the phase
+        """
+        with self._lock:
+            runs = self.phases.setdefault(name, [0, 0.0])
+            runs[0] += 1
+            runs[1] += seconds
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """
+        Time a block as a clone phase.
+
+        Args:
+            name: Phase name
+        """
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.record_phase(name, time.monotonic() - started)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Build the JSON report.
+
+        Returns:
+            Per-route counters, totals and phase timings
+        """
+        with self._lock:
+            routes = [
+                {
+                    "method": method,
+                    "route": route,
+                    "requests": stats.requests,
+                    "statuses": dict(stats.statuses),
+                    "rate_limited": stats.rate_limited,
+                    "retries": stats.retries,
+                    "throttle_seconds": round(stats.throttle_seconds, 3),
+                    "latency_seconds": round(stats.latency_sum, 3),
+                    "latency_histogram": {
+                        **{str(bound): count for bound, count in zip(LATENCY_BUCKETS, stats.buckets)},
+                        "+Inf": stats.buckets[-1]
+                    }
+                }
+                for (method, route), stats in sorted(self.routes.items(), key=lambda item: item[0][::-1])
+            ]
+            phases = {name: {"runs": runs, "seconds": round(seconds, 3)}
+                      for name, (runs, seconds) in self.phases.items()}
+
+        totals = {
+            field: sum(route[field] for route in routes)
+            for field in ("requests", "rate_limited", "retries")
+        }
+        totals["throttle_seconds"] = round(sum(route["throttle_seconds"] for route in routes), 3)
+        totals["latency_seconds"] = round(sum(route["latency_seconds"] for route in routes), 3)
+        return {"totals": totals, "routes": routes, "phases": phases}
+
+    def to_prometheus(self) -> str:
+        """
+        Render the metrics in the Prometheus text exposition format.
+
+        Returns:
+            Metrics text
+        """
+        lines: List[str] = []
+
+        def header(name: str, kind: str, description: str) -> str:
+            lines.append(f"# HELP {METRIC_PREFIX}_{name} {description}")
+            lines.append(f"# TYPE {METRIC_PREFIX}_{name} {kind}")
+            return f"{METRIC_PREFIX}_{name}"
+
+        with self._lock:
+            routes = sorted(self.routes.items(), key=lambda item: item[0][::-1])
+
+            name = header("requests_total", "counter", "Discord API requests by method, route and status.")
+            for (method, route), stats in routes:
+                for status, count in sorted(stats.statuses.items()):
+                    lines.append(f'{name}{{method="{method}",route="{route}",status="{status}"}} {count}')
+
+            for metric, field, description in (
+                ("rate_limited_total", "rate_limited", "Responses with status 429."),
+                ("retries_total", "retries", "Requests retried after a 429, a network error or a 5xx response."),
+                ("throttle_seconds_total", "throttle_seconds", "Seconds waited on rate limits before sending.")
+            ):
+                name = header(metric, "counter", description)
+                for (method, route), stats in routes:
+                    lines.append(f'{name}{{method="{method}",route="{route}"}} {getattr(stats, field)}')
+
+            name = header("request_duration_seconds", "histogram", "Discord API request latency.")
+            for (method, route), stats in routes:
+                labels = f'method="{method}",route="{route}"'
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS, stats.buckets):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {stats.requests}')
+                lines.append(f"{name}_sum{{{labels}}} {stats.latency_sum}")
+                lines.append(f"{name}_count{{{labels}}} {stats.requests}")
+
+            name = header("phase_seconds_total", "counter", "Seconds spent in each clone phase.")
+            for phase, (runs, seconds) in self.phases.items():
+                lines.append(f'{name}{{phase="{phase}"}} {seconds}')
+            name = header("phase_runs_total", "counter", "Times each clone phase ran.")
+            for phase, (runs, seconds) in self.phases.items():
+                lines.append(f'{name}{{phase="{phase}"}} {runs}')
+
+        return "\n".join(lines) + "\n"
+
+    def write(self, json_path: Optional[str] = None, prometheus_path: Optional[str] = None) -> None:
+        """
+        Write the metrics to files.
+
+        Args:
+            json_path: File for the JSON report, None to skip it
+            prometheus_path: File for the Prometheus text, None to skip it
+        """
+        if json_path:
+            with open(json_path, "w", encoding="utf-8") as file:
+                json.dump(self.to_dict(), file, indent=2)
+        if prometheus_path:
+            with open(prometheus_path, "w", encoding="utf-8") as file:
+                file.write(self.to_prometheus())
+
+    def log_summary(self, top: int = 5) -> None:
+        """
+        Log the totals, the phases and the routes that took the most time.
+
+        Args:
+            top: Number of routes to list
+        """
+        report = self.to_dict()
+        totals = report["totals"]
+        logging.info(
+            f"Requests: {totals['requests']}, 429s: {totals['rate_limited']}, "
+            f"retries: {totals['retries']}, {totals['latency_seconds']:.2f}s in requests, "
+            f"{totals['throttle_seconds']:.2f}s waiting on rate limits"
+        )
+        for name, phase in report["phases"].items():
+            logging.info(f"Phase {name}: {phase['seconds']:.2f}s over {phase['runs']} runs")
+        slowest = sorted(
+            report["routes"], key=lambda route: route["latency_seconds"] + route["throttle_seconds"], reverse=True
+        )
+        for route in slowest[:top]:
+            logging.info(
+                f"  {route['method']} {route['route']}: {route['requests']} requests, "
+                f"{route['latency_seconds']:.2f}s, {route['throttle_seconds']:.2f}s throttled"
+            )
+
+
+# Shared by every client that is not given its own collector
+METRICS = Metrics()
@@ -0,0 +1,732 @@
+"""
+Live mirroring for the Discord Server Cloner.
+
+Keeps a target server in sync with a source server by listening to the
+source's gateway events instead of re-running full clones. The mirror
+starts with a reconcile, which leaves the complete source to target ID
+mapping in the clone journal, and then turns role, channel, emoji and
+server updates into targeted writes on the mapped target objects. Changes
+are coalesced: a burst of updates to the same object within the debounce
+window becomes a single PATCH, and an object created and deleted within
+the window is never written at all. The target is read from the client's
+state cache, kept current by the mirror's own writes, and compared with a
+fresh fetch now and then so changes made to it by hand are repaired.
+
+The bot token is read from the DISCORD_BOT_TOKEN environment variable:
+
+    python mirror.py SOURCE_ID TARGET_ID --debounce 2
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from typing import Optional, Dict, List, Any, Callable, Set
+
+import aiohttp
+from colorama import Fore
+
+from assets import DISCORD_CDN_BASE_URL, AssetCache, AssetFetcher
+from cloner import (
+    DISCORD_API_BASE_URL,
+    TOKEN_ENV_VAR,
+    DiscordClient,
+    add_network_arguments,
+    apply_clone,
+    check_drift,
+    fetch_guild,
+    load_source,
+    make_request,
+    network_options,
+    plan_channel_update,
+    plan_creates,
+    plan_deletes,
+    plan_everyone_update,
+    plan_guild_assets,
+    plan_position_sync,
+    request_spec,
+    server_info_payload,
+    validate_id,
+)
+from journal import Journal, JournalError, journal_path, read_journal
+from model import Channel, Emoji, Guild, Role
+from reconcile import role_changes
+from scheduler import Task, TaskGraph, run_graph
+
+GATEWAY_VERSION = 10
+INTENT_GUILDS = 1 << 0  # Guild, role and channel events
+INTENT_GUILD_EMOJIS = 1 << 3  # GUILD_EMOJIS_UPDATE
+GATEWAY_INTENTS = INTENT_GUILDS | INTENT_GUILD_EMOJIS
+
+DEFAULT_DEBOUNCE = 2.0  # Seconds without new events before changes are written
+DEFAULT_DRIFT_INTERVAL = 300.0  # Seconds between checks of the target for changes made by hand
+MAX_DEBOUNCE_WINDOWS = 5  # Changes wait at most this many windows during a steady stream
+MAX_RECONNECT_DELAY = 60.0
+
+# Close codes after which reconnecting cannot help (bad token, intents, ...)
+FATAL_CLOSE_CODES = {4004, 4010, 4011, 4012, 4013, 4014}
+
+MIRRORED_EVENTS = {
+    "GUILD_UPDATE",
+    "GUILD_ROLE_CREATE", "GUILD_ROLE_UPDATE", "GUILD_ROLE_DELETE",
+    "CHANNEL_CREATE", "CHANNEL_UPDATE", "CHANNEL_DELETE",
+    "GUILD_EMOJIS_UPDATE"
+}
+
+
+class GatewayError(Exception):
+    """Raised when the gateway refuses the connection for good."""
+
+
+class Gateway:
+    """
+    Connection to the Discord gateway that passes dispatch events on.
+
+    Handles the heartbeat and reconnects after a dropped connection,
+    resuming the session so no event is missed when Discord allows it.
+    """
+
+    def __init__(
+        self,
+        token: str,
+        url: str,
+        on_dispatch: Callable[[str, Dict[str, Any]], None],
+        intents: int = GATEWAY_INTENTS
+    ) -> None:
+        """
+        Create a gateway connection.
+
+        Args:
+            token: Discord bot token
+            url: Gateway websocket URL from GET /gateway/bot
+            on_dispatch: Called with the name and data of every dispatch event
+            intents: Gateway intents to identify with
+        """
+        self.token = token
+        self.url = url
+        self.on_dispatch = on_dispatch
+        self.intents = intents
+        self.session_id: Optional[str] = None
+        self.resume_url: Optional[str] = None
+        self.sequence: Optional[int] = None
+        self.connected = asyncio.Event()
+
+    def _connect_url(self) -> str:
+        url = (self.resume_url if self.session_id and self.resume_url else self.url).rstrip("/")
+        return f"{url}/?v={GATEWAY_VERSION}&encoding=json" if "?" not in url else url
+
+    async def run(self, stop: asyncio.Event) -> None:
+        """
+        Stay connected until stop is set.
+
+        Args:
+            stop: Event ending the connection
+
+        Raises:
+            GatewayError: If Discord closes the connection with a fatal code
+        """
+        delay = 1.0
+        async with aiohttp.ClientSession() as session:
+            while not stop.is_set():
+                try:
+                    if await self._connection(session, stop):
+                        delay = 1.0
+                except (aiohttp.ClientError, asyncio.TimeoutError, ConnectionError) as e:
+                    logging.warning(f"Gateway connection failed: {e}")
+                self.connected.clear()
+                if stop.is_set():
+                    break
+                logging.info(f"Reconnecting to the gateway in {delay:.0f}s...")
+                try:
+                    await asyncio.wait_for(stop.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                delay = min(delay * 2, MAX_RECONNECT_DELAY)
+
+    async def _connection(self, session: aiohttp.ClientSession, stop: asyncio.Event) -> bool:
+        """
+        Run one websocket connection until it closes.
+
+        Returns:
+            True if the session was ready before the connection closed
+        """
+        ready = False
+        async with session.ws_connect(self._connect_url(), heartbeat=None) as ws:
+            hello = await ws.receive_json()
+            interval = hello["d"]["heartbeat_interval"] / 1000
+            acked = [True]
+
+            async def heartbeat() -> None:
+                await asyncio.sleep(interval * random.random())
+                while not ws.closed:
+                    if not acked[0]:
+                        # No ACK since the last heartbeat: the connection is dead
+                        await ws.close(code=4000)
+                        return
+                    acked[0] = False
+                    await ws.send_json({"op": 1, "d": self.sequence})
+                    await asyncio.sleep(interval)
+
+            async def close_on_stop() -> None:
+                await stop.wait()
+                await ws.close()
+
+            if self.session_id:
+                await ws.send_json({"op": 6, "d": {
+                    "token": self.token, "session_id": self.session_id, "seq": self.sequence
+                }})
+            else:
+                await ws.send_json({"op": 2, "d": {
+                    "token": self.token, "intents": self.intents,
+                    "properties": {"os": sys.platform, "browser": "discord-cloner", "device": "discord-cloner"}
+                }})
+
+            tasks = [asyncio.ensure_future(heartbeat()), asyncio.ensure_future(close_on_stop())]
+            try:
+                async for message in ws:
+                    if message.type != aiohttp.WSMsgType.TEXT:
+                        break
+                    payload = message.json()
+                    op = payload.get("op")
+
+                    if op == 0:
+                        self.sequence = payload.get("s") or self.sequence
+                        event, data = payload.get("t"), payload.get("d") or {}
+                        if event == "READY":
+                            self.session_id = data.get("session_id")
+                            self.resume_url = data.get("resume_gateway_url")
+                        if event in ("READY", "RESUMED"):
+                            ready = True
+                            self.connected.set()
+                            logging.info(Fore.GREEN + f"Gateway {'resumed' if event == 'RESUMED' else 'ready'}.")
+                        self.on_dispatch(event, data)
+                    elif op == 1:
+                        await ws.send_json({"op": 1, "d": self.sequence})
+                    elif op == 7:
+                        logging.info("The gateway asked to reconnect.")
+                        break
+                    elif op == 9:
+                        if not payload.get("d"):
+                            self.session_id = None
+                            self.sequence = None
+                        logging.info("The gateway session is invalid, identifying again.")
+                        await asyncio.sleep(1 + random.random() * 4)
+                        break
+                    elif op == 11:
+                        acked[0] = True
+            finally:
+                for task in tasks:
+                    task.cancel()
+
+        if ws.close_code in FATAL_CLOSE_CODES:
+            raise GatewayError(f"The gateway closed the connection with code {ws.close_code}.")
+        return ready
+
+
+class Mirror:
+    """
+    Source and target state of a mirror and the source changes not yet written.
+
+    Gateway events only update the source state and mark objects as
+    changed. flush() later compares every changed object with its mapped
+    target object and writes just the difference, so any number of events
+    for an object since the last flush cost at most one request.
+    """
+
+    def __init__(
+        self,
+        client: DiscordClient,
+        source: Guild,
+        target_server_id: str,
+        id_mapping: Dict[str, str],
+        assets: Optional[AssetFetcher] = None,
+        debounce: float = DEFAULT_DEBOUNCE,
+        concurrency: int = 1
+    ) -> None:
+        """
+        Create a mirror.
+
+        Args:
+            client: Discord API client
+            source: Server to mirror, copied so events do not change the caller's
+            target_server_id: ID of the server to keep in sync
+            id_mapping: Source to target IDs, extended as objects are created
+            assets: Fetcher downloading emoji and server images
+            debounce: Seconds without new events before changes are written
+            concurrency: Requests in flight while writing changes
+        """
+        self.client = client
+        self.source_server_id = source.id
+        self.target_server_id = target_server_id
+        self.id_mapping = id_mapping
+        self.assets = assets
+        self.debounce = debounce
+        self.concurrency = concurrency
+
+        self.source = source.copy()
+
+        self.dirty_roles: Set[str] = set()
+        self.dirty_channels: Set[str] = set()
+        self.emojis_dirty = False
+        self.guild_dirty = False
+        self.first_change_at: Optional[float] = None
+        self.last_change_at: Optional[float] = None
+
+        self.events = 0
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def target(self) -> Guild:
+        """
+        Get the current target server state from the client's state cache.
+
+        Returns:
+            Copy of the target, empty if it was never fetched
+        """
+        state = self.client.state_cache.get(self.target_server_id)
+        return state.snapshot() if state else Guild({"id": self.target_server_id})
+
+    def mark_drift(self, drift: Dict[str, List[str]]) -> None:
+        """
+        Mark the source objects whose target objects changed by hand.
+
+        The next flush compares them again and restores the target objects,
+        recreating deleted ones. Objects added to the target by hand are
+        left alone.
+
+        Args:
+            drift: Drift of the target (see state.GuildState.drift)
+        """
+        source_ids = {target_id: source_id for source_id, target_id in self.id_mapping.items()}
+        with self._lock:
+            for kind, target_ids in drift.items():
+                changed = {source_ids[target_id] for target_id in target_ids if target_id in source_ids}
+                if kind.startswith("roles_"):
+                    self.dirty_roles |= changed
+                elif kind.startswith("channels_"):
+                    self.dirty_channels |= changed
+                elif kind.startswith("emojis_"):
+                    self.emojis_dirty = self.emojis_dirty or bool(changed)
+                else:
+                    self.guild_dirty = True
+            if self.dirty_roles or self.dirty_channels or self.emojis_dirty or self.guild_dirty:
+                now = time.monotonic()
+                self.last_change_at = now - self.debounce
+                if self.first_change_at is None:
+                    self.first_change_at = now
+
+    def handle_event(self, event: str, data: Dict[str, Any]) -> None:
+        """
+        Apply a gateway event of the source server to the source state.
+
+        Args:
+            event: Dispatch event name
+            data: Event data
+        """
+        if event not in MIRRORED_EVENTS:
+            return
+        guild_id = data.get('id') if event == "GUILD_UPDATE" else data.get('guild_id')
+        if guild_id != self.source_server_id:
+            return
+
+        with self._lock:
+            if event == "GUILD_UPDATE":
+                self.source.info.update(data)
+                self.guild_dirty = True
+            elif event == "GUILD_ROLE_DELETE":
+                self.source.remove_role(data['role_id'])
+                self.dirty_roles.add(data['role_id'])
+            elif event.startswith("GUILD_ROLE_"):
+                self.source.add_role(Role.from_dict(data['role']))
+                self.dirty_roles.add(data['role']['id'])
+            elif event == "CHANNEL_DELETE":
+                self.source.remove_channel(data['id'])
+                self.dirty_channels.add(data['id'])
+            elif event.startswith("CHANNEL_"):
+                self.source.add_channel(Channel.from_dict(data))
+                self.dirty_channels.add(data['id'])
+            else:
+                self.source.set_emojis(Emoji.from_dict(emoji) for emoji in data.get('emojis') or [])
+                self.emojis_dirty = True
+
+            now = time.monotonic()
+            self.events += 1
+            self.last_change_at = now
+            if self.first_change_at is None:
+                self.first_change_at = now
+
+    def due(self, now: float) -> bool:
+        """
+        Check whether the pending changes should be written.
+
+        Args:
+            now: Current time.monotonic()
+
+        Returns:
+            True once no event arrived for the debounce window, or the
+            oldest pending change waited MAX_DEBOUNCE_WINDOWS windows
+        """
+        with self._lock:
+            if self.first_change_at is None:
+                return False
+            return (now - self.last_change_at >= self.debounce
+                    or now - self.first_change_at >= self.debounce * MAX_DEBOUNCE_WINDOWS)
+
+    def flush(self) -> int:
+        """
+        Write the pending changes to the target server.
+
+        Returns:
+            Number of requests sent
+        """
+        with self._lock:
+            role_ids, self.dirty_roles = self.dirty_roles, set()
+            channel_ids, self.dirty_channels = self.dirty_channels, set()
+            emojis_dirty, self.emojis_dirty = self.emojis_dirty, False
+            guild_dirty, self.guild_dirty = self.guild_dirty, False
+            self.first_change_at = self.last_change_at = None
+            source = self.source.copy()
+
+        graph = self.plan_changes(source, role_ids, channel_ids, emojis_dirty, guild_dirty)
+        sent = [0]
+
+        def count_request(task: Task, result: Optional[Any]) -> None:
+            if not task.skipped:
+                sent[0] += 1
+
+        graph.listeners.append(count_request)
+        run_graph(
+            graph,
+            lambda method, path, json_data, operation_name: make_request(
+                self.client, method, path, json_data, operation_name
+            ),
+            workers=self.concurrency
+        )
+
+        self.requests += sent[0]
+        if sent[0]:
+            logging.info(Fore.GREEN + f"Mirrored {len(role_ids)} role, {len(channel_ids)} channel"
+                         f"{', emoji' if emojis_dirty else ''}{', server' if guild_dirty else ''} "
+                         f"changes with {sent[0]} requests.")
+        return sent[0]
+
+    def plan_changes(
+        self,
+        source: Guild,
+        role_ids: Set[str],
+        channel_ids: Set[str],
+        emojis_dirty: bool,
+        guild_dirty: bool
+    ) -> TaskGraph:
+        """
+        Build the operations bringing the changed objects of the target in line.
+
+        Objects whose target counterpart is missing are created, so a target
+        object deleted by hand is restored with the next change to it.
+
+        Args:
+            source: Source server as of the flush
+            role_ids: IDs of the changed source roles
+            channel_ids: IDs of the changed source channels
+            emojis_dirty: Whether the source emoji list changed
+            guild_dirty: Whether the source server data changed
+
+        Returns:
+            Task graph of the changes
+        """
+        graph = TaskGraph()
+        target_id = self.target_server_id
+        target = self.target()
+
+        created_roles, deleted_roles = [], []
+        for source_id in sorted(role_ids):
+            role = source.roles.get(source_id)
+            target_role = target.roles.get(self.id_mapping.get(source_id))
+            if source_id == source.id:
+                if role and (target_role is None or role.permissions != target_role.permissions):
+                    plan_everyone_update(graph, target_id, role)
+            elif role is None:
+                if target_role:
+                    deleted_roles.append(target_role)
+            elif target_role is None:
+                created_roles.append(role)
+            elif not role.managed:
+                changes = role_changes(role, target_role)
+                if changes:
+                    graph.add(Task(
+                        f"update_role:{source_id}", "PATCH",
+                        request_spec(f"/guilds/{target_id}/roles/{target_role.id}", changes),
+                        operation_name=f"updating role {role.name}"
+                    ))
+
+        created_channels, deleted_channels, updated_channels = [], [], []
+        for source_id in sorted(channel_ids):
+            channel = source.channels.get(source_id)
+            target_channel = target.channels.get(self.id_mapping.get(source_id))
+            if channel is None:
+                if target_channel:
+                    deleted_channels.append(target_channel)
+            elif target_channel is None:
+                created_channels.append(channel)
+            else:
+                updated_channels.append((channel, target_channel))
+
+        plan_deletes(graph, target_id, deleted_roles, deleted_channels)
+
+        created_emojis = []
+        if emojis_dirty:
+            for source_id, emoji in source.emojis.items():
+                target_emoji = target.emojis.get(self.id_mapping.get(source_id))
+                if target_emoji is None:
+                    created_emojis.append(emoji)
+                elif target_emoji.name != emoji.name:
+                    graph.add(Task(
+                        f"update_emoji:{source_id}", "PATCH",
+                        request_spec(f"/guilds/{target_id}/emojis/{target_emoji.id}", {"name": emoji.name}),
+                        operation_name=f"renaming emoji {emoji.name}"
+                    ))
+            for source_id, mapped_id in list(self.id_mapping.items()):
+                if mapped_id in target.emojis and source_id not in source.emojis:
+                    graph.add(Task(
+                        f"delete_emoji:{mapped_id}", "DELETE",
+                        request_spec(f"/guilds/{target_id}/emojis/{mapped_id}"),
+                        operation_name=f"deleting emoji {mapped_id}"
+                    ))
+
+        # Creates are ordered like in a clone: categories before their channels
+        created_channels.sort(key=lambda channel: (not channel.is_category, channel.position))
+        plan_creates(
+            graph, target_id, created_roles, created_channels, created_emojis,
+            self.id_mapping, [], [], self.assets
+        )
+        for channel, target_channel in updated_channels:
+            plan_channel_update(graph, channel, target_channel, self.id_mapping)
+
+        if role_ids or channel_ids:
+            plan_position_sync(
+                graph, target_id, source.roles.values(), source.channels.values(), self.id_mapping,
+                target.roles.values(), target.channels.values()
+            )
+
+        if guild_dirty:
+            if target.name != source.name:
+                graph.add(Task(
+                    "update_server_info", "PATCH",
+                    request_spec(f"/guilds/{target_id}", server_info_payload(source)),
+                    operation_name="updating server info"
+                ))
+            plan_guild_assets(graph, target_id, source.info, target.info, self.assets)
+
+        return graph
+
+
+def gateway_url(client: DiscordClient) -> Optional[str]:
+    """
+    Ask Discord for the gateway URL.
+
+    Args:
+        client: Discord API client
+
+    Returns:
+        Websocket URL, None on error
+    """
+    result = make_request(client, "GET", "/gateway/bot", operation_name="fetching the gateway URL")
+    return result.get('url') if isinstance(result, dict) else None
+
+
+async def run_mirror(
+    client: DiscordClient,
+    source_server_id: str,
+    target_server_id: str,
+    url: Optional[str] = None,
+    debounce: float = DEFAULT_DEBOUNCE,
+    concurrency: int = 1,
+    assets: Optional[AssetFetcher] = None,
+    journal_file: Optional[str] = None,
+    initial_sync: bool = True,
+    stop: Optional[asyncio.Event] = None,
+    drift_interval: float = DEFAULT_DRIFT_INTERVAL
+) -> bool:
+    """
+    Mirror a source server into a target server until stopped.
+
+    The gateway is connected before the initial reconcile, so changes made
+    while it runs are mirrored right after it.
+
+    Args:
+        client: Discord API client
+        source_server_id: ID of the server to mirror
+        target_server_id: ID of the server to keep in sync
+        url: Gateway URL, asked from Discord by default
+        debounce: Seconds without new events before changes are written
+        concurrency: Requests in flight while writing changes
+        assets: Fetcher downloading emoji and server images, a cached one
+            by default
+        journal_file: Journal holding the ID mapping, the target's default
+            journal by default
+        initial_sync: Reconcile the target first. Without it the ID mapping
+            of an earlier clone is read from the journal.
+        stop: Event ending the mirror, which otherwise runs until cancelled
+        drift_interval: Seconds between checks of the target for changes
+            made by hand, 0 to never check
+
+    Returns:
+        False if the mirror could not start or the gateway refused it
+    """
+    loop = asyncio.get_running_loop()
+    stop = stop or asyncio.Event()
+    journal_file = journal_file or journal_path(target_server_id)
+    fetcher = assets or AssetFetcher(cache=AssetCache())
+
+    source = await loop.run_in_executor(None, load_source, client, source_server_id)
+    if source is None:
+        logging.error(Fore.RED + "Failed to fetch source server data. Aborting.")
+        return False
+
+    url = url or await loop.run_in_executor(None, gateway_url, client)
+    if not url:
+        logging.error(Fore.RED + "Failed to get the gateway URL. Aborting.")
+        return False
+
+    mirror = Mirror(client, source, target_server_id, {}, fetcher, debounce, concurrency)
+    gateway = Gateway(client.token, url, mirror.handle_event)
+    gateway_task = asyncio.ensure_future(gateway.run(stop))
+    journal = None
+
+    try:
+        if initial_sync:
+            logging.info(Fore.CYAN + "Reconciling the target server before mirroring...")
+            result = await loop.run_in_executor(
+                None, apply_clone, client, source, target_server_id, "sync", concurrency,
+                "reconcile", fetcher, journal_file
+            )
+            if not result.success:
+                return False
+
+        try:
+            state = read_journal(journal_file)
+        except JournalError as e:
+            logging.error(Fore.RED + f"{e} Run the mirror with the initial reconcile first.")
+            return False
+        journal = Journal(journal_file, state.header, state)
+        mirror.id_mapping = journal.mapping
+
+        # Fills the client's state cache, which the mirror's writes keep current
+        target = await loop.run_in_executor(None, fetch_guild, client, target_server_id)
+        if target is None:
+            logging.error(Fore.RED + f"Failed to fetch target server {target_server_id} data. Aborting.")
+            return False
+        logging.info(Fore.CYAN + f"Mirroring server {source_server_id} into server {target_server_id}. "
+                     f"Press Ctrl+C to stop.")
+
+        drift_checked_at = time.monotonic()
+        while not stop.is_set() and not gateway_task.done():
+            await asyncio.sleep(min(0.5, debounce / 4))
+            now = time.monotonic()
+            if drift_interval and now - drift_checked_at >= drift_interval:
+                drift_checked_at = now
+                drift = await loop.run_in_executor(None, check_drift, client, target_server_id)
+                if drift:
+                    mirror.mark_drift(drift)
+            if mirror.due(time.monotonic()):
+                await loop.run_in_executor(None, mirror.flush)
+
+        if not gateway_task.done():
+            # Write what arrived before the stop
+            await loop.run_in_executor(None, mirror.flush)
+    finally:
+        stop.set()
+        try:
+            await gateway_task
+        except GatewayError as e:
+            logging.error(Fore.RED + str(e))
+            return False
+        finally:
+            if journal:
+                journal.close()
+            if not assets:
+                fetcher.close()
+            logging.info(Fore.CYAN + f"Mirror stopped after {mirror.events} events and {mirror.requests} requests.")
+    return True
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """
+    Parse command line options.
+
+    Args:
+        argv: Arguments to parse, sys.argv by default
+
+    Returns:
+        Parsed options
+    """
+    parser = argparse.ArgumentParser(
+        description=f"Keep a target server in sync with a source server. "
+                    f"The bot token is read from {TOKEN_ENV_VAR}."
+    )
+    parser.add_argument("source", metavar="SOURCE_ID", help="ID of the server to mirror")
+    parser.add_argument("target", metavar="TARGET_ID", help="ID of the server to keep in sync")
+    parser.add_argument(
+        "--debounce", metavar="SECONDS", type=float, default=DEFAULT_DEBOUNCE,
+        help=f"write changes once no event arrived for this long (default: {DEFAULT_DEBOUNCE:g})"
+    )
+    parser.add_argument(
+        "--skip-initial-sync", action="store_true",
+        help="do not reconcile first, reuse the ID mapping journaled by an earlier clone"
+    )
+    parser.add_argument(
+        "--drift-interval", metavar="SECONDS", type=float, default=DEFAULT_DRIFT_INTERVAL,
+        help=f"check the target for changes made by hand this often, 0 to never check "
+             f"(default: {DEFAULT_DRIFT_INTERVAL:g})"
+    )
+    parser.add_argument("--gateway-url", metavar="URL", help="connect to this gateway, such as a local mock")
+    parser.add_argument(
+        "--api-base-url", metavar="URL", default=DISCORD_API_BASE_URL,
+        help="send Discord API requests to this URL, such as a local mock server"
+    )
+    parser.add_argument(
+        "--cdn-base-url", metavar="URL", default=DISCORD_CDN_BASE_URL,
+        help="download emoji and server images from this CDN"
+    )
+    add_network_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Entry point of the mirror.
+
+    Args:
+        argv: Command line arguments, sys.argv by default
+
+    Returns:
+        Exit status: 0 when stopped, 1 if the mirror failed, 2 on bad options
+    """
+    args = parse_args(argv)
+
+    token = os.environ.get(TOKEN_ENV_VAR, "").strip()
+    if not token:
+        logging.error(Fore.RED + f"Set the bot token in the {TOKEN_ENV_VAR} environment variable.")
+        return 2
+    if not validate_id(args.source, "Source server ID") or not validate_id(args.target, "Target server ID"):
+        return 2
+
+    with DiscordClient(token, base_url=args.api_base_url, **network_options(args)) as client, \
+            AssetFetcher(args.cdn_base_url, cache=AssetCache()) as assets:
+        try:
+            success = asyncio.run(run_mirror(
+                client, args.source, args.target, args.gateway_url, args.debounce,
+                assets=assets, initial_sync=not args.skip_initial_sync, drift_interval=args.drift_interval
+            ))
+        except KeyboardInterrupt:
+            logging.info(Fore.CYAN + "Mirror stopped.")
+            return 0
+    return 0 if success else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
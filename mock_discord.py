@@ -0,0 +1,844 @@
+"""
+Local stand-in for the Discord API and CDN.
+
+Implements the guild, role, channel, permission overwrite, emoji, image and
+DM endpoints the cloner uses on a standard library HTTP server, with
+per-route and global rate limits that answer 429 like Discord does, a
+configurable response latency, and optional injected failures: 502s and
+connections dropped after a request was applied. FakeGateway adds a gateway websocket that
+dispatches the change events of the mock's guilds (it needs aiohttp). Used
+to test and benchmark clones and mirrors without real guilds:
+
+    python mock_discord.py --port 8080 --guild 100:250 --guild 0:0
+    DISCORD_API_BASE_URL=http://127.0.0.1:8080/api/v9 \\
+        python main.py --cdn-base-url http://127.0.0.1:8080
+"""
+
+import argparse
+import base64
+import hashlib
+import itertools
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Dict, List, Any, Callable, Tuple
+from urllib.parse import urlparse
+
+API_PREFIX = "/api/v9"
+CATEGORY_TYPE = 4
+
+# Discord limits and error codes
+MAX_ROLES = 250
+MAX_CHANNELS = 500
+MAX_EMOJIS = 50
+ERROR_UNKNOWN = 10000
+ERROR_MAX_ROLES = 30005
+ERROR_MAX_CHANNELS = 30013
+ERROR_MAX_EMOJIS = 30008
+ERROR_INVALID_BODY = 50035
+
+# Smallest valid PNG, served for every image on the CDN
+PLACEHOLDER_PNG = base64.b64decode(
+    "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNk+M9QDwADhgGAWjR9awAAAABJRU5ErkJggg=="
+)
+
+ID_SEGMENT_PATTERN = re.compile(r"/\d+")
+MAJOR_PARAMETER_PATTERN = re.compile(r"^/(guilds|channels|webhooks)/(\d+)")
+CDN_PATH_PATTERN = re.compile(r"^/(emojis|icons|banners|splashes|discovery-splashes)/")
+
+
+class ApiError(Exception):
+    """An error response of the mock API."""
+
+    def __init__(self, status: int, message: str, code: int = 0) -> None:
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.code = code
+
+
+class RateLimits:
+    """Fixed-window per-route buckets and a global per-second limit."""
+
+    def __init__(self, route_limit: int = 50, route_window: float = 1.0, global_limit: int = 50) -> None:
+        """
+        Create rate limits.
+
+        Args:
+            route_limit: Requests per window in one route bucket, 0 for no limit
+            route_window: Length of a bucket window in seconds
+            global_limit: Requests per second over all routes, 0 for no limit
+        """
+        self.route_limit = route_limit
+        self.route_window = route_window
+        self.global_limit = global_limit
+        self._buckets: Dict[str, List[float]] = {}
+        self._global: List[float] = [0.0, 0]
+        self._lock = threading.Lock()
+
+    def check(self, method: str, path: str) -> Tuple[Dict[str, str], Optional[Dict[str, Any]]]:
+        """
+        Count a request against its route bucket and the global limit.
+
+        Args:
+            method: HTTP method
+            path: API path without the version prefix
+
+        Returns:
+            Tuple of (rate limit headers, 429 body or None if allowed)
+        """
+        template = ID_SEGMENT_PATTERN.sub("/{id}", path)
+        major = MAJOR_PARAMETER_PATTERN.match(path)
+        bucket_hash = hashlib.md5(f"{method} {template}".encode()).hexdigest()[:16]
+        bucket_key = f"{bucket_hash}:{major.group(2) if major else ''}"
+        now = time.monotonic()
+
+        with self._lock:
+            if self.global_limit:
+                second = float(int(now))
+                if self._global[0] != second:
+                    self._global = [second, 0]
+                if self._global[1] >= self.global_limit:
+                    retry_after = round(second + 1 - now, 3)
+                    return (
+                        {"X-RateLimit-Global": "true", "X-RateLimit-Scope": "global",
+                         "Retry-After": str(retry_after)},
+                        {"message": "You are being rate limited.", "retry_after": retry_after, "global": True}
+                    )
+                self._global[1] += 1
+
+            if not self.route_limit:
+                return {}, None
+
+            bucket = self._buckets.get(bucket_key)
+            if bucket is None or now >= bucket[1]:
+                bucket = self._buckets[bucket_key] = [self.route_limit, now + self.route_window]
+            reset_after = round(bucket[1] - now, 3)
+            headers = {
+                "X-RateLimit-Bucket": bucket_hash,
+                "X-RateLimit-Limit": str(self.route_limit),
+                "X-RateLimit-Reset-After": str(reset_after)
+            }
+            if bucket[0] <= 0:
+                headers.update({"X-RateLimit-Remaining": "0", "X-RateLimit-Scope": "user",
+                                "Retry-After": str(reset_after)})
+                return headers, {"message": "You are being rate limited.", "retry_after": reset_after, "global": False}
+
+            bucket[0] -= 1
+            headers["X-RateLimit-Remaining"] = str(int(bucket[0]))
+            return headers, None
+
+
+class MockDiscord:
+    """State of the mock API: guilds, their objects and uploaded images."""
+
+    def __init__(self) -> None:
+        self._ids = itertools.count(100000000000000000)
+        self.guilds: Dict[str, Dict[str, Any]] = {}
+        self.channels: Dict[str, Tuple[str, Dict[str, Any]]] = {}
+        self.images: Dict[str, bytes] = {}
+        self.dm_messages: List[Dict[str, Any]] = []
+        self.calls: Dict[str, int] = {}
+        self.rate_limited = 0
+        self.faults = 0
+        self.lock = threading.RLock()
+        # Called with (event name, data) for every change, e.g. by FakeGateway
+        self.listeners: List[Callable[[str, Dict[str, Any]], None]] = []
+        self.gateway_url: Optional[str] = None
+
+    def next_id(self) -> str:
+        """Return a new snowflake ID."""
+        return str(next(self._ids))
+
+    def add_guild(
+        self,
+        name: str = "Guild",
+        channels: int = 10,
+        roles: int = 10,
+        overwrites: int = 0,
+        emojis: int = 0,
+        categories: Optional[int] = None,
+        synced: float = 0.0
+    ) -> str:
+        """
+        Add a synthetic guild.
+
+        Args:
+            name: Guild name
+            channels: Number of channels including categories
+            roles: Number of roles besides @everyone
+            overwrites: Role overwrites per channel, capped by the role count
+            emojis: Number of emojis
+            categories: Number of categories, one per 10 channels by default
+            synced: Share of the channels in categories that have exactly
+                their category's overwrites
+
+        Returns:
+            ID of the guild
+        """
+        with self.lock:
+            guild_id = self.next_id()
+            guild = {
+                "info": {"id": guild_id, "name": name, "icon": None, "banner": None, "splash": None,
+                         "discovery_splash": None, "features": []},
+                "roles": [{"id": guild_id, "name": "@everyone", "permissions": "1071698529857",
+                           "position": 0, "color": 0, "hoist": False, "mentionable": False, "managed": False}],
+                "channels": [],
+                "emojis": []
+            }
+            self.guilds[guild_id] = guild
+
+            for index in range(roles):
+                guild["roles"].append({
+                    "id": self.next_id(), "name": f"role-{index}", "permissions": str(1 << (index % 40)),
+                    "position": index + 1, "color": index * 1000, "hoist": index % 5 == 0,
+                    "mentionable": index % 3 == 0, "managed": False
+                })
+            role_ids = [role["id"] for role in guild["roles"][1:]]
+
+            if categories is None:
+                categories = max(1, channels // 10) if channels else 0
+            categories = min(categories, channels)
+            synced_count = round(synced * (channels - categories))
+            category_ids = []
+            for index in range(channels):
+                is_category = index < categories
+                channel = {
+                    "id": self.next_id(), "guild_id": guild_id, "name": f"channel-{index}",
+                    "type": CATEGORY_TYPE if is_category else 0,
+                    "position": index, "topic": None if is_category else f"Topic {index}", "nsfw": False,
+                    "parent_id": None if is_category or not category_ids else category_ids[index % len(category_ids)],
+                    "permission_overwrites": [
+                        {"id": role_ids[(index + offset) % len(role_ids)], "type": 0,
+                         "allow": str(1 << (offset % 30)), "deny": "0"}
+                        for offset in range(min(overwrites, len(role_ids)))
+                    ]
+                }
+                if is_category:
+                    category_ids.append(channel["id"])
+                elif channel["parent_id"] and index - categories < synced_count:
+                    parent = self.channels[channel["parent_id"]][1]
+                    channel["permission_overwrites"] = [dict(overwrite) for overwrite in parent["permission_overwrites"]]
+                guild["channels"].append(channel)
+                self.channels[channel["id"]] = (guild_id, channel)
+
+            for index in range(emojis):
+                emoji_id = self.next_id()
+                guild["emojis"].append({"id": emoji_id, "name": f"emoji_{index}", "animated": False})
+                self.images[f"emojis/{emoji_id}.png"] = PLACEHOLDER_PNG
+
+            return guild_id
+
+    def emit(self, event: str, data: Dict[str, Any]) -> None:
+        """
+        Pass a gateway event to the listeners.
+
+        Args:
+            event: Dispatch event name, e.g. "GUILD_ROLE_UPDATE"
+            data: Event data, copied so listeners cannot see later changes
+        """
+        payload = json.loads(json.dumps(data))
+        for listener in self.listeners:
+            listener(event, payload)
+
+    def _guild(self, guild_id: str) -> Dict[str, Any]:
+        guild = self.guilds.get(guild_id)
+        if guild is None:
+            raise ApiError(404, "Unknown Guild", ERROR_UNKNOWN + 4)
+        return guild
+
+    def _channel(self, channel_id: str) -> Tuple[str, Dict[str, Any]]:
+        entry = self.channels.get(channel_id)
+        if entry is None:
+            raise ApiError(404, "Unknown Channel", ERROR_UNKNOWN + 3)
+        return entry
+
+    def _store_image(self, directory: str, owner_id: str, data_uri: Optional[str]) -> Optional[str]:
+        """Decode an uploaded data URI, keep it for the CDN and return its hash."""
+        if data_uri is None:
+            return None
+        match = re.match(r"^data:image/(png|gif|jpeg|webp);base64,(.+)$", data_uri or "", re.S)
+        if not match:
+            raise ApiError(400, "Invalid Form Body: image is not a data URI", ERROR_INVALID_BODY)
+        content = base64.b64decode(match.group(2))
+        image_hash = hashlib.md5(content).hexdigest()
+        if match.group(1) == "gif":
+            image_hash = f"a_{image_hash}"
+        self.images[f"{directory}/{owner_id}/{image_hash}.{'gif' if match.group(1) == 'gif' else 'png'}"] = content
+        return image_hash
+
+    def handle(self, method: str, path: str, body: Any) -> Tuple[int, Any]:
+        """
+        Serve one API request.
+
+        Args:
+            method: HTTP method
+            path: API path without the version prefix
+            body: Decoded JSON body
+
+        Returns:
+            Tuple of (status code, JSON body or None)
+        """
+        parts = path.strip("/").split("/")
+        with self.lock:
+            if parts[0] == "guilds" and len(parts) >= 2:
+                return self._handle_guild(method, parts[1], parts[2:], body)
+            if parts[0] == "channels" and len(parts) >= 2:
+                return self._handle_channel(method, parts[1], parts[2:], body)
+            if parts == ["gateway", "bot"] and method == "GET":
+                if not self.gateway_url:
+                    raise ApiError(404, "404: Not Found")
+                return 200, {"url": self.gateway_url, "shards": 1}
+            if parts == ["users", "@me", "channels"] and method == "POST":
+                channel_id = self.next_id()
+                self.channels[channel_id] = ("", {"id": channel_id, "type": 1,
+                                                  "recipients": [{"id": (body or {}).get("recipient_id")}]})
+                return 200, self.channels[channel_id][1]
+        raise ApiError(404, "404: Not Found")
+
+    def _handle_guild(self, method: str, guild_id: str, rest: List[str], body: Any) -> Tuple[int, Any]:
+        guild = self._guild(guild_id)
+
+        if not rest:
+            if method == "GET":
+                return 200, guild["info"]
+            if method == "PATCH":
+                info = guild["info"]
+                for field, value in (body or {}).items():
+                    if field in ("icon", "banner", "splash", "discovery_splash"):
+                        directory = {"icon": "icons", "banner": "banners", "splash": "splashes",
+                                     "discovery_splash": "discovery-splashes"}[field]
+                        info[field] = self._store_image(directory, guild_id, value)
+                    elif field == "name":
+                        info["name"] = value
+                self.emit("GUILD_UPDATE", info)
+                return 200, info
+            raise ApiError(405, "405: Method Not Allowed")
+
+        collection = rest[0]
+        if collection not in ("roles", "channels", "emojis"):
+            raise ApiError(404, "404: Not Found")
+        objects = guild[collection]
+
+        if len(rest) == 1:
+            if method == "GET":
+                return 200, objects
+            if method == "POST":
+                return 201 if collection == "emojis" else 200, self._create(guild_id, guild, collection, body or {})
+            if method == "PATCH" and collection in ("roles", "channels"):
+                by_id = {obj["id"]: obj for obj in objects}
+                for item in body or []:
+                    obj = by_id.get(item.get("id"))
+                    if obj is None:
+                        raise ApiError(400, "Invalid Form Body: unknown ID", ERROR_INVALID_BODY)
+                    obj["position"] = item.get("position", obj.get("position"))
+                    if collection == "channels":
+                        previous_parent = obj.get("parent_id")
+                        obj["parent_id"] = item.get("parent_id", previous_parent)
+                        # Like Discord, lock_permissions only applies along with a parent change
+                        parent = self.channels.get(obj["parent_id"] or "")
+                        if item.get("lock_permissions") and parent and obj["parent_id"] != previous_parent:
+                            obj["permission_overwrites"] = [dict(ow) for ow in parent[1]["permission_overwrites"]]
+                    self._emit_update(guild_id, collection, obj)
+                return 200, objects
+            raise ApiError(405, "405: Method Not Allowed")
+
+        object_id = rest[1]
+        obj = next((obj for obj in objects if obj["id"] == object_id), None)
+        if obj is None:
+            raise ApiError(404, f"Unknown {collection[:-1].title()}", ERROR_UNKNOWN)
+        if method == "DELETE":
+            if collection == "roles" and object_id == guild_id:
+                raise ApiError(400, "Cannot delete the @everyone role", ERROR_INVALID_BODY)
+            objects.remove(obj)
+            if collection == "channels":
+                self.channels.pop(object_id, None)
+                self.emit("CHANNEL_DELETE", obj)
+            elif collection == "roles":
+                self.emit("GUILD_ROLE_DELETE", {"guild_id": guild_id, "role_id": object_id})
+            else:
+                self.emit("GUILD_EMOJIS_UPDATE", {"guild_id": guild_id, "emojis": objects})
+            return 204, None
+        if method == "PATCH":
+            obj.update({field: value for field, value in (body or {}).items() if field != "id"})
+            self._emit_update(guild_id, collection, obj)
+            return 200, obj
+        if method == "GET":
+            return 200, obj
+        raise ApiError(405, "405: Method Not Allowed")
+
+    def _emit_update(self, guild_id: str, collection: str, obj: Dict[str, Any]) -> None:
+        """Emit the gateway event of a changed role, channel or emoji."""
+        if collection == "roles":
+            self.emit("GUILD_ROLE_UPDATE", {"guild_id": guild_id, "role": obj})
+        elif collection == "channels":
+            self.emit("CHANNEL_UPDATE", obj)
+        else:
+            self.emit("GUILD_EMOJIS_UPDATE", {"guild_id": guild_id, "emojis": self.guilds[guild_id]["emojis"]})
+
+    def _create(self, guild_id: str, guild: Dict[str, Any], collection: str, body: Dict[str, Any]) -> Dict[str, Any]:
+        objects = guild[collection]
+        if collection == "roles":
+            if len(objects) >= MAX_ROLES:
+                raise ApiError(400, "Maximum number of guild roles reached (250)", ERROR_MAX_ROLES)
+            role = {"id": self.next_id(), "name": body.get("name", "new role"),
+                    "permissions": str(body.get("permissions", "0")), "color": body.get("color", 0),
+                    "hoist": bool(body.get("hoist")), "mentionable": bool(body.get("mentionable")),
+                    "managed": False, "position": 1}
+            for other in objects:
+                if other["id"] != guild_id:
+                    other["position"] += 1
+            objects.append(role)
+            self.emit("GUILD_ROLE_CREATE", {"guild_id": guild_id, "role": role})
+            return role
+
+        if collection == "emojis":
+            if len(objects) >= MAX_EMOJIS:
+                raise ApiError(400, "Maximum number of emojis reached (50)", ERROR_MAX_EMOJIS)
+            emoji_id = self.next_id()
+            image = body.get("image")
+            match = re.match(r"^data:image/(png|gif|jpeg|webp);base64,(.+)$", image or "", re.S)
+            if not match:
+                raise ApiError(400, "Invalid Form Body: image is not a data URI", ERROR_INVALID_BODY)
+            animated = match.group(1) == "gif"
+            self.images[f"emojis/{emoji_id}.{'gif' if animated else 'png'}"] = base64.b64decode(match.group(2))
+            emoji = {"id": emoji_id, "name": body.get("name", "emoji"), "animated": animated}
+            objects.append(emoji)
+            self.emit("GUILD_EMOJIS_UPDATE", {"guild_id": guild_id, "emojis": objects})
+            return emoji
+
+        if len(objects) >= MAX_CHANNELS:
+            raise ApiError(400, "Maximum number of guild channels reached (500)", ERROR_MAX_CHANNELS)
+        role_ids = {role["id"] for role in guild["roles"]}
+        overwrites = []
+        for overwrite in body.get("permission_overwrites") or []:
+            if overwrite.get("type", 0) == 0 and overwrite.get("id") not in role_ids:
+                raise ApiError(400, "Invalid Form Body: unknown overwrite role", ERROR_INVALID_BODY)
+            overwrites.append({"id": overwrite["id"], "type": overwrite.get("type", 0),
+                               "allow": str(overwrite.get("allow", "0")), "deny": str(overwrite.get("deny", "0"))})
+        parent_id = body.get("parent_id")
+        if parent_id and self.channels.get(parent_id, ("",))[0] != guild_id:
+            raise ApiError(400, "Invalid Form Body: unknown parent", ERROR_INVALID_BODY)
+        if parent_id and "permission_overwrites" not in body:
+            # Like Discord, a channel created without overwrites is synced with its category
+            overwrites = [dict(overwrite) for overwrite in self.channels[parent_id][1]["permission_overwrites"]]
+        channel = {"id": self.next_id(), "guild_id": guild_id, "name": body.get("name", "new-channel"),
+                   "type": body.get("type", 0), "topic": body.get("topic") or None, "nsfw": bool(body.get("nsfw")),
+                   "parent_id": parent_id, "position": len(objects), "permission_overwrites": overwrites}
+        objects.append(channel)
+        self.channels[channel["id"]] = (guild_id, channel)
+        self.emit("CHANNEL_CREATE", channel)
+        return channel
+
+    def _handle_channel(self, method: str, channel_id: str, rest: List[str], body: Any) -> Tuple[int, Any]:
+        guild_id, channel = self._channel(channel_id)
+
+        if not rest:
+            if method == "GET":
+                return 200, channel
+            if method == "PATCH":
+                for field, value in (body or {}).items():
+                    if field == "permission_overwrites":
+                        channel[field] = [{"id": ow["id"], "type": ow.get("type", 0), "allow": str(ow.get("allow", "0")),
+                                           "deny": str(ow.get("deny", "0"))} for ow in value or []]
+                    elif field != "id":
+                        channel[field] = value
+                self.emit("CHANNEL_UPDATE", channel)
+                return 200, channel
+            if method == "DELETE":
+                self.guilds[guild_id]["channels"].remove(channel)
+                del self.channels[channel_id]
+                self.emit("CHANNEL_DELETE", channel)
+                return 200, channel
+            raise ApiError(405, "405: Method Not Allowed")
+
+        if rest[0] == "permissions" and len(rest) == 2:
+            overwrites = [ow for ow in channel.get("permission_overwrites", []) if ow["id"] != rest[1]]
+            if method == "PUT":
+                overwrites.append({"id": rest[1], "type": (body or {}).get("type", 0),
+                                   "allow": str((body or {}).get("allow", "0")),
+                                   "deny": str((body or {}).get("deny", "0"))})
+            elif method != "DELETE":
+                raise ApiError(405, "405: Method Not Allowed")
+            channel["permission_overwrites"] = overwrites
+            self.emit("CHANNEL_UPDATE", channel)
+            return 204, None
+
+        if rest == ["messages"] and method == "POST":
+            message = {"id": self.next_id(), "channel_id": channel_id, **(body or {})}
+            self.dm_messages.append(message)
+            return 200, message
+
+        raise ApiError(404, "404: Not Found")
+
+
+class MockDiscordServer(ThreadingHTTPServer):
+    """HTTP server serving a MockDiscord state on 127.0.0.1."""
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        state: Optional[MockDiscord] = None,
+        port: int = 0,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        rate_limits: Optional[RateLimits] = None,
+        fault_rate: float = 0.0
+    ) -> None:
+        """
+        Create a server.
+
+        Args:
+            state: API state to serve, a new empty one by default
+            port: Port to listen on, 0 picks a free one
+            latency: Seconds every API response is delayed by
+            jitter: Extra random delay of up to this many seconds
+            rate_limits: Rate limits to enforce, Discord-like defaults
+            fault_rate: Share of API requests that fail, half with a 502
+                before they are applied and half by dropping the connection
+                after they are applied
+        """
+        super().__init__(("127.0.0.1", port), MockDiscordHandler)
+        self.state = state or MockDiscord()
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limits = rate_limits or RateLimits()
+        self.fault_rate = fault_rate
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        """Base URL of the server, also its CDN base URL."""
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    @property
+    def api_base_url(self) -> str:
+        """Discord API base URL of the server."""
+        return f"{self.base_url}{API_PREFIX}"
+
+    def start(self) -> "MockDiscordServer":
+        """Serve requests on a background thread."""
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Stop serving and close the socket."""
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self) -> "MockDiscordServer":
+        return self.start()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.stop()
+
+
+class MockDiscordHandler(BaseHTTPRequestHandler):
+    """Request handler of MockDiscordServer."""
+
+    server: MockDiscordServer
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def _send(self, status: int, body: Any = None, headers: Optional[Dict[str, str]] = None,
+              content: Optional[bytes] = None, content_type: str = "application/json") -> None:
+        if content is None and body is not None:
+            content = json.dumps(body).encode()
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if content is not None:
+            self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(content or b"")))
+        self.end_headers()
+        if content:
+            self.wfile.write(content)
+
+    def _serve(self) -> None:
+        server = self.server
+        state = server.state
+        path = urlparse(self.path).path
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+
+        if CDN_PATH_PATTERN.match(path):
+            image = state.images.get(path.lstrip("/"))
+            if self.command != "GET" or image is None:
+                return self._send(404, content=b"Not Found", content_type="text/plain")
+            return self._send(200, content=image, content_type="image/gif" if path.endswith(".gif") else "image/png")
+
+        if not path.startswith(API_PREFIX + "/"):
+            return self._send(404, {"message": "404: Not Found", "code": 0})
+        path = path[len(API_PREFIX):]
+
+        with state.lock:
+            key = f"{self.command} {ID_SEGMENT_PATTERN.sub('/{id}', path)}"
+            state.calls[key] = state.calls.get(key, 0) + 1
+
+        if not (self.headers.get("Authorization") or "").startswith("Bot "):
+            return self._send(401, {"message": "401: Unauthorized", "code": 0})
+
+        headers, limited = server.rate_limits.check(self.command, path)
+        if limited:
+            with state.lock:
+                state.rate_limited += 1
+            return self._send(429, limited, headers)
+
+        delay = server.latency + (random.uniform(0, server.jitter) if server.jitter else 0.0)
+        if delay:
+            time.sleep(delay)
+
+        fault = random.choice(("error", "drop")) if random.random() < server.fault_rate else None
+        if fault:
+            with state.lock:
+                state.faults += 1
+        if fault == "error":
+            return self._send(502, {"message": "502: Bad Gateway", "code": 0})
+
+        try:
+            body = json.loads(raw) if raw else None
+            status, response = state.handle(self.command, path, body)
+        except ApiError as e:
+            return self._send(e.status, {"message": e.message, "code": e.code}, headers)
+        except (ValueError, KeyError, TypeError) as e:
+            return self._send(400, {"message": f"Invalid Form Body: {e}", "code": ERROR_INVALID_BODY}, headers)
+        if fault == "drop":
+            # Applied, but the client never hears about it
+            self.close_connection = True
+            return
+        self._send(status, response if status != 204 else None, headers)
+
+    do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = _serve
+
+
+class FakeGateway:
+    """
+    Minimal Discord gateway sending the change events of a MockDiscord state.
+
+    Speaks the JSON gateway protocol over a websocket: Hello, Identify,
+    Ready, heartbeats, dispatches with sequence numbers and Resume, which
+    replays the dispatches a session missed. Needs aiohttp.
+    """
+
+    def __init__(self, state: MockDiscord, heartbeat_interval: float = 41.25) -> None:
+        """
+        Create a gateway.
+
+        Args:
+            state: API state whose change events are dispatched
+            heartbeat_interval: Heartbeat interval announced in Hello, in seconds
+        """
+        self.state = state
+        self.heartbeat_interval = heartbeat_interval
+        # Session ID -> {"seq", "events" sent so far, "queue" of the live connection}
+        self.sessions: Dict[str, Dict[str, Any]] = {}
+        self.identified = 0
+        self.resumed = 0
+        self.port: Optional[int] = None
+        self._loop: Any = None
+        self._runner: Any = None
+        self._thread: Optional[threading.Thread] = None
+        self._connections: List[Any] = []
+
+    @property
+    def url(self) -> str:
+        """Websocket URL of the gateway."""
+        return f"ws://127.0.0.1:{self.port}"
+
+    def start(self) -> "FakeGateway":
+        """Serve the gateway on a background thread and subscribe to the state."""
+        # aiohttp is only needed for the gateway
+        import asyncio
+        from aiohttp import web
+
+        started = threading.Event()
+
+        def serve() -> None:
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            app = web.Application()
+            app.router.add_get("/", self._handle)
+            self._runner = web.AppRunner(app, access_log=None)
+            self._loop.run_until_complete(self._runner.setup())
+            site = web.TCPSite(self._runner, "127.0.0.1", 0)
+            self._loop.run_until_complete(site.start())
+            self.port = self._runner.addresses[0][1]
+            started.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=serve, daemon=True)
+        self._thread.start()
+        started.wait()
+        self.state.listeners.append(self._on_event)
+        self.state.gateway_url = self.url
+        return self
+
+    def stop(self) -> None:
+        """Close every connection and stop serving."""
+        import asyncio
+
+        self.state.listeners.remove(self._on_event)
+        self.state.gateway_url = None
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result(10)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(10)
+
+    def drop_connections(self) -> None:
+        """Close every connection without ending its session, so clients have to resume."""
+        import asyncio
+
+        async def drop() -> None:
+            for ws in list(self._connections):
+                await ws.close(code=4000, message=b"Dropped by the mock")
+
+        asyncio.run_coroutine_threadsafe(drop(), self._loop).result(10)
+
+    def __enter__(self) -> "FakeGateway":
+        return self.start()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.stop()
+
+    def _on_event(self, event: str, data: Dict[str, Any]) -> None:
+        """Forward a state change from an HTTP thread to the gateway loop."""
+        self._loop.call_soon_threadsafe(self._dispatch_all, event, data)
+
+    def _dispatch_all(self, event: str, data: Dict[str, Any]) -> None:
+        for session in self.sessions.values():
+            self._dispatch(session, event, data)
+
+    def _dispatch(self, session: Dict[str, Any], event: str, data: Dict[str, Any]) -> None:
+        session["seq"] += 1
+        message = {"op": 0, "t": event, "s": session["seq"], "d": data}
+        session["events"].append(message)
+        if session["queue"] is not None:
+            session["queue"].put_nowait(message)
+
+    async def _handle(self, request: Any) -> Any:
+        import asyncio
+        from aiohttp import WSMsgType, web
+
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self._connections.append(ws)
+        queue: Any = asyncio.Queue()
+        session: Optional[Dict[str, Any]] = None
+
+        async def send() -> None:
+            while True:
+                await ws.send_json(await queue.get())
+
+        sender = asyncio.ensure_future(send())
+        queue.put_nowait({"op": 10, "d": {"heartbeat_interval": int(self.heartbeat_interval * 1000)}})
+        try:
+            async for message in ws:
+                if message.type != WSMsgType.TEXT:
+                    break
+                payload = json.loads(message.data)
+                op = payload.get("op")
+                data = payload.get("d") or {}
+
+                if op == 1:
+                    queue.put_nowait({"op": 11})
+                elif op == 2:
+                    if not data.get("token"):
+                        await ws.close(code=4004, message=b"Authentication failed")
+                        break
+                    session_id = hashlib.md5(self.state.next_id().encode()).hexdigest()
+                    session = self.sessions[session_id] = {"seq": 0, "events": [], "queue": queue}
+                    self.identified += 1
+                    self._dispatch(session, "READY", {
+                        "v": 10, "session_id": session_id, "resume_gateway_url": self.url,
+                        "user": {"id": "1", "username": "mock", "bot": True},
+                        "guilds": [{"id": guild_id, "unavailable": True} for guild_id in self.state.guilds]
+                    })
+                elif op == 6:
+                    session = self.sessions.get(data.get("session_id"))
+                    if session is None:
+                        queue.put_nowait({"op": 9, "d": False})
+                        continue
+                    self.resumed += 1
+                    for event in session["events"]:
+                        if event["s"] > (data.get("seq") or 0):
+                            queue.put_nowait(event)
+                    session["queue"] = queue
+                    self._dispatch(session, "RESUMED", {})
+        finally:
+            if session is not None and session["queue"] is queue:
+                session["queue"] = None
+            sender.cancel()
+            self._connections.remove(ws)
+        return ws
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """
+    Parse command line options.
+
+    Args:
+        argv: Arguments to parse, sys.argv by default
+
+    Returns:
+        Parsed options
+    """
+    parser = argparse.ArgumentParser(description="Serve a local mock of the Discord API and CDN.")
+    parser.add_argument("--port", type=int, default=8080, help="port to listen on (default: 8080)")
+    parser.add_argument(
+        "--guild", metavar="CHANNELS:ROLES[:OVERWRITES[:EMOJIS]]", action="append", default=[],
+        help="add a synthetic guild, can be repeated"
+    )
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds every response is delayed by")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra random delay of up to this many seconds")
+    parser.add_argument("--route-limit", type=int, default=50, help="requests per window per route, 0 for none")
+    parser.add_argument("--route-window", type=float, default=1.0, help="route rate limit window in seconds")
+    parser.add_argument("--global-limit", type=int, default=50, help="requests per second overall, 0 for none")
+    parser.add_argument(
+        "--fault-rate", type=float, default=0.0,
+        help="share of API requests answered with a 502 or a dropped connection"
+    )
+    parser.add_argument("--gateway", action="store_true", help="also serve a gateway sending change events (needs aiohttp)")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """
+    Entry point of the mock server.
+
+    Args:
+        argv: Command line arguments, sys.argv by default
+    """
+    args = parse_args(argv)
+    server = MockDiscordServer(
+        port=args.port, latency=args.latency, jitter=args.jitter,
+        rate_limits=RateLimits(args.route_limit, args.route_window, args.global_limit),
+        fault_rate=args.fault_rate
+    )
+    for spec in args.guild:
+        sizes = [int(value) for value in spec.split(":")] + [0, 0, 0]
+        guild_id = server.state.add_guild(f"Guild {len(server.state.guilds) + 1}",
+                                          channels=sizes[0], roles=sizes[1], overwrites=sizes[2], emojis=sizes[3])
+        print(f"Guild {guild_id}: {sizes[0]} channels, {sizes[1]} roles")
+
+    gateway = FakeGateway(server.state).start() if args.gateway else None
+    print(f"Serving the Discord API at {server.api_base_url} and the CDN at {server.base_url}")
+    if gateway:
+        print(f"Serving the gateway at {gateway.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if gateway:
+            gateway.stop()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,326 @@
+"""
+In-memory guild model for the Discord Server Cloner.
+
+Server data arrives from the API, the source cache and snapshots as JSON
+dicts. The clone planners work on this model instead: slotted objects
+holding only the fields the cloner copies, with permissions as integers,
+and a Guild indexing its roles and channels by ID, by parent category and
+by name, so matching and remapping large servers takes constant-time
+lookups and far less memory than nested dicts.
+"""
+
+from typing import Optional, Dict, List, Any, Iterable, Tuple
+
+CATEGORY_TYPE = 4
+ROLE_OVERWRITE = 0
+MEMBER_OVERWRITE = 1
+
+
+class Overwrite:
+    """Permission overwrite of a channel for a role or a member."""
+
+    __slots__ = ("id", "type", "allow", "deny")
+
+    def __init__(self, id: str, type: int = ROLE_OVERWRITE, allow: int = 0, deny: int = 0) -> None:
+        self.id = id
+        self.type = type
+        self.allow = allow
+        self.deny = deny
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Overwrite":
+        """Build an overwrite from its API data."""
+        return cls(data['id'], int(data.get('type') or 0), int(data.get('allow') or 0), int(data.get('deny') or 0))
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Get the API data of the overwrite."""
+        return {"id": self.id, "type": self.type, "allow": str(self.allow), "deny": str(self.deny)}
+
+    def key(self) -> Tuple[str, int, int, int]:
+        """Hashable value of the overwrite for comparisons."""
+        return self.id, self.type, self.allow, self.deny
+
+    def with_id(self, id: str) -> "Overwrite":
+        """Get a copy of the overwrite for another role or member ID."""
+        return Overwrite(id, self.type, self.allow, self.deny)
+
+
+class Role:
+    """A server role."""
+
+    __slots__ = ("id", "name", "permissions", "color", "hoist", "mentionable", "managed", "position")
+
+    def __init__(
+        self,
+        id: str,
+        name: str = "new role",
+        permissions: int = 0,
+        color: int = 0,
+        hoist: bool = False,
+        mentionable: bool = False,
+        managed: bool = False,
+        position: int = 0
+    ) -> None:
+        self.id = id
+        self.name = name
+        self.permissions = permissions
+        self.color = color
+        self.hoist = hoist
+        self.mentionable = mentionable
+        self.managed = managed
+        self.position = position
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Role":
+        """Build a role from its API data."""
+        return cls(
+            data['id'], data.get('name', "new role"), int(data.get('permissions') or 0),
+            data.get('color') or 0, bool(data.get('hoist')), bool(data.get('mentionable')),
+            bool(data.get('managed')), data.get('position') or 0
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Get the API data of the role."""
+        return {
+            "id": self.id, "name": self.name, "permissions": str(self.permissions), "color": self.color,
+            "hoist": self.hoist, "mentionable": self.mentionable, "managed": self.managed,
+            "position": self.position
+        }
+
+
+class Channel:
+    """A server channel or category."""
+
+    __slots__ = ("id", "name", "type", "position", "topic", "nsfw", "parent_id", "overwrites")
+
+    def __init__(
+        self,
+        id: str,
+        name: str = "new-channel",
+        type: int = 0,
+        position: int = 0,
+        topic: Optional[str] = None,
+        nsfw: bool = False,
+        parent_id: Optional[str] = None,
+        overwrites: Tuple[Overwrite, ...] = ()
+    ) -> None:
+        self.id = id
+        self.name = name
+        self.type = type
+        self.position = position
+        self.topic = topic
+        self.nsfw = nsfw
+        self.parent_id = parent_id
+        self.overwrites = overwrites
+
+    @property
+    def is_category(self) -> bool:
+        """Whether the channel is a category."""
+        return self.type == CATEGORY_TYPE
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Channel":
+        """Build a channel from its API data."""
+        return cls(
+            data['id'], data.get('name', "new-channel"), data.get('type') or 0, data.get('position') or 0,
+            data.get('topic') or None, bool(data.get('nsfw')), data.get('parent_id'),
+            tuple(Overwrite.from_dict(overwrite) for overwrite in data.get('permission_overwrites') or [])
+        )
+
+    def remapped(self, parent_id: Optional[str], overwrites: Iterable[Overwrite]) -> "Channel":
+        """Get a copy of the channel with another parent and overwrites."""
+        return Channel(
+            self.id, self.name, self.type, self.position, self.topic, self.nsfw, parent_id, tuple(overwrites)
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Get the API data of the channel."""
+        return {
+            "id": self.id, "name": self.name, "type": self.type, "position": self.position,
+            "topic": self.topic, "nsfw": self.nsfw, "parent_id": self.parent_id,
+            "permission_overwrites": [overwrite.to_dict() for overwrite in self.overwrites]
+        }
+
+
+class Emoji:
+    """A custom emoji, with its image as a data URI once known."""
+
+    __slots__ = ("id", "name", "animated", "image")
+
+    def __init__(self, id: str, name: str = "emoji", animated: bool = False, image: Optional[str] = None) -> None:
+        self.id = id
+        self.name = name
+        self.animated = animated
+        self.image = image
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Emoji":
+        """Build an emoji from its API data, with "image" if a snapshot attached one."""
+        return cls(data['id'], data.get('name', "emoji"), bool(data.get('animated')), data.get('image'))
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Get the API data of the emoji."""
+        return {"id": self.id, "name": self.name, "animated": self.animated}
+
+
+class Guild:
+    """
+    A server with its roles, channels and emojis, indexed for lookups.
+
+    roles, channels and emojis map IDs to objects. Change them only through
+    the add and remove methods so the indexes stay in step.
+    """
+
+    __slots__ = ("id", "info", "roles", "channels", "emojis", "_children", "_roles_by_name", "_channels_by_key")
+
+    def __init__(
+        self,
+        info: Dict[str, Any],
+        roles: Iterable[Role] = (),
+        channels: Iterable[Channel] = (),
+        emojis: Iterable[Emoji] = ()
+    ) -> None:
+        """
+        Create a guild.
+
+        Args:
+            info: Server data (name, image hashes, features, and "images"
+                when loaded from a snapshot)
+            roles: Roles of the server, including @everyone
+            channels: Channels and categories of the server
+            emojis: Custom emojis of the server
+        """
+        self.id: str = info['id']
+        self.info = info
+        self.roles: Dict[str, Role] = {}
+        self.channels: Dict[str, Channel] = {}
+        self.emojis: Dict[str, Emoji] = {emoji.id: emoji for emoji in emojis}
+        self._children: Dict[Optional[str], Dict[str, Channel]] = {}
+        self._roles_by_name: Dict[str, Dict[str, Role]] = {}
+        self._channels_by_key: Dict[Tuple[str, int, Optional[str]], Dict[str, Channel]] = {}
+        for role in roles:
+            self.add_role(role)
+        for channel in channels:
+            self.add_channel(channel)
+
+    @classmethod
+    def from_data(
+        cls,
+        server_info: Dict[str, Any],
+        channels: List[Dict[str, Any]],
+        roles: List[Dict[str, Any]],
+        emojis: Optional[List[Dict[str, Any]]] = None
+    ) -> "Guild":
+        """
+        Build a guild from the API data returned by get_server_data().
+
+        Args:
+            server_info: Server data
+            channels: Channel data
+            roles: Role data
+            emojis: Emoji data
+
+        Returns:
+            Indexed guild
+        """
+        return cls(
+            server_info,
+            (Role.from_dict(role) for role in roles),
+            (Channel.from_dict(channel) for channel in channels),
+            (Emoji.from_dict(emoji) for emoji in emojis or [])
+        )
+
+    @property
+    def name(self) -> str:
+        """Name of the server."""
+        return self.info.get('name', "")
+
+    @property
+    def images(self) -> Dict[str, str]:
+        """Server images attached by a snapshot, as data URIs by field."""
+        return self.info.get('images') or {}
+
+    @property
+    def everyone(self) -> Optional[Role]:
+        """The @everyone role, which shares its ID with the server."""
+        return self.roles.get(self.id)
+
+    def other_roles(self) -> List[Role]:
+        """Roles besides @everyone."""
+        return [role for role in self.roles.values() if role.id != self.id]
+
+    def categories(self) -> List[Channel]:
+        """Categories of the server."""
+        return [channel for channel in self.channels.values() if channel.is_category]
+
+    def children(self, parent_id: Optional[str]) -> List[Channel]:
+        """
+        Get the channels in a category.
+
+        Args:
+            parent_id: ID of the category, None for channels outside categories
+
+        Returns:
+            Channels whose parent is the category
+        """
+        return list(self._children.get(parent_id, {}).values())
+
+    def roles_named(self, name: str) -> List[Role]:
+        """Get the roles with a name."""
+        return list(self._roles_by_name.get(name, {}).values())
+
+    def channels_named(self, name: str, type: int, parent_id: Optional[str]) -> List[Channel]:
+        """Get the channels with a name and type in a category."""
+        return list(self._channels_by_key.get((name, type, parent_id), {}).values())
+
+    def add_role(self, role: Role) -> None:
+        """Add a role, replacing the role with the same ID."""
+        self.remove_role(role.id)
+        self.roles[role.id] = role
+        self._roles_by_name.setdefault(role.name, {})[role.id] = role
+
+    def remove_role(self, role_id: str) -> Optional[Role]:
+        """Remove a role and return it, None if there is none with the ID."""
+        role = self.roles.pop(role_id, None)
+        if role is not None:
+            self._roles_by_name[role.name].pop(role_id, None)
+        return role
+
+    def add_channel(self, channel: Channel) -> None:
+        """Add a channel, replacing the channel with the same ID."""
+        self.remove_channel(channel.id)
+        self.channels[channel.id] = channel
+        self._children.setdefault(channel.parent_id, {})[channel.id] = channel
+        self._channels_by_key.setdefault((channel.name, channel.type, channel.parent_id), {})[channel.id] = channel
+
+    def remove_channel(self, channel_id: str) -> Optional[Channel]:
+        """Remove a channel and return it, None if there is none with the ID."""
+        channel = self.channels.pop(channel_id, None)
+        if channel is not None:
+            self._children[channel.parent_id].pop(channel_id, None)
+            self._channels_by_key[(channel.name, channel.type, channel.parent_id)].pop(channel_id, None)
+        return channel
+
+    def set_emojis(self, emojis: Iterable[Emoji]) -> None:
+        """Replace the emojis."""
+        self.emojis = {emoji.id: emoji for emoji in emojis}
+
+    def add_emoji(self, emoji: Emoji) -> None:
+        """Add an emoji, replacing the emoji with the same ID."""
+        self.emojis[emoji.id] = emoji
+
+    def remove_emoji(self, emoji_id: str) -> Optional[Emoji]:
+        """Remove an emoji and return it, None if there is none with the ID."""
+        return self.emojis.pop(emoji_id, None)
+
+    def copy(self) -> "Guild":
+        """
+        Get a copy that can be changed independently.
+
+        The roles, channels and emojis themselves are shared, so replace
+        them with the add methods instead of changing them in place.
+
+        Returns:
+            Copy with its own info, collections and indexes
+        """
+        return Guild(dict(self.info), self.roles.values(), self.channels.values(), self.emojis.values())
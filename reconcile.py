@@ -0,0 +1,264 @@
+"""
+Incremental reconcile of a target server against a source server.
+
+Matches source and target objects by name, type and parent instead of
+deleting and recreating everything, so a re-sync only patches what
+differs, creates what is missing and deletes what is extra.
+"""
+
+from typing import Dict, List, Any, Callable, Iterable, Optional, Sequence, Set, Tuple, TypeVar
+
+from model import ROLE_OVERWRITE, Channel, Emoji, Guild, Overwrite, Role
+
+# Fields of a role that the cloner copies (see cloner.role_payload)
+ROLE_FIELDS = ("name", "permissions", "color", "hoist", "mentionable")
+
+# Fields of a channel that the cloner copies besides parent and overwrites
+# (see cloner.channel_payload)
+CHANNEL_FIELDS = ("name", "topic", "nsfw")
+
+T = TypeVar("T")
+
+
+def position(obj: Any) -> int:
+    """Sort key of a role or channel, emojis have no position and keep their order."""
+    return getattr(obj, "position", 0)
+
+
+def match_objects(
+    source: Iterable[T],
+    target: Iterable[T],
+    candidates: Callable[[T], List[T]]
+) -> Tuple[Dict[str, T], List[T], List[T]]:
+    """
+    Pair source objects with target objects sharing their key.
+
+    Objects sharing a key are paired in position order, so duplicate names
+    still match one to one.
+
+    Args:
+        source: Source objects
+        target: Target objects that may be matched
+        candidates: Target objects with the key of a source object, from
+            an index of the target guild
+
+    Returns:
+        Tuple of (source ID to matched target object, unmatched source
+        objects, unmatched target objects)
+    """
+    target = list(target)
+    unmatched = {obj.id for obj in target}
+
+    matches = {}
+    missing = []
+    for obj in sorted(source, key=position):
+        found = [candidate for candidate in candidates(obj) if candidate.id in unmatched]
+        if found:
+            match = min(found, key=position)
+            unmatched.discard(match.id)
+            matches[obj.id] = match
+        else:
+            missing.append(obj)
+
+    extra = [obj for obj in sorted(target, key=position) if obj.id in unmatched]
+    return matches, missing, extra
+
+
+def overwrite_set(overwrites: Iterable[Overwrite]) -> frozenset:
+    """
+    Normalise permission overwrites for comparison.
+
+    Args:
+        overwrites: Permission overwrites with target IDs
+
+    Returns:
+        Set of (id, type, allow, deny) tuples
+    """
+    return frozenset(overwrite.key() for overwrite in overwrites)
+
+
+def synced_channel_ids(guild: Guild) -> Set[str]:
+    """
+    Find the channels whose permissions are synced with their category.
+
+    A channel is synced when its overwrites, compared as (id, type, allow,
+    deny) bitsets, are exactly those of its parent category. Such channels
+    can be created under the category without overwrites of their own and
+    inherit the category's.
+
+    Args:
+        guild: Server to analyse
+
+    Returns:
+        IDs of the synced channels
+    """
+    category_overwrites = {category.id: overwrite_set(category.overwrites) for category in guild.categories()}
+    return {
+        channel.id for channel in guild.channels.values()
+        if not channel.is_category and channel.parent_id in category_overwrites
+        and overwrite_set(channel.overwrites) == category_overwrites[channel.parent_id]
+    }
+
+
+def role_changes(source_role: Role, target_role: Role) -> Dict[str, Any]:
+    """
+    Find the copied fields in which two roles differ.
+
+    Args:
+        source_role: Source role
+        target_role: Matched target role
+
+    Returns:
+        Changed fields with their source values as sent to the API, empty
+        if the roles match
+    """
+    changes: Dict[str, Any] = {}
+    for field in ROLE_FIELDS:
+        value = getattr(source_role, field)
+        if value != getattr(target_role, field):
+            changes[field] = str(value) if field == "permissions" else value
+    return changes
+
+
+def channel_changes(
+    source_channel: Channel,
+    target_channel: Channel,
+    overwrites: Optional[Sequence[Overwrite]] = None
+) -> Dict[str, Any]:
+    """
+    Find the copied fields in which two channels differ.
+
+    Args:
+        source_channel: Source channel
+        target_channel: Matched target channel
+        overwrites: Source overwrites remapped to target IDs, None to skip
+            comparing overwrites
+
+    Returns:
+        Changed fields with their source values as sent to the API, empty
+        if the channels match
+    """
+    changes: Dict[str, Any] = {}
+    for field in CHANNEL_FIELDS:
+        value = getattr(source_channel, field)
+        if value != getattr(target_channel, field):
+            changes[field] = value
+
+    if overwrites is not None and overwrite_set(overwrites) != overwrite_set(target_channel.overwrites):
+        changes['permission_overwrites'] = [overwrite.to_dict() for overwrite in overwrites]
+
+    return changes
+
+
+class Reconciliation:
+    """Matching of a source server's objects to a target server's objects."""
+
+    def __init__(self, source: Guild, target: Guild) -> None:
+        """
+        Match all roles, channels and emojis.
+
+        Roles match by name, categories by name and type, other channels by
+        name, type and matched parent category. Managed target roles (bots,
+        boosters) can be neither matched nor deleted. Emojis match by name.
+
+        Args:
+            source: Server to clone from
+            target: Server to clone to
+        """
+        self.role_matches: Dict[str, Role] = {}
+        if source.everyone and target.everyone:
+            self.role_matches[source.id] = target.everyone
+
+        role_matches, self.roles_missing, self.roles_extra = match_objects(
+            source.other_roles(),
+            (role for role in target.other_roles() if not role.managed),
+            lambda role: target.roles_named(role.name)
+        )
+        self.role_matches.update(role_matches)
+
+        self.channel_matches: Dict[str, Channel]
+        self.channel_matches, categories_missing, categories_extra = match_objects(
+            source.categories(), target.categories(),
+            lambda category: target.channels_named(category.name, category.type, None)
+        )
+
+        # A child matches only under the target category its parent matched
+        parent_matches = {source_id: category.id for source_id, category in self.channel_matches.items()}
+        child_matches, children_missing, children_extra = match_objects(
+            (channel for channel in source.channels.values() if not channel.is_category),
+            (channel for channel in target.channels.values() if not channel.is_category),
+            lambda channel: target.channels_named(
+                channel.name, channel.type,
+                parent_matches.get(channel.parent_id, channel.parent_id) if channel.parent_id else None
+            )
+        )
+        self.channel_matches.update(child_matches)
+        self.channels_missing = categories_missing + children_missing
+        self.channels_extra = categories_extra + children_extra
+
+        emojis_by_name: Dict[str, List[Emoji]] = {}
+        for emoji in target.emojis.values():
+            emojis_by_name.setdefault(emoji.name, []).append(emoji)
+        self.emoji_matches, self.emojis_missing, _ = match_objects(
+            source.emojis.values(), target.emojis.values(),
+            lambda emoji: emojis_by_name.get(emoji.name, [])
+        )
+
+    def id_mapping(self) -> Dict[str, str]:
+        """
+        Build the source to target ID mapping of all matched objects.
+
+        Returns:
+            Mapping of source IDs to target IDs
+        """
+        mapping = {}
+        for matches in (self.role_matches, self.channel_matches, self.emoji_matches):
+            mapping.update({source_id: target.id for source_id, target in matches.items()})
+        return mapping
+
+    def differences(self, source: Guild, target: Guild, scope: Optional[Set[str]] = None) -> Dict[str, int]:
+        """
+        Count what still differs between the matched servers.
+
+        Positions are not compared, Discord renumbers them on every move.
+
+        Args:
+            source: Server the matching was built from
+            target: Server the matching was built against
+            scope: IDs of the target objects that count as extra when
+                unmatched, e.g. those a partial clone's filter selects.
+                None counts all of them.
+
+        Returns:
+            Number of missing, extra and changed roles and channels and of
+            missing emojis, keyed like "roles_changed". Only non-zero counts
+            are included, so matching servers give an empty dict.
+        """
+        # @everyone shares its ID with the server, even when a partial source leaves it out
+        mapping = {source.id: target.id, **self.id_mapping()}
+        roles_changed = sum(
+            1 for source_id, target_role in self.role_matches.items()
+            if role_changes(source.roles[source_id], target_role)
+        )
+        channels_changed = 0
+        for source_id, target_channel in self.channel_matches.items():
+            channel = source.channels[source_id]
+            overwrites = [
+                overwrite.with_id(mapping.get(overwrite.id, overwrite.id)) for overwrite in channel.overwrites
+                if overwrite.type != ROLE_OVERWRITE or overwrite.id in mapping
+            ]
+            if channel_changes(channel, target_channel, overwrites):
+                channels_changed += 1
+
+        counts = {
+            "roles_missing": len(self.roles_missing),
+            "roles_extra": sum(1 for role in self.roles_extra if scope is None or role.id in scope),
+            "roles_changed": roles_changed,
+            "channels_missing": len(self.channels_missing),
+            "channels_extra": sum(
+                1 for channel in self.channels_extra if scope is None or channel.id in scope
+            ),
+            "channels_changed": channels_changed,
+            "emojis_missing": len(self.emojis_missing)
+        }
+        return {kind: count for kind, count in counts.items() if count}
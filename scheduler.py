@@ -0,0 +1,338 @@
+"""
+Dependency-graph scheduler for clone operations.
+
+Every create, delete or update of a clone is a Task. Edges are real
+dependencies (a channel needs its parent category, an overwrite needs its
+role), so a task is started as soon as the tasks it depends on are done
+instead of waiting for a whole phase to finish.
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Optional, Dict, List, Any, Callable, Iterable, Tuple
+
+# build() returns the request path and JSON body, or None to skip the task
+RequestSpec = Optional[Tuple[str, Optional[Any]]]
+RequestFunction = Callable[[str, str, Optional[Any], str], Optional[Any]]
+
+
+class Task:
+    """A single Discord API call in a clone plan."""
+
+    __slots__ = (
+        "key", "method", "build", "deps", "on_result", "operation_name",
+        "blocking", "result", "skipped", "started_at", "finished_at"
+    )
+
+    def __init__(
+        self,
+        key: str,
+        method: str,
+        build: Callable[[], RequestSpec],
+        deps: Iterable[str] = (),
+        on_result: Optional[Callable[[Optional[Any]], Optional[List["Task"]]]] = None,
+        operation_name: str = "API request",
+        blocking: bool = False
+    ) -> None:
+        """
+        Create a task.
+
+        Args:
+            key: Unique key of the task, e.g. "create_role:123"
+            method: HTTP method of the request
+            build: Called when the task is started, returns (path, json_data)
+                or None to skip the request. Runs after all dependencies, so
+                it can read IDs that they produced.
+            deps: Keys of the tasks that must finish first
+            on_result: Called with the response (None on failure). May return
+                follow-up tasks to add to the graph; tasks depending on this
+                one then also wait for the follow-ups.
+            operation_name: Description of operation for logging
+            blocking: build() may wait on I/O (e.g. an image download), so
+                event-loop executors must run it off the loop
+        """
+        self.key = key
+        self.method = method
+        self.build = build
+        self.deps = list(deps)
+        self.on_result = on_result
+        self.operation_name = operation_name
+        self.blocking = blocking
+        self.result: Optional[Any] = None
+        self.skipped = False
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    @property
+    def duration(self) -> float:
+        """Seconds the task took, 0 if it has not run."""
+        if self.started_at is None or self.finished_at is None:
+            return 0.0
+        return self.finished_at - self.started_at
+
+
+class TaskGraph:
+    """
+    A set of tasks and their dependencies.
+
+    The graph tracks which tasks are ready, so executors only have to start
+    ready tasks and report them back through complete().
+    """
+
+    def __init__(self) -> None:
+        self.tasks: Dict[str, Task] = {}
+        self._dependents: Dict[str, List[str]] = {}
+        self._waiting: Dict[str, int] = {}
+        self._done: set = set()
+        self._lock = threading.Lock()
+        # Called with (task, result) after every task, e.g. to journal progress
+        self.listeners: List[Callable[[Task, Optional[Any]], None]] = []
+
+    def __len__(self) -> int:
+        return len(self.tasks)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.tasks
+
+    def add(self, task: Task) -> Task:
+        """
+        Add a task to the graph.
+
+        Dependencies on keys that are not in the graph are ignored, so plans
+        can depend on optional tasks without checking for them first.
+
+        Args:
+            task: Task to add
+
+        Returns:
+            The added task
+        """
+        if task.key in self.tasks:
+            raise ValueError(f"Duplicate task {task.key}")
+        self.tasks[task.key] = task
+        return task
+
+    def remove(self, key: str) -> None:
+        """
+        Drop a task before the graph runs, e.g. because it already ran.
+
+        Tasks depending on it no longer wait for it.
+
+        Args:
+            key: Key of the task to drop
+        """
+        self.tasks.pop(key, None)
+
+    def ready(self) -> List[Task]:
+        """
+        Freeze the dependencies and return the tasks that can start right away.
+
+        Returns:
+            Tasks without unfinished dependencies
+        """
+        with self._lock:
+            self._check_cycles()
+            return self._index(self.tasks.values())
+
+    def complete(self, task: Task, result: Optional[Any]) -> List[Task]:
+        """
+        Mark a task as finished.
+
+        An exception in the task's on_result is logged and the task counts
+        as failed, so its dependents go on as after a failed request
+        instead of the exception stopping the whole graph.
+
+        Args:
+            task: The finished task
+            result: Response of the request, None if it failed or was skipped
+
+        Returns:
+            Tasks that became ready, including ready follow-up tasks
+        """
+        task.result = result
+        follow_ups = None
+        if task.on_result:
+            try:
+                follow_ups = task.on_result(result)
+            except Exception as e:
+                logging.error(f"Unexpected error during {task.operation_name}: {e}")
+                task.result = result = None
+                task.skipped = False
+
+        follow_ups = follow_ups or []
+        for listener in self.listeners:
+            listener(task, result)
+
+        with self._lock:
+            self._done.add(task.key)
+            for follow_up in follow_ups:
+                self.add(follow_up)
+                follow_up.deps.append(task.key)
+            newly_ready = self._index(follow_ups)
+
+            for key in self._dependents.get(task.key, []):
+                dependent = self.tasks[key]
+                # Dependents inherit the follow-ups as dependencies
+                for follow_up in follow_ups:
+                    self._dependents.setdefault(follow_up.key, []).append(key)
+                    self._waiting[key] += 1
+                    dependent.deps.append(follow_up.key)
+
+                self._waiting[key] -= 1
+                if self._waiting[key] == 0:
+                    newly_ready.append(dependent)
+            return newly_ready
+
+    def _index(self, tasks: Iterable[Task]) -> List[Task]:
+        """Record the dependents of new tasks and return those that are ready."""
+        ready = []
+        for task in tasks:
+            deps = [dep for dep in task.deps if dep in self.tasks and dep not in self._done]
+            self._waiting[task.key] = len(deps)
+            for dep in deps:
+                self._dependents.setdefault(dep, []).append(task.key)
+            if not deps:
+                ready.append(task)
+        return ready
+
+    def _check_cycles(self) -> None:
+        """Raise ValueError if the dependencies contain a cycle."""
+        state: Dict[str, int] = {}
+        for root in self.tasks:
+            if state.get(root):
+                continue
+            state[root] = 1
+            stack = [(root, iter(self.tasks[root].deps))]
+            while stack:
+                key, deps = stack[-1]
+                dep = next(deps, None)
+                if dep is None:
+                    state[key] = 2
+                    stack.pop()
+                elif dep in self.tasks:
+                    if state.get(dep) == 1:
+                        raise ValueError(f"Dependency cycle through {dep}")
+                    if not state.get(dep):
+                        state[dep] = 1
+                        stack.append((dep, iter(self.tasks[dep].deps)))
+
+    def critical_path(self) -> Tuple[float, List[str]]:
+        """
+        Find the longest chain of dependent tasks by measured duration.
+
+        No schedule can finish faster than this chain, so it is the lower
+        bound on clone time for the current plan and request latency.
+
+        Returns:
+            Tuple of (total seconds, task keys along the path)
+        """
+        finish: Dict[str, float] = {}
+        previous: Dict[str, Optional[str]] = {}
+
+        for task in self._topological_order():
+            best_dep = None
+            start = 0.0
+            for dep in task.deps:
+                if dep in finish and finish[dep] > start:
+                    start = finish[dep]
+                    best_dep = dep
+            finish[task.key] = start + task.duration
+            previous[task.key] = best_dep
+
+        if not finish:
+            return 0.0, []
+
+        end = max(finish, key=finish.get)
+        path = []
+        key: Optional[str] = end
+        while key is not None:
+            path.append(key)
+            key = previous[key]
+        return finish[end], list(reversed(path))
+
+    def _topological_order(self) -> List[Task]:
+        """Return tasks so that every task comes after its dependencies."""
+        order: List[Task] = []
+        visited: set = set()
+        for root in self.tasks:
+            stack = [(root, False)]
+            while stack:
+                key, expanded = stack.pop()
+                if expanded:
+                    order.append(self.tasks[key])
+                    continue
+                if key in visited:
+                    continue
+                visited.add(key)
+                stack.append((key, True))
+                stack.extend((dep, False) for dep in self.tasks[key].deps
+                             if dep in self.tasks and dep not in visited)
+        return order
+
+
+def run_task(task: Task, request: RequestFunction) -> Optional[Any]:
+    """
+    Build and send the request of a task.
+
+    Args:
+        task: Task to run
+        request: Function sending (method, path, json_data, operation_name)
+
+    Returns:
+        Response of the request, None if it failed or was skipped
+    """
+    task.started_at = time.monotonic()
+    try:
+        spec = task.build()
+        if spec is None:
+            task.skipped = True
+            return None
+        path, json_data = spec
+        return request(task.method, path, json_data, task.operation_name)
+    finally:
+        task.finished_at = time.monotonic()
+
+
+def run_graph(graph: TaskGraph, request: RequestFunction, workers: int = 1) -> None:
+    """
+    Run every task of a graph, starting each one as soon as its dependencies are done.
+
+    Args:
+        graph: Tasks to run
+        request: Function sending (method, path, json_data, operation_name)
+        workers: Number of requests in flight, 1 runs tasks one at a time
+    """
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        running = {executor.submit(run_task, task, request): task for task in graph.ready()}
+
+        while running:
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                task = running.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logging.error(f"Unexpected error during {task.operation_name}: {e}")
+                    result = None
+
+                for ready_task in graph.complete(task, result):
+                    running[executor.submit(run_task, ready_task, request)] = ready_task
+
+
+def log_critical_path(graph: TaskGraph, elapsed: float) -> None:
+    """
+    Log the critical path of a finished graph.
+
+    Args:
+        graph: Graph whose tasks have run
+        elapsed: Wall-clock seconds the whole graph took
+    """
+    length, path = graph.critical_path()
+    logging.info(
+        f"Critical path: {len(path)} of {len(graph)} tasks, {length:.2f}s "
+        f"of {elapsed:.2f}s wall clock"
+    )
+    if path:
+        logging.info("Critical path tasks: " + " -> ".join(path))
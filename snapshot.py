@@ -0,0 +1,157 @@
+"""
+Guild snapshots for the Discord Server Cloner.
+
+A snapshot is a gzip-compressed JSON Lines file. The first line is a
+versioned header, every following line is one record: the server info, a
+role, a channel (with its permission overwrites), an emoji, or a downloaded
+asset as a data URI. Records are written and read one at a time, so large
+guilds never have to be serialised in one piece.
+"""
+
+import gzip
+import json
+import os
+from datetime import datetime, timezone
+from typing import Optional, Dict, List, Any, Iterable, Tuple
+
+SNAPSHOT_FORMAT = "discord-guild-snapshot"
+SNAPSHOT_VERSION = 1
+
+
+class SnapshotError(Exception):
+    """Raised when a snapshot file is missing, corrupt or of an unknown version."""
+
+
+class Snapshot:
+    """Contents of a snapshot file."""
+
+    def __init__(
+        self,
+        server_info: Dict[str, Any],
+        channels: List[Dict[str, Any]],
+        roles: List[Dict[str, Any]],
+        emojis: List[Dict[str, Any]],
+        assets: Dict[str, str],
+        created_at: Optional[str] = None
+    ) -> None:
+        """
+        Create a snapshot.
+
+        Args:
+            server_info: Server data
+            channels: Channels including their permission overwrites
+            roles: Roles
+            emojis: Emojis
+            assets: Data URIs of downloaded images keyed by CDN path
+            created_at: ISO timestamp of the export
+        """
+        self.server_info = server_info
+        self.channels = channels
+        self.roles = roles
+        self.emojis = emojis
+        self.assets = assets
+        self.created_at = created_at
+
+
+def write_snapshot(
+    path: str,
+    server_info: Dict[str, Any],
+    channels: List[Dict[str, Any]],
+    roles: List[Dict[str, Any]],
+    emojis: List[Dict[str, Any]],
+    assets: Iterable[Tuple[str, str]] = ()
+) -> None:
+    """
+    Write a snapshot file.
+
+    The file is written under a temporary name and moved into place at the
+    end, so an interrupted export never leaves a truncated snapshot behind.
+
+    Args:
+        path: File to write
+        server_info: Server data
+        channels: Channels including their permission overwrites
+        roles: Roles
+        emojis: Emojis
+        assets: (CDN path, data URI) pairs, consumed one at a time so they
+            can be downloaded lazily
+    """
+    temporary_path = f"{path}.tmp"
+    header = {
+        "format": SNAPSHOT_FORMAT,
+        "version": SNAPSHOT_VERSION,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "server_id": server_info.get("id")
+    }
+
+    with gzip.open(temporary_path, "wt", encoding="utf-8") as file:
+        def write(record: Dict[str, Any]) -> None:
+            file.write(json.dumps(record, separators=(",", ":")) + "\n")
+
+        write(header)
+        write({"type": "server", "data": server_info})
+        for role in roles:
+            write({"type": "role", "data": role})
+        for channel in channels:
+            write({"type": "channel", "data": channel})
+        for emoji in emojis:
+            write({"type": "emoji", "data": emoji})
+        for asset_path, data_uri in assets:
+            write({"type": "asset", "path": asset_path, "data": data_uri})
+
+    os.replace(temporary_path, path)
+
+
+def read_snapshot(path: str) -> Snapshot:
+    """
+    Read a snapshot file.
+
+    Args:
+        path: File to read
+
+    Returns:
+        Contents of the snapshot
+
+    Raises:
+        SnapshotError: If the file cannot be read, is not a snapshot or was
+            written by a newer version
+    """
+    server_info = None
+    channels: List[Dict[str, Any]] = []
+    roles: List[Dict[str, Any]] = []
+    emojis: List[Dict[str, Any]] = []
+    assets: Dict[str, str] = {}
+
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as file:
+            header = json.loads(file.readline() or "null")
+            if not isinstance(header, dict) or header.get("format") != SNAPSHOT_FORMAT:
+                raise SnapshotError(f"{path} is not a guild snapshot.")
+            if header.get("version", 0) > SNAPSHOT_VERSION:
+                raise SnapshotError(
+                    f"{path} is snapshot version {header['version']}, "
+                    f"only versions up to {SNAPSHOT_VERSION} are supported."
+                )
+
+            for line in file:
+                record = json.loads(line)
+                record_type = record.get("type")
+                if record_type == "server":
+                    server_info = record["data"]
+                elif record_type == "role":
+                    roles.append(record["data"])
+                elif record_type == "channel":
+                    channels.append(record["data"])
+                elif record_type == "emoji":
+                    emojis.append(record["data"])
+                elif record_type == "asset":
+                    assets[record["path"]] = record["data"]
+                # Unknown record types from newer minor versions are skipped
+
+    except (OSError, EOFError, ValueError, KeyError) as e:
+        raise SnapshotError(f"Could not read snapshot {path}: {e}")
+
+    if server_info is None:
+        raise SnapshotError(f"{path} has no server record.")
+
+    return Snapshot(server_info, channels, roles, emojis, assets, header.get("created_at"))
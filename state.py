@@ -0,0 +1,464 @@
+"""
+Write-through state cache of the servers the cloner works on.
+
+Every create and update returns the full object, and every delete and
+overwrite change says what it removed or set. A GuildState starts from a
+full fetch of a server and applies each successful write to it, so steps
+after a clone (listing emojis, verifying the result, the mirror's view of
+its target) read the server from memory instead of fetching it again.
+drift() compares the cached state with a fresh fetch to find changes made
+outside the cloner.
+"""
+
+import contextlib
+import json
+import logging
+import re
+import threading
+import time
+from typing import Optional, Dict, List, Any, Iterator, Tuple
+
+from model import Channel, Emoji, Guild, Overwrite, Role
+
+GUILD_PATH_PATTERN = re.compile(r"^/guilds/(\d+)(?:/(roles|channels|emojis)(?:/(\d+))?)?$")
+CHANNEL_PATH_PATTERN = re.compile(r"^/channels/(\d+)(?:/permissions/(\d+))?$")
+
+# Fields of a create request that identify the object it created
+CREATE_KEY_FIELDS = {
+    "roles": ("name", "permissions", "color", "hoist", "mentionable"),
+    "channels": ("name", "type", "parent_id"),
+    "emojis": ("name",)
+}
+
+
+def fingerprint(obj: Any) -> Any:
+    """
+    Get a comparable value of a role, channel or emoji.
+
+    Overwrites are compared as a set, Discord does not keep their order.
+
+    Args:
+        obj: Model object
+
+    Returns:
+        Hashable value equal for objects with the same data
+    """
+    data = obj.to_dict()
+    overwrites = data.pop("permission_overwrites", None)
+    values = tuple(sorted(data.items(), key=lambda item: item[0]))
+    if overwrites is None:
+        return values
+    return values, frozenset(Overwrite.from_dict(overwrite).key() for overwrite in overwrites)
+
+
+class GuildState:
+    """
+    Cached state of one server, kept up to date from write responses.
+
+    Thread-safe: writes of concurrent workers are applied under a lock and
+    readers get a copy.
+    """
+
+    def __init__(self, guild: Guild) -> None:
+        """
+        Create the state of a freshly fetched server.
+
+        Args:
+            guild: The server as fetched
+        """
+        self._guild = guild.copy()
+        self._lock = threading.Lock()
+        self.fetched_at = time.time()
+        self.writes = 0
+
+    @property
+    def id(self) -> str:
+        """ID of the server."""
+        return self._guild.id
+
+    def snapshot(self) -> Guild:
+        """
+        Get the current state.
+
+        Returns:
+            Copy of the server that later writes do not change
+        """
+        with self._lock:
+            return self._guild.copy()
+
+    def has_channel(self, channel_id: str) -> bool:
+        """Whether a channel belongs to the server."""
+        with self._lock:
+            return channel_id in self._guild.channels
+
+    def apply(self, method: str, path: str, json_data: Optional[Any], result: Any) -> bool:
+        """
+        Apply a successful write to the state.
+
+        Args:
+            method: HTTP method of the request
+            path: API path of the request
+            json_data: JSON body that was sent
+            result: Response JSON, or the status code of empty responses
+
+        Returns:
+            True if the request changed a role, channel, emoji or the
+            server info of this server
+        """
+        with self._lock:
+            applied = self._apply(method.upper(), path.split("?", 1)[0], json_data, result)
+            if applied:
+                self.writes += 1
+            return applied
+
+    def _apply(self, method: str, path: str, json_data: Optional[Any], result: Any) -> bool:
+        guild = self._guild
+        response = result if isinstance(result, (dict, list)) else None
+
+        match = CHANNEL_PATH_PATTERN.match(path)
+        if match:
+            channel_id, overwrite_id = match.groups()
+            channel = guild.channels.get(channel_id)
+            if channel is None:
+                return False
+            if overwrite_id:
+                overwrites = [overwrite for overwrite in channel.overwrites if overwrite.id != overwrite_id]
+                if method == "PUT":
+                    overwrites.append(Overwrite.from_dict(dict(json_data or {}, id=overwrite_id)))
+                guild.add_channel(channel.remapped(channel.parent_id, overwrites))
+            elif method == "DELETE":
+                guild.remove_channel(channel_id)
+            elif isinstance(response, dict):
+                guild.add_channel(Channel.from_dict(response))
+            else:
+                return False
+            return True
+
+        match = GUILD_PATH_PATTERN.match(path)
+        if not match or match.group(1) != guild.id:
+            return False
+        _, collection, object_id = match.groups()
+
+        if collection is None:
+            if not isinstance(response, dict):
+                return False
+            guild.info.update(response)
+            return True
+
+        if method == "DELETE":
+            removed = {
+                "roles": guild.remove_role,
+                "channels": guild.remove_channel,
+                "emojis": guild.remove_emoji
+            }[collection](object_id) if object_id else None
+            return removed is not None
+
+        if object_id is None and isinstance(json_data, list):
+            # Bulk position updates answer with the whole list, or nothing at all
+            if isinstance(response, list):
+                for data in response:
+                    self._add(collection, data)
+            else:
+                self._move(collection, json_data)
+            return True
+
+        if isinstance(response, dict):
+            self._add(collection, response)
+            return True
+        return False
+
+    def known_ids(self, collection: str) -> List[str]:
+        """Get the IDs of the roles, channels or emojis in the state."""
+        with self._lock:
+            return list(getattr(self._guild, collection))
+
+    def _add(self, collection: str, data: Dict[str, Any]) -> None:
+        if collection == "roles":
+            self._guild.add_role(Role.from_dict(data))
+        elif collection == "channels":
+            self._guild.add_channel(Channel.from_dict(data))
+        else:
+            self._guild.add_emoji(Emoji.from_dict(data))
+
+    def _move(self, collection: str, positions: List[Dict[str, Any]]) -> None:
+        for item in positions:
+            if collection == "roles":
+                role = self._guild.roles.get(item.get('id'))
+                if role:
+                    moved = Role.from_dict(dict(role.to_dict(), position=item.get('position', role.position)))
+                    self._guild.add_role(moved)
+            elif collection == "channels":
+                channel = self._guild.channels.get(item.get('id'))
+                if channel:
+                    parent_id = item.get('parent_id', channel.parent_id)
+                    overwrites = channel.overwrites
+                    parent = self._guild.channels.get(parent_id or "")
+                    if item.get('lock_permissions') and parent is not None and parent_id != channel.parent_id:
+                        # Synced with the new category, Discord ignores the flag without a parent change
+                        overwrites = parent.overwrites
+                    moved = channel.remapped(parent_id, overwrites)
+                    moved.position = item.get('position', channel.position)
+                    self._guild.add_channel(moved)
+
+    def drift(self, fresh: Guild) -> Dict[str, List[str]]:
+        """
+        Compare the cached state with a fresh fetch of the server.
+
+        Args:
+            fresh: The server as fetched now
+
+        Returns:
+            IDs of the roles, channels and emojis that were added, removed or
+            changed outside the cloner, keyed like "roles_changed". Only
+            non-empty lists are included, so no drift is an empty dict.
+        """
+        drift: Dict[str, List[str]] = {}
+        with self._lock:
+            cached = self._guild
+            for kind in ("roles", "channels", "emojis"):
+                before: Dict[str, Any] = getattr(cached, kind)
+                after: Dict[str, Any] = getattr(fresh, kind)
+                changes = {
+                    "added": sorted(set(after) - set(before)),
+                    "removed": sorted(set(before) - set(after)),
+                    "changed": sorted(
+                        object_id for object_id in set(before) & set(after)
+                        if fingerprint(before[object_id]) != fingerprint(after[object_id])
+                    )
+                }
+                drift.update({f"{kind}_{change}": ids for change, ids in changes.items() if ids})
+            if cached.name != fresh.name:
+                drift["server_changed"] = [cached.id]
+        return drift
+
+    def replace(self, fresh: Guild) -> None:
+        """
+        Replace the state with a fresh fetch of the server.
+
+        Args:
+            fresh: The server as fetched now
+        """
+        with self._lock:
+            self._guild = fresh.copy()
+            self.fetched_at = time.time()
+            self.writes = 0
+
+
+class StateCache:
+    """States of the servers a client has fetched, by server ID."""
+
+    def __init__(self) -> None:
+        self._states: Dict[str, GuildState] = {}
+        self._lock = threading.Lock()
+        # Creates in flight, and the bodies of those whose response was lost,
+        # by (server ID, collection, identifying fields)
+        self._in_flight: Dict[Tuple[str, str, Tuple[str, ...]], int] = {}
+        self._lost: Dict[Tuple[str, str, Tuple[str, ...]], List[str]] = {}
+        self._claim_lock = threading.Lock()
+
+    def get(self, server_id: str) -> Optional[GuildState]:
+        """
+        Get the state of a server.
+
+        Args:
+            server_id: ID of the server
+
+        Returns:
+            Its state, None if the server was not fetched
+        """
+        with self._lock:
+            return self._states.get(server_id)
+
+    def put(self, guild: Guild) -> GuildState:
+        """
+        Start tracking a freshly fetched server, replacing any earlier state.
+
+        Args:
+            guild: The server as fetched
+
+        Returns:
+            Its new state
+        """
+        state = GuildState(guild)
+        with self._lock:
+            self._states[guild.id] = state
+        return state
+
+    def drop(self, server_id: str) -> None:
+        """Stop tracking a server."""
+        with self._lock:
+            self._states.pop(server_id, None)
+
+    def record(self, method: str, path: str, json_data: Optional[Any], result: Any) -> None:
+        """
+        Apply a successful write to the state of the server it changed.
+
+        Reads and writes to untracked servers are ignored.
+
+        Args:
+            method: HTTP method of the request
+            path: API path of the request
+            json_data: JSON body that was sent
+            result: Response JSON, or the status code of empty responses
+        """
+        if method.upper() == "GET":
+            return
+        with self._lock:
+            states = list(self._states.values())
+
+        match = GUILD_PATH_PATTERN.match(path.split("?", 1)[0])
+        if match:
+            targets: Tuple[GuildState, ...] = tuple(state for state in states if state.id == match.group(1))
+        else:
+            channel = CHANNEL_PATH_PATTERN.match(path.split("?", 1)[0])
+            targets = tuple(state for state in states if channel and state.has_channel(channel.group(1)))
+        for state in targets:
+            state.apply(method, path, json_data, result)
+
+    def create_list_path(self, method: str, path: str) -> Optional[str]:
+        """
+        Get the path listing the objects a create request adds to.
+
+        Args:
+            method: HTTP method of the request
+            path: API path of the request
+
+        Returns:
+            Path to GET to see whether the create went through, None if the
+            request is not a role, channel or emoji create in a tracked server
+        """
+        match = GUILD_PATH_PATTERN.match(path.split("?", 1)[0])
+        if method.upper() != "POST" or not match or not match.group(2) or match.group(3):
+            return None
+        if self.get(match.group(1)) is None:
+            return None
+        return f"/guilds/{match.group(1)}/{match.group(2)}"
+
+    @staticmethod
+    def _create_key(path: str, json_data: Optional[Any]) -> Optional[Tuple[str, str, Tuple[str, ...]]]:
+        match = GUILD_PATH_PATTERN.match(path.split("?", 1)[0])
+        if not match or not match.group(2) or match.group(3) or not isinstance(json_data, dict):
+            return None
+        collection = match.group(2)
+        values = tuple(str(json_data.get(field)) for field in CREATE_KEY_FIELDS[collection] if field in json_data)
+        return match.group(1), collection, values
+
+    @contextlib.contextmanager
+    def creating(self, method: str, path: str, json_data: Optional[Any]) -> Iterator[None]:
+        """
+        Mark a create request as in flight while it is sent and retried.
+
+        Other requests pass through.
+
+        Args:
+            method: HTTP method of the request
+            path: API path of the request
+            json_data: JSON body that is sent
+        """
+        key = self._create_key(path, json_data) if self.create_list_path(method, path) else None
+        if key is None:
+            yield
+            return
+        with self._lock:
+            self._in_flight[key] = self._in_flight.get(key, 0) + 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._in_flight[key] -= 1
+                if not self._in_flight[key]:
+                    del self._in_flight[key]
+
+    @contextlib.contextmanager
+    def checking(self, path: str, json_data: Optional[Any]) -> Iterator[None]:
+        """
+        Mark an in-flight create as having lost its response while it is checked.
+
+        Args:
+            path: API path of the create request
+            json_data: JSON body that was sent
+        """
+        key = self._create_key(path, json_data)
+        if key is None:
+            yield
+            return
+        body = json.dumps(json_data, sort_keys=True)
+        with self._lock:
+            self._lost.setdefault(key, []).append(body)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._lost[key].remove(body)
+                if not self._lost[key]:
+                    del self._lost[key]
+
+    def awaiting_response(self, path: str, json_data: Optional[Any]) -> int:
+        """
+        Count the creates with the same identifying fields still waiting for their response.
+
+        Their objects may already be listed without being in the state, so a
+        lost create is only checked once there are none.
+
+        Args:
+            path: API path of the create request
+            json_data: JSON body that was sent
+
+        Returns:
+            Number of such creates, not counting those in checking()
+        """
+        key = self._create_key(path, json_data)
+        with self._lock:
+            return self._in_flight.get(key, 0) - len(self._lost.get(key, [])) if key else 0
+
+    def find_created(
+        self,
+        path: str,
+        json_data: Optional[Any],
+        listed: List[Dict[str, Any]]
+    ) -> Tuple[bool, Optional[Dict[str, Any]]]:
+        """
+        Find the object a create request made before its response was lost.
+
+        It is a listed object that the state does not know yet and that
+        matches the identifying fields of the request. A match is applied to
+        the state like a successful response, under a lock, so concurrent
+        lost creates never claim the same object. Nothing is claimed while
+        a create with the same fields still waits for its response, or when
+        there are more matches than lost creates that sent this very body,
+        since the object may not be this request's.
+
+        Args:
+            path: API path of the create request
+            json_data: JSON body that was sent
+            listed: Current objects of the collection, from create_list_path()
+
+        Returns:
+            Tuple of (whether the create can be sent again, the object it
+            created if it went through)
+        """
+        key = self._create_key(path, json_data)
+        state = self.get(key[0]) if key else None
+        if state is None:
+            return False, None
+        _, collection, _ = key
+        fields = [field for field in CREATE_KEY_FIELDS[collection] if field in json_data]
+        with self._claim_lock:
+            known = set(state.known_ids(collection))
+            candidates = [
+                data for data in listed
+                if data.get('id') not in known
+                and all(str(data.get(field)) == str(json_data.get(field)) for field in fields)
+            ]
+            if not candidates:
+                return True, None
+            with self._lock:
+                awaiting = self._in_flight.get(key, 0) - len(self._lost.get(key, []))
+                lost = list(self._lost.get(key, [])) or [json.dumps(json_data, sort_keys=True)]
+            # Objects of identical lost creates are interchangeable, any other match is a guess
+            if awaiting > 0 or len(set(lost)) > 1 or len(candidates) > len(lost):
+                logging.warning(f"Cannot tell which of {len(candidates)} new {collection} named "
+                                f"{json_data.get('name')} was created, not sending it again.")
+                return False, None
+            state.apply("POST", path, json_data, candidates[0])
+            return False, candidates[0]
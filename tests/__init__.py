@@ -0,0 +1 @@
+"""Tests of the Discord Server Cloner, run with python -m pytest from the repository root."""
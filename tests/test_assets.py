@@ -0,0 +1,165 @@
+"""Tests of the asset cache and fetcher, run against a local CDN."""
+
+import base64
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List
+
+import pytest
+
+from assets import AssetCache, AssetFetcher, guild_asset_paths, to_data_uri
+from cloner import plan_guild_assets
+from scheduler import TaskGraph
+
+IMAGES = {"/emojis/30.png": b"\x89PNG emoji", "/emojis/31.gif": b"GIF89a emoji"}
+
+
+class CdnHandler(BaseHTTPRequestHandler):
+    """Serves IMAGES and records the requested paths."""
+
+    requests: List[str] = []
+
+    def do_GET(self) -> None:
+        self.requests.append(self.path)
+        content = IMAGES.get(self.path)
+        if content is None:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+@pytest.fixture
+def cdn():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), CdnHandler)
+    CdnHandler.requests = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}", CdnHandler.requests
+    server.shutdown()
+    server.server_close()
+
+
+def test_data_uri_type_follows_the_extension():
+    assert to_data_uri("emojis/31.gif", b"GIF") == "data:image/gif;base64," + base64.b64encode(b"GIF").decode()
+    assert to_data_uri("icons/1/abc.png", b"PNG").startswith("data:image/png;base64,")
+
+
+def test_guild_asset_paths():
+    server_info = {"id": "1", "icon": "abc", "banner": "a_def", "splash": None}
+    assert guild_asset_paths(server_info) == {"icon": "icons/1/abc.png", "banner": "banners/1/a_def.gif"}
+
+
+def test_cache_put_then_get(tmp_path):
+    cache = AssetCache(str(tmp_path))
+    assert cache.get("emojis/30.png") is None
+
+    assert cache.put("emojis/30.png", iter([b"\x89PNG", b" emoji"])) == b"\x89PNG emoji"
+
+    assert cache.get("emojis/30.png") == b"\x89PNG emoji"
+    assert os.listdir(str(tmp_path / "emojis")) == ["30.png"]
+
+
+def test_concurrent_puts_of_one_image_do_not_mix(tmp_path):
+    cache = AssetCache(str(tmp_path))
+    barrier = threading.Barrier(4)
+
+    def chunks(content: bytes):
+        barrier.wait()
+        for byte in content:
+            yield bytes([byte])
+
+    threads = [
+        threading.Thread(target=cache.put, args=("emojis/30.png", chunks(bytes([index]) * 1000)))
+        for index in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    content = cache.get("emojis/30.png")
+    assert len(content) == 1000 and len(set(content)) == 1
+    assert os.listdir(str(tmp_path / "emojis")) == ["30.png"]
+
+
+def test_images_are_downloaded_once(cdn, tmp_path):
+    base_url, requests = cdn
+    with AssetFetcher(base_url, AssetCache(str(tmp_path)), workers=2) as fetcher:
+        fetcher.prefetch(["emojis/30.png", "emojis/31.gif", "emojis/30.png"])
+        assert fetcher.get("emojis/30.png") == to_data_uri("emojis/30.png", IMAGES["/emojis/30.png"])
+        assert fetcher.get("emojis/31.gif") == to_data_uri("emojis/31.gif", IMAGES["/emojis/31.gif"])
+        assert fetcher.downloads == 2
+
+    # A new fetcher reads the disk cache instead of the CDN
+    with AssetFetcher(base_url, AssetCache(str(tmp_path))) as fetcher:
+        assert fetcher.get("emojis/30.png") == to_data_uri("emojis/30.png", IMAGES["/emojis/30.png"])
+        assert (fetcher.hits, fetcher.downloads) == (1, 0)
+
+    assert sorted(requests) == ["/emojis/30.png", "/emojis/31.gif"]
+
+
+def test_images_asked_for_at_once_are_downloaded_once(cdn, tmp_path):
+    base_url, requests = cdn
+    barrier = threading.Barrier(8)
+    results = []
+    with AssetFetcher(base_url, AssetCache(str(tmp_path)), workers=2) as fetcher:
+        def get() -> None:
+            barrier.wait()
+            results.append(fetcher.get("emojis/30.png"))
+
+        threads = [threading.Thread(target=get) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert fetcher.downloads == 1
+
+    assert results == [to_data_uri("emojis/30.png", IMAGES["/emojis/30.png"])] * 8
+
+    assert requests == ["/emojis/30.png"]
+
+
+def test_failed_downloads_are_none(cdn, tmp_path):
+    base_url, _ = cdn
+    with AssetFetcher(base_url, AssetCache(str(tmp_path))) as fetcher:
+        assert fetcher.get("emojis/99.png") is None
+    assert AssetCache(str(tmp_path)).get("emojis/99.png") is None
+
+
+def test_uploaded_hashes_are_remembered(tmp_path):
+    AssetCache(str(tmp_path)).record_upload("abc", "xyz")
+    assert AssetCache(str(tmp_path)).uploaded_hash("abc") == "xyz"
+    assert AssetCache(str(tmp_path)).uploaded_hash("def") is None
+
+
+def plan_images(server_info, target_info, fetcher):
+    graph = TaskGraph()
+    plan_guild_assets(graph, "2", server_info, target_info, fetcher)
+    return graph.tasks.get("update_server_images")
+
+
+def test_server_images_are_sent_once(tmp_path):
+    cache = AssetCache(str(tmp_path))
+    cache.put("icons/1/abc.png", [b"icon"])
+    cache.put("banners/1/def.png", [b"banner"])
+    server_info = {"id": "1", "icon": "abc", "banner": "def"}
+
+    # Unreachable CDN, the images come from the cache
+    with AssetFetcher("http://127.0.0.1:9", cache) as fetcher:
+        task = plan_images(server_info, {"id": "2", "features": []}, fetcher)
+        # The banner needs a feature the target lacks
+        assert task.build() == ("/guilds/2", {"icon": to_data_uri("icons/1/abc.png", b"icon")})
+        task.on_result({"id": "2", "icon": "xyz"})
+
+        # Discord hashes the upload differently, which is not a change
+        assert plan_images(server_info, {"id": "2", "icon": "xyz", "features": []}, fetcher) is None
+        assert plan_images(dict(server_info, icon=None), {"id": "2", "icon": "xyz"}, fetcher).build() == (
+            "/guilds/2", {"icon": None}
+        )
@@ -0,0 +1,91 @@
+"""Tests of loading and running batch job files."""
+
+import json
+
+import pytest
+
+import batch
+from batch import JobError, load_jobs, run_jobs, validate_job
+from cloner import CloneResult
+
+
+def write_jobs(tmp_path, document) -> str:
+    path = tmp_path / "jobs.json"
+    path.write_text(json.dumps(document), encoding="utf-8")
+    return str(path)
+
+
+def test_jobs_get_the_defaults_and_an_id(tmp_path):
+    path = write_jobs(tmp_path, {
+        "defaults": {"mode": "reconcile"},
+        "jobs": [{"id": "eu", "source": "1", "target": "2"}, {"source": "1", "targets": ["3"], "mode": "full"}]
+    })
+
+    jobs = load_jobs(path)
+
+    assert [(job["id"], job["mode"], job["engine"]) for job in jobs] == [
+        ("eu", "reconcile", "sync"), ("2", "full", "sync")
+    ]
+    assert load_jobs(write_jobs(tmp_path, [{"source": "1", "target": "2"}]))[0]["id"] == "1"
+
+
+@pytest.mark.parametrize("document", [
+    {"jobs": "all"}, {"jobs": []}, {"defaults": {}}, "jobs", {"defaults": ["async"], "jobs": [{"source": "1"}]}
+])
+def test_files_without_a_job_list_are_rejected(tmp_path, document):
+    with pytest.raises(JobError):
+        load_jobs(write_jobs(tmp_path, document))
+    with pytest.raises(JobError):
+        load_jobs(str(tmp_path / "missing.json"))
+
+
+def test_only_jobs_cloning_into_one_server_fail(tmp_path, monkeypatch):
+    monkeypatch.setattr(batch, "clone_to_targets", lambda client, source_id, targets, *args, **kwargs: [
+        CloneResult(target, success=True) for target in targets
+    ])
+    jobs = load_jobs(write_jobs(tmp_path, [
+        {"source": "1", "targets": ["2", "3"]}, {"source": "1", "target": "3"}, {"source": "1", "target": "4"}
+    ]))
+
+    results = run_jobs(jobs, "token")
+
+    assert [(result["job"], result["success"]) for result in results] == [("1", False), ("2", False), ("3", True)]
+    assert results[0]["error"] == results[1]["error"] == "jobs 1 and 2 both clone into server 3"
+    assert results[0]["targets"] == []
+
+
+@pytest.mark.parametrize("job, error", [
+    ({"invalid": 5}, "object"),
+    ({"source": "1"}, "target"),
+    ({"source": "1", "targets": ["2", "2"]}, "twice"),
+    ({"target": "2"}, "source"),
+    ({"source": "1", "target": "abc"}, "numeric"),
+    ({"source": "1", "target": "2", "mode": "mirror"}, "mode"),
+    ({"source": "1", "target": "2", "engine": "threads"}, "engine")
+])
+def test_invalid_jobs(job, error):
+    with pytest.raises(JobError, match=error):
+        validate_job(dict(batch.JOB_DEFAULTS, **job))
+
+
+def test_a_failing_job_does_not_stop_the_others(tmp_path, monkeypatch):
+    def clone_to_targets(client, source_id, targets, *args, **kwargs):
+        if source_id == "9":
+            raise RuntimeError("source went away")
+        return [CloneResult(target, success=True) for target in targets]
+
+    monkeypatch.setattr(batch, "clone_to_targets", clone_to_targets)
+    jobs = load_jobs(write_jobs(tmp_path, [
+        {"source": "1", "targets": ["2", "3"]},
+        {"source": "9", "target": "4"},
+        {"source": "1"}
+    ]))
+    results_path = str(tmp_path / "results.jsonl")
+
+    results = run_jobs(jobs, "token", results_path)
+
+    assert [(result["job"], result["success"]) for result in results] == [("1", True), ("2", False), ("3", False)]
+    assert [target["target_server_id"] for target in results[0]["targets"]] == ["2", "3"]
+    assert results[1]["error"] == "source went away"
+    with open(results_path, encoding="utf-8") as file:
+        assert sorted(json.loads(line)["job"] for line in file) == ["1", "2", "3"]
@@ -0,0 +1,49 @@
+"""Tests of the on-disk source cache."""
+
+import os
+import time
+
+from cache import SourceCache
+
+DATA = ({"id": "1", "name": "Source"}, [{"id": "10", "name": "general"}], [{"id": "1", "name": "@everyone"}], [])
+
+
+def test_put_then_get(tmp_path):
+    cache = SourceCache(60, str(tmp_path))
+    assert cache.get("1") is None
+
+    cache.put("1", DATA)
+
+    assert cache.get("1") == DATA
+    assert cache.get("2") is None
+    assert os.listdir(str(tmp_path / "servers")) == ["1.json"]
+
+
+def test_entries_expire_after_the_ttl(tmp_path, monkeypatch):
+    cache = SourceCache(60, str(tmp_path))
+    cache.put("1", DATA)
+
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 59)
+    assert cache.get("1") == DATA
+    monkeypatch.setattr(time, "time", lambda: now + 61)
+    assert cache.get("1") is None
+
+
+def test_invalidate(tmp_path):
+    cache = SourceCache(60, str(tmp_path))
+    cache.put("1", DATA)
+
+    cache.invalidate("1")
+    cache.invalidate("1")
+
+    assert cache.get("1") is None
+
+
+def test_corrupt_entries_are_misses(tmp_path):
+    cache = SourceCache(60, str(tmp_path))
+    cache.put("1", DATA)
+    with open(str(tmp_path / "servers" / "1.json"), "w") as file:
+        file.write("{\"fetched_at\": ")
+
+    assert cache.get("1") is None
@@ -0,0 +1,152 @@
+"""End-to-end clones against the local mock Discord API."""
+
+import json
+from typing import Optional
+
+import pytest
+
+from assets import AssetFetcher
+from batch import load_jobs, run_jobs
+from benchmark import target_matches
+from cloner import DiscordClient, RateLimiter, clone_server, clone_to_targets
+from filters import CloneFilter
+from metrics import Metrics
+from mock_discord import MockDiscordServer, RateLimits
+
+READS = {
+    "GET /guilds/{id}": 2,
+    "GET /guilds/{id}/channels": 2,
+    "GET /guilds/{id}/emojis": 2,
+    "GET /guilds/{id}/roles": 2
+}
+
+
+def clone(
+    server: MockDiscordServer, source_id: str, target_id: str, engine: str, mode: str = "full",
+    clone_filter: Optional[CloneFilter] = None
+) -> bool:
+    with DiscordClient(
+        "test", base_url=server.api_base_url, rate_limiter=RateLimiter(), metrics=Metrics()
+    ) as client, AssetFetcher(server.base_url) as assets:
+        return clone_server(
+            client, source_id, target_id, None, engine=engine,
+            concurrency=4 if engine == "async" else 1, mode=mode, assets=assets, clone_filter=clone_filter
+        )
+
+
+@pytest.mark.parametrize("engine", ["sync", "async"])
+def test_full_clone_then_reconcile(engine):
+    with MockDiscordServer() as server:
+        source_id = server.state.add_guild("Source", 12, 5, 3, 2)
+        target_id = server.state.add_guild("Target", 0, 0)
+
+        assert clone(server, source_id, target_id, engine)
+        assert target_matches(server, source_id, target_id)
+        assert server.state.guilds[target_id]["info"]["name"] == "Source"
+        assert server.state.calls == dict(READS, **{
+            "POST /guilds/{id}/roles": 5,
+            "POST /guilds/{id}/channels": 12,
+            "POST /guilds/{id}/emojis": 2,
+            "PATCH /guilds/{id}": 1,
+            "PATCH /guilds/{id}/roles": 1,
+            "PATCH /guilds/{id}/roles/{id}": 1,
+            "PATCH /guilds/{id}/channels": 1
+        })
+
+        # A matching target only needs the reads
+        server.state.calls.clear()
+        assert clone(server, source_id, target_id, engine, "reconcile")
+        assert server.state.calls == READS
+
+
+@pytest.mark.parametrize("engine", ["sync", "async"])
+def test_reconcile_resyncs_a_synced_channel_that_stays_in_its_category(engine):
+    with MockDiscordServer() as server:
+        source_id = server.state.add_guild("Source", 4, 3, 2, categories=1, synced=1.0)
+        target_id = server.state.add_guild("Target", 0, 0)
+        assert clone(server, source_id, target_id, engine)
+
+        # Someone changes a synced channel's permissions, it stays in its category
+        channel = next(channel for channel in server.state.guilds[target_id]["channels"] if channel["parent_id"])
+        channel["permission_overwrites"] = []
+        assert not target_matches(server, source_id, target_id)
+
+        server.state.calls.clear()
+        assert clone(server, source_id, target_id, engine, "reconcile")
+        assert target_matches(server, source_id, target_id)
+        assert server.state.calls == dict(READS, **{"PATCH /channels/{id}": 1})
+
+
+@pytest.mark.parametrize("engine", ["sync", "async"])
+def test_excluded_channels_keep_their_category_in_a_full_clone(engine):
+    with MockDiscordServer() as server:
+        source_id = server.state.add_guild("Source", 6, 3, 1, categories=1)
+        target_id = server.state.add_guild("Target", 0, 0)
+        assert clone(server, source_id, target_id, engine)
+        excluded = next(
+            channel for channel in server.state.guilds[target_id]["channels"] if channel["name"] == "channel-3"
+        )
+        category_id = excluded["parent_id"]
+
+        assert clone(server, source_id, target_id, engine, clone_filter=CloneFilter(exclude_channels=["channel-3"]))
+
+        channels = {channel["id"]: channel for channel in server.state.guilds[target_id]["channels"]}
+        assert channels[excluded["id"]]["parent_id"] == category_id
+        assert category_id in channels
+        assert target_matches(server, source_id, target_id)
+
+
+@pytest.mark.parametrize("engine", ["sync", "async"])
+def test_clone_retries_global_rate_limits(engine):
+    # A global limit sends no bucket headers ahead of time, so the clone has to run into 429s
+    with MockDiscordServer(rate_limits=RateLimits(route_limit=0, global_limit=10)) as server:
+        source_id = server.state.add_guild("Source", 6, 4, 2)
+        target_id = server.state.add_guild("Target", 0, 0)
+
+        assert clone(server, source_id, target_id, engine)
+        assert server.state.rate_limited > 0
+        assert target_matches(server, source_id, target_id)
+        # Rate limited creates are applied once, when they are retried
+        target = server.state.guilds[target_id]
+        assert (len(target["roles"]), len(target["channels"])) == (5, 6)
+
+
+def test_one_source_into_many_targets():
+    with MockDiscordServer() as server:
+        source_id = server.state.add_guild("Source", 8, 4, 2, 2)
+        target_ids = [server.state.add_guild(f"Target {index}", 0, 0) for index in range(3)]
+
+        with DiscordClient(
+            "test", base_url=server.api_base_url, rate_limiter=RateLimiter(), metrics=Metrics()
+        ) as client, AssetFetcher(server.base_url) as assets:
+            results = clone_to_targets(client, source_id, target_ids, assets=assets, parallel_targets=3)
+
+        assert [result.target_server_id for result in results] == target_ids
+        assert all(result.success for result in results)
+        assert all(target_matches(server, source_id, target_id) for target_id in target_ids)
+        # The source is read once, each target once, and every emoji image downloaded once
+        assert server.state.calls["GET /guilds/{id}/roles"] == 4
+        assert assets.downloads == 2
+
+
+def test_batch_jobs(tmp_path, monkeypatch):
+    # Journals and cached images go to the working directory
+    monkeypatch.chdir(tmp_path)
+    with MockDiscordServer() as server:
+        source_id = server.state.add_guild("Source", 6, 3, 1, 1)
+        target_ids = [server.state.add_guild(f"Target {index}", 0, 0) for index in range(3)]
+        jobs_path = tmp_path / "jobs.json"
+        jobs_path.write_text(json.dumps({"defaults": {"engine": "async", "concurrency": 4}, "jobs": [
+            {"id": "first", "source": source_id, "targets": target_ids[:2]},
+            {"id": "second", "source": source_id, "target": target_ids[2], "mode": "reconcile"},
+            {"id": "broken", "source": source_id}
+        ]}), encoding="utf-8")
+
+        results = run_jobs(
+            load_jobs(str(jobs_path)), "test", base_url=server.api_base_url, cdn_base_url=server.base_url
+        )
+
+        assert [(result["job"], result["success"]) for result in results] == [
+            ("first", True), ("second", True), ("broken", False)
+        ]
+        assert all(target_matches(server, source_id, target_id) for target_id in target_ids)
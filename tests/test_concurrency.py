@@ -0,0 +1,117 @@
+"""Tests of the AIMD concurrency controller."""
+
+import asyncio
+import time
+
+import pytest
+
+from concurrency import INCREASE_INTERVAL, ConcurrencyController
+
+
+class Clock:
+    """Stand-in for time.monotonic that only moves when told to."""
+
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(time, "monotonic", clock)
+    return clock
+
+
+def fill(controller: ConcurrencyController) -> None:
+    while controller.try_acquire():
+        pass
+
+
+def test_limit_grows_once_per_interval_while_in_use(clock):
+    controller = ConcurrencyController(8, initial_limit=2)
+    fill(controller)
+    clock.now += INCREASE_INTERVAL
+    controller.release(clock.now, 0.1, 200)
+    assert controller.limit == 3
+
+    # Too soon for the next increase
+    controller.try_acquire()
+    controller.release(clock.now, 0.1, 200)
+    assert controller.limit == 3
+
+
+def test_unused_limit_does_not_grow(clock):
+    controller = ConcurrencyController(8, initial_limit=4)
+    controller.try_acquire()
+    clock.now += INCREASE_INTERVAL
+    controller.release(clock.now, 0.1, 200)
+    assert controller.limit == 4
+
+
+def test_congestion_cuts_the_limit(clock):
+    controller = ConcurrencyController(64, initial_limit=32)
+
+    for status, global_limit, expected in ((429, False, 16), (429, True, 4), (503, False, 3), (None, False, 2)):
+        clock.now += 0.1
+        controller.try_acquire()
+        controller.release(clock.now, 0.1, status, global_limit)
+        assert controller.limit == expected
+
+    assert controller.decreases == {"rate limit": 1, "global rate limit": 1, "server error": 2}
+
+
+def test_requests_in_flight_before_a_cut_do_not_cut_again(clock):
+    controller = ConcurrencyController(64, initial_limit=32)
+    fill(controller)
+    sent = clock.now
+
+    clock.now += 0.5
+    for _ in range(10):
+        controller.release(sent, 0.1, 429)
+
+    assert controller.limit == 16
+    assert controller.in_flight == 22
+
+
+def test_limit_stays_within_its_bounds(clock):
+    controller = ConcurrencyController(3, min_limit=2, initial_limit=10)
+    assert controller.limit == 3
+    for _ in range(5):
+        clock.now += 0.1
+        controller.try_acquire()
+        controller.release(clock.now, 0.1, 429, global_limit=True)
+    assert controller.limit == 2
+
+
+def test_latency_spike_cuts_the_limit(clock):
+    controller = ConcurrencyController(16, initial_limit=8)
+    for _ in range(5):
+        controller.try_acquire()
+        controller.release(clock.now, 0.1, 200)
+    assert controller.limit == 8
+
+    for _ in range(5):
+        clock.now += 0.1
+        controller.try_acquire()
+        controller.release(clock.now, 1.0, 200)
+
+    assert controller.decreases.get("latency spike", 0) >= 1
+    assert controller.limit < 8
+
+
+def test_async_waiters_get_freed_slots():
+    controller = ConcurrencyController(1, initial_limit=1)
+
+    async def main():
+        await controller.acquire_async()
+        waiter = asyncio.ensure_future(controller.acquire_async())
+        await asyncio.sleep(0.01)
+        assert not waiter.done()
+        controller.release(time.monotonic(), 0.01, 200)
+        await asyncio.wait_for(waiter, 1.0)
+
+    asyncio.run(main())
+    assert controller.in_flight == 1
@@ -0,0 +1,46 @@
+"""Tests of dry runs against the local mock Discord API."""
+
+from collections import Counter
+
+from assets import AssetFetcher
+from cloner import DiscordClient, RateLimiter, clone_server
+from dry_run import dry_run
+from metrics import Metrics, route_template
+from mock_discord import MockDiscordServer
+
+
+def client_for(server: MockDiscordServer) -> DiscordClient:
+    return DiscordClient("test", base_url=server.api_base_url, rate_limiter=RateLimiter(), metrics=Metrics())
+
+
+def test_dry_run_counts_the_requests_and_changes_nothing():
+    with MockDiscordServer() as server:
+        source_id = server.state.add_guild("Source", 12, 5, 3, 2)
+        target_id = server.state.add_guild("Target", 0, 0)
+
+        with client_for(server) as client, AssetFetcher(server.base_url) as assets:
+            estimates = dry_run(client, source_id, target_id, assets=assets)
+
+        assert not [call for call in server.state.calls if not call.startswith("GET ")]
+        planned = Counter(
+            f"{request.method} {route_template(request.path)}" for request in estimates["full"].requests
+        )
+        # The requests of a real full clone, see test_clone
+        assert planned == {
+            "POST /guilds/{id}/roles": 5,
+            "POST /guilds/{id}/channels": 12,
+            "POST /guilds/{id}/emojis": 2,
+            "PATCH /guilds/{id}": 1,
+            "PATCH /guilds/{id}/roles": 1,
+            "PATCH /guilds/{id}/roles/{id}": 1,
+            "PATCH /guilds/{id}/channels": 1
+        }
+        assert 0 < len(estimates["reconcile"].requests) <= len(estimates["full"].requests)
+        assert estimates["full"].seconds > 0
+
+        # After a clone, a reconcile has nothing left to do
+        with client_for(server) as client, AssetFetcher(server.base_url) as assets:
+            assert clone_server(client, source_id, target_id, None, assets=assets)
+            estimates = dry_run(client, source_id, target_id, assets=assets)
+        assert estimates["reconcile"].requests == []
+        assert len(estimates["full"].requests) > 0
@@ -0,0 +1,78 @@
+"""Tests of the selective clone filters."""
+
+import pytest
+
+from filters import CloneFilter, parse_channel_type
+from model import CATEGORY_TYPE, Channel, Guild, Overwrite, Role
+
+
+def guild() -> Guild:
+    return Guild({"id": "1"}, [
+        Role("1", "@everyone"), Role("2", "Mods"), Role("3", "event-team"), Role("4", "members")
+    ], [
+        Channel("10", "Events", CATEGORY_TYPE, overwrites=(Overwrite("3", allow=1024),)),
+        Channel("11", "announcements", parent_id="10", overwrites=(Overwrite("1", deny=2048),)),
+        Channel("12", "stage", 2, parent_id="10"),
+        Channel("20", "General", CATEGORY_TYPE),
+        Channel("21", "team-red", parent_id="20", overwrites=(Overwrite("2", allow=1024),)),
+        Channel("22", "team-blue", 2, parent_id="20"),
+        Channel("30", "rules")
+    ])
+
+
+def test_include_category_selects_its_channels():
+    clone_filter = CloneFilter(include_categories=["events"])
+    assert clone_filter.scope(guild()) == {"10", "11", "12"}
+
+    selected = clone_filter.select(guild())
+    assert set(selected.channels) == {"10", "11", "12"}
+    # Roles come along only as overwrite dependencies, @everyone never does
+    assert set(selected.roles) == {"3"}
+
+
+def test_channel_patterns_bring_their_parent_and_roles():
+    clone_filter = CloneFilter(include_channels=["TEAM-*"], exclude_types=[2])
+    server = guild()
+
+    assert clone_filter.scope(server) == {"21"}
+    selected = clone_filter.select(server)
+    assert set(selected.channels) == {"20", "21"}
+    assert set(selected.roles) == {"2"}
+    assert selected.info == server.info
+
+
+def test_excluded_categories_drop_their_channels():
+    scope = CloneFilter(exclude_categories=["general"]).scope(guild())
+    assert scope == {"10", "11", "12", "30"}
+
+
+def test_categories_with_left_out_channels_are_only_parents():
+    server = guild()
+
+    # team-red is left out, so General stays out of the scope and keeps it
+    assert CloneFilter(exclude_channels=["team-red"]).scope(server) == {"10", "11", "12", "22", "30"}
+    assert CloneFilter(exclude_types=[2]).scope(server) == {"11", "21", "30"}
+    selected = CloneFilter(exclude_channels=["team-red"]).select(server)
+    assert set(selected.channels) == {"10", "11", "12", "20", "22", "30"}
+
+
+def test_role_patterns_scope_roles_only():
+    clone_filter = CloneFilter(include_roles=["*"], exclude_roles=["event-*"])
+    assert clone_filter.scope(guild()) == {"1", "2", "4"}
+    assert set(clone_filter.select(guild()).channels) == set()
+
+
+def test_filters_round_trip_through_json_data():
+    clone_filter = CloneFilter.from_dict({"include_types": ["text", "13"], "exclude_roles": ["bots"]})
+    assert clone_filter.include_types == [0, 13]
+    assert CloneFilter.from_dict(clone_filter.to_dict()).to_dict() == clone_filter.to_dict()
+    assert CloneFilter().is_empty()
+
+
+def test_unknown_filter_data_is_rejected():
+    with pytest.raises(ValueError):
+        CloneFilter.from_dict({"include_emojis": ["*"]})
+    with pytest.raises(ValueError):
+        CloneFilter.from_dict({"include_roles": "mods"})
+    with pytest.raises(ValueError):
+        parse_channel_type("thread")
@@ -0,0 +1,55 @@
+"""Tests of resuming a clone from its checkpoint journal."""
+
+import pytest
+
+from journal import Journal, JournalError, read_journal
+from scheduler import Task
+
+HEADER = {"source": "1", "target": "2", "mode": "full"}
+
+
+def finished(key: str) -> Task:
+    return Task(key, "POST", lambda: None)
+
+
+def test_resume_skips_a_cut_off_last_line(tmp_path):
+    path = str(tmp_path / "2.jsonl")
+    with Journal(path, HEADER) as journal:
+        journal.mapping["10"] = "20"
+        journal.record_task(finished("create_role:10"), {"id": "20"})
+        journal.record_task(finished("create_role:11"), None)
+    with open(path, "a", encoding="utf-8") as file:
+        file.write('{"type":"task","key":"create_ch')
+
+    state = read_journal(path)
+    assert state.header["target"] == "2"
+    assert state.completed == {"create_role:10"}
+    assert state.id_mapping == {"10": "20"}
+
+    # The resumed journal starts its records on a new line
+    with Journal(path, HEADER, state) as journal:
+        journal.mapping["11"] = "21"
+        journal.record_task(finished("create_role:11"), {"id": "21"})
+
+    state = read_journal(path)
+    assert state.completed == {"create_role:10", "create_role:11"}
+    assert state.id_mapping == {"10": "20", "11": "21"}
+
+
+def test_unchanged_mappings_are_not_recorded_again(tmp_path):
+    path = str(tmp_path / "2.jsonl")
+    with Journal(path, HEADER) as journal:
+        journal.mapping.update({"10": "20"})
+        journal.mapping["10"] = "20"
+    with open(path, encoding="utf-8") as file:
+        assert len(file.readlines()) == 2
+
+
+def test_missing_or_foreign_files_are_rejected(tmp_path):
+    with pytest.raises(JournalError):
+        read_journal(str(tmp_path / "missing.jsonl"))
+
+    other = tmp_path / "other.jsonl"
+    other.write_text('{"type":"task","key":"a"}\n', encoding="utf-8")
+    with pytest.raises(JournalError):
+        read_journal(str(other))
@@ -0,0 +1,60 @@
+"""Tests of the request and phase metrics."""
+
+import json
+
+from metrics import Metrics, route_template
+
+
+def test_route_template_replaces_ids():
+    assert route_template("/guilds/123/roles/456") == "/guilds/{id}/roles/{id}"
+    assert route_template("/channels/7/permissions/8?reason=x") == "/channels/{id}/permissions/{id}"
+
+
+def recorded() -> Metrics:
+    metrics = Metrics()
+    metrics.record_request("POST", "/guilds/1/roles", 200, 0.03)
+    metrics.record_request("POST", "/guilds/2/roles", 429, 0.2, throttled=1.5)
+    metrics.record_request("POST", "/guilds/2/roles", 200, 3.0, retry=True)
+    metrics.record_request("GET", "/guilds/1", None, 20.0)
+    metrics.record_phase("plan", 0.5)
+    metrics.record_phase("plan", 0.25)
+    return metrics
+
+
+def test_requests_are_grouped_by_route():
+    report = recorded().to_dict()
+
+    assert report["totals"] == {
+        "requests": 4, "rate_limited": 1, "retries": 1, "throttle_seconds": 1.5, "latency_seconds": 23.23
+    }
+    roles = next(route for route in report["routes"] if route["route"] == "/guilds/{id}/roles")
+    assert roles["statuses"] == {"200": 2, "429": 1}
+    assert roles["latency_histogram"]["0.05"] == 1
+    assert roles["latency_histogram"]["0.25"] == 1
+    assert roles["latency_histogram"]["5.0"] == 1
+    guild = next(route for route in report["routes"] if route["route"] == "/guilds/{id}")
+    assert guild["statuses"] == {"error": 1}
+    assert guild["latency_histogram"]["+Inf"] == 1
+    assert report["phases"] == {"plan": {"runs": 2, "seconds": 0.75}}
+
+
+def test_prometheus_histograms_are_cumulative():
+    text = recorded().to_prometheus()
+
+    labels = 'method="POST",route="/guilds/{id}/roles"'
+    assert f'discord_cloner_requests_total{{{labels},status="429"}} 1' in text
+    assert f'discord_cloner_request_duration_seconds_bucket{{{labels},le="0.25"}} 2' in text
+    assert f'discord_cloner_request_duration_seconds_bucket{{{labels},le="+Inf"}} 3' in text
+    assert 'discord_cloner_phase_runs_total{phase="plan"} 2' in text
+
+
+def test_write(tmp_path):
+    json_path = str(tmp_path / "metrics.json")
+    prometheus_path = str(tmp_path / "metrics.prom")
+
+    recorded().write(json_path, prometheus_path)
+
+    with open(json_path, encoding="utf-8") as file:
+        assert json.load(file)["totals"]["requests"] == 4
+    with open(prometheus_path, encoding="utf-8") as file:
+        assert file.read().startswith("# HELP discord_cloner_requests_total")
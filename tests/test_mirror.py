@@ -0,0 +1,88 @@
+"""Tests of how the mirror coalesces gateway events into target changes."""
+
+from typing import List
+
+from cloner import DiscordClient
+from mirror import MAX_DEBOUNCE_WINDOWS, Mirror
+from model import Guild
+from scheduler import run_graph
+
+EVERYONE = {"id": "1", "name": "@everyone", "permissions": "0", "position": 0}
+MOD = {"id": "2", "name": "mod", "permissions": "8", "position": 1, "color": 0, "hoist": False, "mentionable": False}
+GENERAL = {"id": "10", "name": "general", "type": 0, "position": 0, "topic": None, "nsfw": False,
+           "permission_overwrites": []}
+
+
+def mirror() -> Mirror:
+    source = Guild.from_data({"id": "1", "name": "Source"}, [GENERAL], [EVERYONE, MOD])
+    # The mirror reads the target from the client's state cache
+    client = DiscordClient("test")
+    client.state_cache.put(Guild.from_data(
+        {"id": "100", "name": "Source"}, [dict(GENERAL, id="910")], [dict(EVERYONE, id="100"), dict(MOD, id="902")]
+    ))
+    return Mirror(client, source, "100", {"1": "100", "2": "902", "10": "910"}, debounce=2.0)
+
+
+def write(mirror: Mirror, role_ids=(), channel_ids=()) -> List[tuple]:
+    calls = []
+
+    def request(method, path, json_data, operation_name):
+        calls.append((method, path, json_data))
+        return dict(json_data or {}, id=f"99{len(calls)}") if method != "DELETE" else 204
+
+    graph = mirror.plan_changes(mirror.source, set(role_ids), set(channel_ids), False, False)
+    run_graph(graph, request)
+    return calls
+
+
+def test_a_burst_of_events_is_one_request():
+    state = mirror()
+    for name in ("a", "b", "c"):
+        state.handle_event("GUILD_ROLE_UPDATE", {"guild_id": "1", "role": dict(MOD, name=name)})
+    state.handle_event("GUILD_ROLE_UPDATE", {"guild_id": "5", "role": dict(MOD, name="other guild")})
+
+    assert state.events == 3
+    assert state.dirty_roles == {"2"}
+    assert write(state, state.dirty_roles) == [("PATCH", "/guilds/100/roles/902", {"name": "c"})]
+
+
+def test_changes_wait_for_a_quiet_window():
+    state = mirror()
+    assert not state.due(0.0)
+    state.handle_event("CHANNEL_UPDATE", dict(GENERAL, guild_id="1", topic="news"))
+    first = state.first_change_at
+
+    assert not state.due(first + 1.0)
+    assert state.due(first + 2.0)
+    # A steady stream of events delays the write by at most MAX_DEBOUNCE_WINDOWS windows
+    state.last_change_at = first + 2.0 * MAX_DEBOUNCE_WINDOWS - 0.5
+    assert state.due(first + 2.0 * MAX_DEBOUNCE_WINDOWS)
+
+
+def test_unchanged_objects_send_nothing():
+    state = mirror()
+    state.handle_event("GUILD_ROLE_UPDATE", {"guild_id": "1", "role": dict(MOD)})
+    assert write(state, state.dirty_roles) == []
+
+
+def test_missing_objects_are_created_and_removed_ones_deleted():
+    state = mirror()
+    # The role was deleted by hand in the target
+    state.client.state_cache.get("100").apply("DELETE", "/guilds/100/roles/902", None, 204)
+    state.handle_event("GUILD_ROLE_UPDATE", {"guild_id": "1", "role": dict(MOD, name="moderators")})
+    state.handle_event("CHANNEL_DELETE", dict(GENERAL, guild_id="1"))
+
+    calls = write(state, state.dirty_roles, state.dirty_channels)
+
+    assert ("DELETE", "/channels/910", None) in calls
+    created = [json_data["name"] for method, path, json_data in calls if method == "POST"]
+    assert created == ["moderators"]
+
+
+def test_drift_is_written_back_right_away():
+    state = mirror()
+    state.mark_drift({"roles_changed": ["902"], "channels_added": ["999"]})
+
+    assert state.dirty_roles == {"2"}
+    assert state.dirty_channels == set()
+    assert state.due(state.first_change_at)
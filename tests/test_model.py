@@ -0,0 +1,69 @@
+"""Tests of the indexed guild model."""
+
+from model import CATEGORY_TYPE, Channel, Guild, Overwrite, Role
+
+
+def guild() -> Guild:
+    return Guild.from_data(
+        {"id": "1", "name": "Source"},
+        [
+            {"id": "10", "name": "info", "type": CATEGORY_TYPE},
+            {"id": "11", "name": "general", "type": 0, "parent_id": "10", "permission_overwrites": [
+                {"id": "2", "type": 0, "allow": "1024", "deny": "2048"}
+            ]},
+            {"id": "12", "name": "general", "type": 2, "parent_id": "10"},
+            {"id": "13", "name": "general", "type": 0}
+        ],
+        [{"id": "1", "name": "@everyone", "permissions": "0"}, {"id": "2", "name": "mod", "permissions": "8"}]
+    )
+
+
+def test_from_data_converts_the_api_fields():
+    source = guild()
+
+    assert source.everyone.id == "1"
+    assert [role.id for role in source.other_roles()] == ["2"]
+    assert source.roles["2"].permissions == 8
+    assert source.channels["11"].overwrites[0].key() == ("2", 0, 1024, 2048)
+    assert source.channels["11"].to_dict()["permission_overwrites"] == [
+        {"id": "2", "type": 0, "allow": "1024", "deny": "2048"}
+    ]
+
+
+def test_indexes():
+    source = guild()
+
+    assert [channel.id for channel in source.categories()] == ["10"]
+    assert sorted(channel.id for channel in source.children("10")) == ["11", "12"]
+    assert [channel.id for channel in source.children(None)] == ["10", "13"]
+    assert [channel.id for channel in source.channels_named("general", 0, "10")] == ["11"]
+    assert [channel.id for channel in source.channels_named("general", 0, None)] == ["13"]
+    assert [role.id for role in source.roles_named("mod")] == ["2"]
+
+
+def test_indexes_follow_changes():
+    source = guild()
+
+    source.add_channel(Channel("11", "chat", 0, parent_id=None))
+    source.add_role(Role("2", "moderators"))
+    source.remove_channel("12")
+
+    assert source.children("10") == []
+    assert [channel.id for channel in source.channels_named("chat", 0, None)] == ["11"]
+    assert source.channels_named("general", 0, "10") == []
+    assert source.roles_named("mod") == []
+    assert [role.id for role in source.roles_named("moderators")] == ["2"]
+    assert source.remove_channel("99") is None
+
+
+def test_copies_are_independent():
+    source = guild()
+    copy = source.copy()
+
+    copy.remove_role("2")
+    copy.add_channel(Channel("14", "new", overwrites=(Overwrite("1", deny=1024),)))
+    copy.info["name"] = "Copy"
+
+    assert "2" in source.roles
+    assert "14" not in source.channels
+    assert source.name == "Source"
@@ -0,0 +1,144 @@
+"""Tests of the clone planner, run against a fake Discord API."""
+
+from typing import Optional, Dict, List, Any, Callable
+
+from cloner import plan_clone, plan_reconcile
+from model import Guild
+from scheduler import run_graph
+
+TARGET_ID = "100"
+
+
+class FakeApi:
+    """Request function for run_graph that answers like Discord."""
+
+    def __init__(self, reject: Callable[[str, str, Optional[Any]], bool] = lambda *request: False) -> None:
+        self.calls: List[tuple] = []
+        self.reject = reject
+        self._next_id = 900
+
+    def __call__(self, method: str, path: str, json_data: Optional[Any], operation_name: str) -> Optional[Any]:
+        self.calls.append((method, path, json_data))
+        if self.reject(method, path, json_data):
+            return None
+        if method == "POST":
+            self._next_id += 1
+            return dict(json_data, id=str(self._next_id))
+        return json_data if json_data is not None else 204
+
+    def sent(self, method: str, path: str) -> List[Any]:
+        return [json_data for call_method, call_path, json_data in self.calls
+                if call_method == method and call_path == path]
+
+
+def overwrite(role_id: str, overwrite_type: int = 0, allow: int = 1024) -> Dict[str, Any]:
+    return {"id": role_id, "type": overwrite_type, "allow": str(allow), "deny": "0"}
+
+
+SERVER_INFO = {"id": "1", "name": "Source"}
+ROLES = [
+    {"id": "1", "name": "@everyone", "permissions": "0", "position": 0},
+    {"id": "2", "name": "mod", "permissions": "8", "position": 1}
+]
+CHANNELS = [
+    {"id": "10", "name": "info", "type": 4, "position": 0, "permission_overwrites": [overwrite("2")]},
+    {"id": "11", "name": "general", "type": 0, "position": 1, "parent_id": "10", "permission_overwrites": [
+        overwrite("1", allow=0), overwrite("2"), overwrite("77", overwrite_type=1), overwrite("3")
+    ]}
+]
+
+
+def clone(api: FakeApi) -> Dict[str, str]:
+    id_mapping: Dict[str, str] = {}
+    graph = plan_clone(Guild.from_data(SERVER_INFO, CHANNELS, ROLES), Guild({"id": TARGET_ID}), id_mapping)
+    run_graph(graph, api)
+    return id_mapping
+
+
+def test_channels_are_created_with_remapped_overwrites():
+    api = FakeApi()
+    id_mapping = clone(api)
+
+    created = api.sent("POST", f"/guilds/{TARGET_ID}/channels")
+    general = next(data for data in created if data["name"] == "general")
+    assert general["parent_id"] == id_mapping["10"]
+    # @everyone maps to the target server, members keep their ID, unknown roles are dropped
+    assert [item["id"] for item in general["permission_overwrites"]] == [TARGET_ID, id_mapping["2"], "77"]
+    assert not [call for call in api.calls if call[0] == "PUT"]
+
+
+def test_channels_wait_for_their_category_and_roles():
+    api = FakeApi()
+    clone(api)
+
+    order = [json_data.get("name") for method, _, json_data in api.calls if method == "POST"]
+    assert order.index("mod") < order.index("info") < order.index("general")
+
+
+def test_rejected_create_is_retried_without_overwrites():
+    api = FakeApi(reject=lambda method, path, json_data: (
+        method == "POST" and path.endswith("/channels") and bool(json_data.get("permission_overwrites"))
+    ))
+    id_mapping = clone(api)
+
+    general_id = id_mapping["11"]
+    puts = [path for method, path, _ in api.calls if method == "PUT" and path.startswith(f"/channels/{general_id}/")]
+    assert sorted(puts) == sorted(
+        f"/channels/{general_id}/permissions/{target_id}" for target_id in (TARGET_ID, id_mapping["2"], "77")
+    )
+
+
+def test_positions_are_synced_with_one_request_each():
+    api = FakeApi()
+    id_mapping = clone(api)
+
+    assert api.sent("PATCH", f"/guilds/{TARGET_ID}/roles") == [[{"id": id_mapping["2"], "position": 1}]]
+    assert api.sent("PATCH", f"/guilds/{TARGET_ID}/channels") == [[
+        {"id": id_mapping["10"], "position": 0, "parent_id": None},
+        {"id": id_mapping["11"], "position": 1, "parent_id": id_mapping["10"]}
+    ]]
+    # Only the @everyone permissions are patched one by one
+    single = [path for method, path, _ in api.calls if method == "PATCH" and path.count("/") > 3]
+    assert single == [f"/guilds/{TARGET_ID}/roles/{TARGET_ID}"]
+    # Each bulk update runs once everything it orders is created
+    paths = [(method, path) for method, path, _ in api.calls]
+    for kind in ("roles", "channels"):
+        bulk = paths.index(("PATCH", f"/guilds/{TARGET_ID}/{kind}"))
+        assert ("POST", f"/guilds/{TARGET_ID}/{kind}") not in paths[bulk:]
+
+
+def target_copy() -> Dict[str, List[Dict[str, Any]]]:
+    """Target objects as Discord returns them after a clone of the source."""
+    roles = [dict(ROLES[0], id=TARGET_ID), dict(ROLES[1], id="901", color=0, hoist=False, mentionable=False)]
+    category = dict(CHANNELS[0], id="902", permission_overwrites=[overwrite("901")])
+    general = dict(CHANNELS[1], id="903", parent_id="902", permission_overwrites=[
+        overwrite(TARGET_ID, allow=0), overwrite("901"), overwrite("77", overwrite_type=1)
+    ])
+    return {"roles": roles, "channels": [category, general]}
+
+
+def reconcile(api: FakeApi, target: Dict[str, List[Dict[str, Any]]]) -> None:
+    graph = plan_reconcile(
+        Guild.from_data(SERVER_INFO, CHANNELS, ROLES),
+        Guild.from_data({"id": TARGET_ID, "name": "Source"}, target["channels"], target["roles"]), {}
+    )
+    run_graph(graph, api)
+
+
+def test_reconcile_of_a_matching_target_sends_nothing():
+    api = FakeApi()
+    reconcile(api, target_copy())
+    assert api.calls == []
+
+
+def test_reconcile_patches_only_what_differs():
+    target = target_copy()
+    target["roles"][1]["permissions"] = "0"
+    target["channels"].append({"id": "904", "name": "extra", "type": 0, "position": 2})
+    api = FakeApi()
+    reconcile(api, target)
+
+    assert sorted(api.calls, key=str) == [
+        ("DELETE", "/channels/904", None),
+        ("PATCH", f"/guilds/{TARGET_ID}/roles/901", {"permissions": "8"})
+    ]
@@ -0,0 +1,74 @@
+"""Tests of the RateLimiter buckets and its 429 handling."""
+
+from requests.structures import CaseInsensitiveDict
+
+from cloner import RateLimiter, route_key
+
+API = "https://discord.com/api/v9"
+ROLES = route_key("POST", f"{API}/guilds/111/roles")
+CHANNELS = route_key("POST", f"{API}/guilds/111/channels")
+OTHER_GUILD_ROLES = route_key("POST", f"{API}/guilds/222/roles")
+
+
+def bucket_headers(bucket: str, limit: int, remaining: int, reset_after: float) -> CaseInsensitiveDict:
+    return CaseInsensitiveDict({
+        "X-RateLimit-Bucket": bucket,
+        "X-RateLimit-Limit": str(limit),
+        "X-RateLimit-Remaining": str(remaining),
+        "X-RateLimit-Reset-After": str(reset_after)
+    })
+
+
+def test_route_key_keeps_only_the_major_parameter():
+    assert route_key("patch", f"{API}/guilds/111/roles/333") == "PATCH guilds/111/roles/{id}"
+    assert route_key("GET", f"{API}/channels/444") == "GET channels/444"
+
+
+def test_unknown_route_is_not_delayed():
+    assert RateLimiter().reserve(ROLES) == 0.0
+
+
+def test_exhausted_bucket_waits_for_its_reset():
+    limiter = RateLimiter()
+    assert limiter.update(ROLES, bucket_headers("abc", 2, 1, 5.0), 200) == 0.0
+    assert limiter.known_limit(ROLES) == (2, 5.0)
+
+    assert limiter.reserve(ROLES) == 0.0
+    assert 4.0 < limiter.reserve(ROLES) <= 5.0
+
+
+def test_routes_share_a_bucket_only_with_the_same_major_parameter():
+    limiter = RateLimiter()
+    limiter.update(ROLES, bucket_headers("abc", 1, 0, 5.0), 200)
+    limiter.update(CHANNELS, bucket_headers("abc", 1, 0, 5.0), 200)
+    limiter.update(OTHER_GUILD_ROLES, bucket_headers("abc", 1, 1, 5.0), 200)
+
+    assert limiter.reserve(ROLES) > 0
+    assert limiter.reserve(CHANNELS) > 0
+    assert limiter.reserve(OTHER_GUILD_ROLES) == 0.0
+
+
+def test_route_429_blocks_only_its_bucket():
+    limiter = RateLimiter()
+    headers = bucket_headers("abc", 5, 0, 2.0)
+    headers["Retry-After"] = "2.0"
+
+    assert limiter.update(ROLES, headers, 429, {"retry_after": 2.0, "global": False}) == 2.0
+    assert 1.5 < limiter.reserve(ROLES) <= 2.0
+    assert limiter.reserve(CHANNELS) == 0.0
+
+
+def test_global_429_blocks_every_route():
+    limiter = RateLimiter()
+    headers = CaseInsensitiveDict({"X-RateLimit-Global": "true", "Retry-After": "3"})
+
+    assert limiter.update(ROLES, headers, 429, {"retry_after": 3, "global": True}) == 3.0
+    assert 2.5 < limiter.reserve(CHANNELS) <= 3.0
+    assert 2.5 < limiter.reserve(OTHER_GUILD_ROLES) <= 3.0
+
+
+def test_429_without_rate_limit_headers_counts_as_global():
+    # Cloudflare bans come without Discord's headers
+    limiter = RateLimiter()
+    assert limiter.update(ROLES, CaseInsensitiveDict({"Retry-After": "1"}), 429) == 1.0
+    assert limiter.reserve(CHANNELS) > 0
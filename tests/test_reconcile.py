@@ -0,0 +1,61 @@
+"""Tests of the object matching of reconcile clones."""
+
+from model import CATEGORY_TYPE, Channel, Guild, Overwrite, Role
+from reconcile import Reconciliation, match_objects, synced_channel_ids
+
+
+def roles_by_name(roles):
+    return lambda role: [candidate for candidate in roles if candidate.name == role.name]
+
+
+def test_match_objects_pairs_duplicates_in_position_order():
+    source = [Role("s2", "mod", position=2), Role("s1", "mod", position=1), Role("s3", "admin", position=3)]
+    target = [Role("t9", "mod", position=9), Role("t4", "mod", position=4), Role("t5", "bots", position=5)]
+
+    matches, missing, extra = match_objects(source, target, roles_by_name(target))
+
+    assert {source_id: role.id for source_id, role in matches.items()} == {"s1": "t4", "s2": "t9"}
+    assert [role.id for role in missing] == ["s3"]
+    assert [role.id for role in extra] == ["t5"]
+
+
+def test_match_objects_uses_each_target_once():
+    source = [Role("s1", "mod", position=1), Role("s2", "mod", position=2)]
+    target = [Role("t1", "mod", position=1)]
+
+    matches, missing, extra = match_objects(source, target, roles_by_name(target))
+
+    assert {source_id: role.id for source_id, role in matches.items()} == {"s1": "t1"}
+    assert [role.id for role in missing] == ["s2"]
+    assert extra == []
+
+
+def test_channels_match_only_under_the_matched_category():
+    source = Guild({"id": "1"}, [Role("1", "@everyone")], [
+        Channel("10", "info", CATEGORY_TYPE), Channel("11", "general", parent_id="10"),
+        Channel("12", "other", CATEGORY_TYPE), Channel("13", "general", parent_id="12")
+    ])
+    target = Guild({"id": "2"}, [Role("2", "@everyone")], [
+        Channel("20", "info", CATEGORY_TYPE), Channel("21", "general", parent_id="20"),
+        Channel("23", "general")
+    ])
+
+    reconciliation = Reconciliation(source, target)
+
+    assert reconciliation.id_mapping() == {"1": "2", "10": "20", "11": "21"}
+    assert sorted(channel.id for channel in reconciliation.channels_missing) == ["12", "13"]
+    assert [channel.id for channel in reconciliation.channels_extra] == ["23"]
+
+
+def test_synced_channels_have_exactly_their_category_overwrites():
+    allow_mods = Overwrite("5", allow=1024)
+    guild = Guild({"id": "1"}, [Role("1", "@everyone"), Role("5", "mod")], [
+        Channel("10", "staff", CATEGORY_TYPE, overwrites=(allow_mods, Overwrite("1", deny=1024))),
+        Channel("11", "synced", parent_id="10", overwrites=(Overwrite("1", deny=1024), Overwrite("5", allow=1024))),
+        Channel("12", "stricter", parent_id="10", overwrites=(allow_mods,)),
+        Channel("13", "no-category"),
+        Channel("14", "empty", CATEGORY_TYPE),
+        Channel("15", "inherits-nothing", parent_id="14")
+    ])
+
+    assert synced_channel_ids(guild) == {"11", "15"}
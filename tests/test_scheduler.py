@@ -0,0 +1,103 @@
+"""Tests of the TaskGraph ordering and critical path."""
+
+from typing import List
+
+import pytest
+
+from scheduler import Task, TaskGraph, run_graph
+
+
+def task(key: str, deps: List[str] = ()) -> Task:
+    return Task(key, "POST", lambda: (f"/{key}", None), deps)
+
+
+def run(graph: TaskGraph, workers: int = 1) -> List[str]:
+    order: List[str] = []
+    run_graph(graph, lambda method, path, json_data, name: order.append(path[1:]) or {"id": path[1:]}, workers)
+    return order
+
+
+def test_tasks_start_only_after_their_dependencies():
+    graph = TaskGraph()
+    graph.add(task("channel", ["category", "role"]))
+    graph.add(task("category"))
+    graph.add(task("role"))
+    graph.add(task("positions", ["channel"]))
+
+    order = run(graph)
+    assert sorted(order) == ["category", "channel", "positions", "role"]
+    assert order.index("channel") > order.index("category")
+    assert order.index("channel") > order.index("role")
+    assert order[-1] == "positions"
+
+
+def test_concurrent_workers_keep_the_order():
+    graph = TaskGraph()
+    for index in range(20):
+        graph.add(task(f"role-{index}"))
+        graph.add(task(f"channel-{index}", [f"role-{index}"]))
+
+    order = run(graph, workers=4)
+    assert len(order) == 40
+    for index in range(20):
+        assert order.index(f"channel-{index}") > order.index(f"role-{index}")
+
+
+def test_ready_ignores_dependencies_outside_the_graph():
+    graph = TaskGraph()
+    graph.add(task("a", ["missing"]))
+    assert [ready.key for ready in graph.ready()] == ["a"]
+
+
+def test_follow_ups_delay_dependents():
+    graph = TaskGraph()
+    graph.add(Task("create", "POST", lambda: ("/create", None), on_result=lambda result: [task("overwrite")]))
+    graph.add(task("sync", ["create"]))
+
+    assert run(graph) == ["create", "overwrite", "sync"]
+    assert "overwrite" in graph.tasks["sync"].deps
+
+
+def test_a_failing_callback_fails_only_its_task():
+    def on_result(result):
+        raise KeyError("id")
+
+    graph = TaskGraph()
+    graph.add(Task("create", "POST", lambda: ("/create", None), on_result=on_result))
+    graph.add(task("sync", ["create"]))
+    finished = []
+    graph.listeners.append(lambda done, result: finished.append((done.key, result)))
+
+    assert run(graph) == ["create", "sync"]
+    assert graph.tasks["create"].result is None and not graph.tasks["create"].skipped
+    assert finished == [("create", None), ("sync", {"id": "sync"})]
+
+
+def test_duplicate_keys_and_cycles_are_rejected():
+    graph = TaskGraph()
+    graph.add(task("a", ["b"]))
+    with pytest.raises(ValueError):
+        graph.add(task("a"))
+    graph.add(task("b", ["a"]))
+    with pytest.raises(ValueError):
+        graph.ready()
+
+
+def test_critical_path_follows_the_longest_chain():
+    graph = TaskGraph()
+    durations = {"role": 1.0, "category": 3.0, "channel": 2.0, "emoji": 4.5}
+    graph.add(task("role"))
+    graph.add(task("category"))
+    graph.add(task("channel", ["role", "category"]))
+    graph.add(task("emoji"))
+    for key, duration in durations.items():
+        graph.tasks[key].started_at = 10.0
+        graph.tasks[key].finished_at = 10.0 + duration
+
+    total, path = graph.critical_path()
+    assert total == pytest.approx(5.0)
+    assert path == ["category", "channel"]
+
+
+def test_critical_path_of_an_empty_graph():
+    assert TaskGraph().critical_path() == (0.0, [])
@@ -0,0 +1,77 @@
+"""Tests of writing and reading guild snapshots."""
+
+import gzip
+import json
+import os
+
+import pytest
+
+from snapshot import SNAPSHOT_VERSION, SnapshotError, read_snapshot, write_snapshot
+
+SERVER_INFO = {"id": "1", "name": "Source", "icon": "abc"}
+ROLES = [{"id": "1", "name": "@everyone", "permissions": "0"}, {"id": "2", "name": "mod", "permissions": "8"}]
+CHANNELS = [{"id": "10", "name": "general", "type": 0, "permission_overwrites": [
+    {"id": "2", "type": 0, "allow": "1024", "deny": "0"}
+]}]
+EMOJIS = [{"id": "30", "name": "wave", "animated": False}]
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / "guild.jsonl.gz")
+    assets = iter([("emojis/30.png", "data:image/png;base64,AAAA")])
+
+    write_snapshot(path, SERVER_INFO, CHANNELS, ROLES, EMOJIS, assets)
+    snapshot = read_snapshot(path)
+
+    assert snapshot.server_info == SERVER_INFO
+    assert snapshot.roles == ROLES
+    assert snapshot.channels == CHANNELS
+    assert snapshot.emojis == EMOJIS
+    assert snapshot.assets == {"emojis/30.png": "data:image/png;base64,AAAA"}
+    assert snapshot.created_at
+    assert os.listdir(str(tmp_path)) == ["guild.jsonl.gz"]
+
+
+def write_lines(path, records):
+    with gzip.open(path, "wt", encoding="utf-8") as file:
+        for record in records:
+            file.write(json.dumps(record) + "\n")
+
+
+def test_unknown_records_are_skipped(tmp_path):
+    path = str(tmp_path / "guild.jsonl.gz")
+    write_lines(path, [
+        {"format": "discord-guild-snapshot", "version": SNAPSHOT_VERSION},
+        {"type": "server", "data": SERVER_INFO},
+        {"type": "sticker", "data": {"id": "40"}}
+    ])
+
+    assert read_snapshot(path).server_info == SERVER_INFO
+
+
+@pytest.mark.parametrize("records", [
+    [{"format": "something-else", "version": 1}, {"type": "server", "data": SERVER_INFO}],
+    [{"format": "discord-guild-snapshot", "version": SNAPSHOT_VERSION + 1}, {"type": "server", "data": SERVER_INFO}],
+    [{"format": "discord-guild-snapshot", "version": SNAPSHOT_VERSION}],
+    []
+])
+def test_invalid_snapshots_are_rejected(tmp_path, records):
+    path = str(tmp_path / "guild.jsonl.gz")
+    write_lines(path, records)
+
+    with pytest.raises(SnapshotError):
+        read_snapshot(path)
+
+
+def test_truncated_and_missing_files_are_rejected(tmp_path):
+    path = str(tmp_path / "guild.jsonl.gz")
+    write_snapshot(path, SERVER_INFO, CHANNELS, ROLES, EMOJIS)
+    with open(path, "rb") as file:
+        data = file.read()
+    with open(path, "wb") as file:
+        file.write(data[:len(data) // 2])
+
+    with pytest.raises(SnapshotError):
+        read_snapshot(path)
+    with pytest.raises(SnapshotError):
+        read_snapshot(str(tmp_path / "missing.jsonl.gz"))
@@ -0,0 +1,120 @@
+"""Tests of the write-through state cache."""
+
+from model import CATEGORY_TYPE, Channel, Emoji, Guild, Overwrite, Role
+from state import StateCache
+
+
+def guild() -> Guild:
+    return Guild(
+        {"id": "1", "name": "Server"},
+        [Role("1", "@everyone"), Role("2", "mod", position=1)],
+        [Channel("10", "info", CATEGORY_TYPE), Channel("11", "general", parent_id="10")],
+        [Emoji("30", "wave")]
+    )
+
+
+def test_apply_follows_creates_updates_and_deletes():
+    cache = StateCache()
+    state = cache.put(guild())
+
+    cache.record("POST", "/guilds/1/roles", {"name": "admin"}, {"id": "3", "name": "admin", "permissions": "8"})
+    cache.record("PATCH", "/guilds/1/roles/2", {"name": "moderator"}, {"id": "2", "name": "moderator"})
+    cache.record("DELETE", "/guilds/1/emojis/30", None, 204)
+    cache.record("PUT", "/channels/11/permissions/2", {"type": 0, "allow": "1024", "deny": "0"}, 204)
+    cache.record("PATCH", "/guilds/1", {"name": "Renamed"}, {"id": "1", "name": "Renamed"})
+
+    snapshot = state.snapshot()
+    assert snapshot.name == "Renamed"
+    assert snapshot.roles["3"].permissions == 8
+    assert snapshot.roles["2"].name == "moderator"
+    assert snapshot.emojis == {}
+    assert [overwrite.key() for overwrite in snapshot.channels["11"].overwrites] == [("2", 0, 1024, 0)]
+    assert state.writes == 5
+
+
+def test_apply_ignores_other_servers_and_failed_deletes():
+    state = StateCache().put(guild())
+
+    assert not state.apply("POST", "/guilds/9/roles", {}, {"id": "3", "name": "admin"})
+    assert not state.apply("DELETE", "/guilds/1/roles/99", None, 204)
+    assert state.writes == 0
+
+
+def test_position_sync_with_lock_permissions_copies_the_new_category_overwrites():
+    source = guild()
+    source.add_channel(Channel("12", "rules", CATEGORY_TYPE, overwrites=(Overwrite("2", allow=1024),)))
+    state = StateCache().put(source)
+
+    state.apply("PATCH", "/guilds/1/channels",
+                [{"id": "11", "position": 3, "parent_id": "12", "lock_permissions": True}], 204)
+
+    channel = state.snapshot().channels["11"]
+    assert (channel.position, channel.parent_id) == (3, "12")
+    assert [overwrite.key() for overwrite in channel.overwrites] == [("2", 0, 1024, 0)]
+
+
+def test_lock_permissions_without_a_parent_change_keeps_the_overwrites():
+    source = guild()
+    source.add_channel(Channel("10", "info", CATEGORY_TYPE, overwrites=(Overwrite("2", allow=1024),)))
+    state = StateCache().put(source)
+
+    state.apply("PATCH", "/guilds/1/channels", [{"id": "11", "position": 3, "lock_permissions": True}], 204)
+
+    channel = state.snapshot().channels["11"]
+    assert channel.position == 3
+    assert channel.overwrites == ()
+
+
+def test_snapshots_do_not_change_with_later_writes():
+    state = StateCache().put(guild())
+    before = state.snapshot()
+    state.apply("DELETE", "/guilds/1/channels/11", None, {"id": "11"})
+    assert "11" in before.channels
+    assert "11" not in state.snapshot().channels
+
+
+def test_drift_lists_changes_made_outside_the_cloner():
+    state = StateCache().put(guild())
+    state.apply("POST", "/guilds/1/roles", {}, {"id": "3", "name": "admin"})
+
+    fresh = guild()
+    fresh.add_role(Role("3", "admin"))
+    assert state.drift(fresh) == {}
+
+    fresh.add_role(Role("2", "renamed", position=1))
+    fresh.remove_channel("11")
+    fresh.add_emoji(Emoji("31", "new"))
+    fresh.info["name"] = "Other"
+
+    assert state.drift(fresh) == {
+        "roles_changed": ["2"],
+        "channels_removed": ["11"],
+        "emojis_added": ["31"],
+        "server_changed": ["1"]
+    }
+
+
+def test_find_created_claims_an_unknown_object_once():
+    cache = StateCache()
+    cache.put(guild())
+    body = {"name": "admin", "permissions": "8", "color": 0, "hoist": False, "mentionable": False}
+    listed = [role.to_dict() for role in guild().roles.values()]
+    listed.append({"id": "3", "name": "admin", "permissions": "8", "color": 0, "hoist": False,
+                   "mentionable": False, "position": 2})
+
+    with cache.creating("POST", "/guilds/1/roles", body), cache.checking("/guilds/1/roles", body):
+        assert cache.awaiting_response("/guilds/1/roles", body) == 0
+        safe, created = cache.find_created("/guilds/1/roles", body, listed)
+
+    assert (safe, created["id"]) == (False, "3")
+    assert cache.find_created("/guilds/1/roles", body, listed) == (True, None)
+
+
+def test_find_created_does_not_guess_between_candidates():
+    cache = StateCache()
+    cache.put(guild())
+    body = {"name": "mod", "permissions": "0", "color": 0, "hoist": False, "mentionable": False}
+    listed = [dict(Role(role_id, "mod").to_dict()) for role_id in ("3", "4")]
+
+    with cache.creating("POST", "/guilds/1/roles", body), cache.checking("/guilds/1/roles", body):
+        assert cache.find_created("/guilds/1/roles", body, listed) == (False, None)
@@ -0,0 +1,55 @@
+"""Tests of cloning one source into many targets."""
+
+import threading
+
+import cloner
+from assets import AssetFetcher
+from cloner import CloneResult, clone_to_targets
+from model import Guild, Role
+
+SOURCE = Guild({"id": "1", "name": "Source"}, [Role("1", "@everyone")])
+
+
+def test_source_is_loaded_once_and_failures_are_isolated(monkeypatch):
+    loads = []
+    applied = []
+    lock = threading.Lock()
+
+    def load_source(client, source_server_id, *args):
+        loads.append(source_server_id)
+        return SOURCE
+
+    def apply_clone(client, source, target_server_id, *args, **kwargs):
+        with lock:
+            applied.append((target_server_id, source))
+        if target_server_id == "3":
+            raise RuntimeError("target went away")
+        return CloneResult(target_server_id, success=True, operations=4)
+
+    monkeypatch.setattr(cloner, "load_source", load_source)
+    monkeypatch.setattr(cloner, "apply_clone", apply_clone)
+
+    with AssetFetcher() as assets:
+        results = clone_to_targets(None, "1", ["2", "3", "4"], assets=assets, parallel_targets=2)
+
+    assert loads == ["1"]
+    assert sorted(target_id for target_id, _ in applied) == ["2", "3", "4"]
+    assert all(source is SOURCE for _, source in applied)
+    assert [(result.target_server_id, result.success) for result in results] == [
+        ("2", True), ("3", False), ("4", True)
+    ]
+    assert results[1].error == "target went away"
+
+
+def test_no_clone_without_a_source(monkeypatch):
+    def apply_clone(*args, **kwargs):
+        raise AssertionError("nothing to apply")
+
+    monkeypatch.setattr(cloner, "load_source", lambda *args: None)
+    monkeypatch.setattr(cloner, "apply_clone", apply_clone)
+
+    results = clone_to_targets(None, "1", ["2", "3"])
+
+    assert [(result.target_server_id, result.success) for result in results] == [("2", False), ("3", False)]
+    assert all(result.error for result in results)
+
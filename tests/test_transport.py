@@ -0,0 +1,70 @@
+"""Tests of recording a clone to a cassette and replaying it offline."""
+
+import os
+
+import pytest
+
+import main
+
+from assets import AssetFetcher
+from cloner import TOKEN_ENV_VAR, DiscordClient, RateLimiter, clone_server
+from metrics import Metrics
+from mock_discord import MockDiscordServer
+from transport import CassetteError, CassettePlayer, CassetteRecorder, read_cassette
+
+
+def clone(base_url: str, cdn_base_url: str, transport, source_id: str, target_id: str) -> bool:
+    with DiscordClient(
+        "test", base_url=base_url, rate_limiter=RateLimiter(), metrics=Metrics(), transport=transport
+    ) as client, AssetFetcher(cdn_base_url, transport=transport) as assets:
+        return clone_server(client, source_id, target_id, None, assets=assets)
+
+
+def test_replay_answers_every_request_from_the_cassette(tmp_path):
+    path = str(tmp_path / "clone.cassette")
+    with MockDiscordServer() as server:
+        source_id = server.state.add_guild("Source", 6, 3, 2, 1)
+        target_id = server.state.add_guild("Target", 0, 0)
+        with CassetteRecorder(path) as recorder:
+            assert clone(server.api_base_url, server.base_url, recorder, source_id, target_id)
+        base_url, cdn_base_url = server.api_base_url, server.base_url
+        sent = sum(server.state.calls.values())
+
+    # The mock is gone, so every answer has to come from the cassette
+    interactions = read_cassette(path)
+    assert len(interactions) == recorder.recorded == sent + 1  # and the emoji download from the CDN
+
+    player = CassettePlayer(interactions, realtime=False)
+    assert clone(base_url, cdn_base_url, player, source_id, target_id)
+    assert player.served == {"exact": len(interactions), "repeated": 0, "path": 0, "missing": 0}
+
+
+def test_replay_leaves_the_journal_of_the_recorded_clone_alone(tmp_path, monkeypatch):
+    # Journals and cached images go to the working directory
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv(TOKEN_ENV_VAR, "test")
+    monkeypatch.setattr(os, "system", lambda command: 0)
+    path = str(tmp_path / "clone.cassette")
+    with MockDiscordServer() as server:
+        source_id = server.state.add_guild("Source", 6, 3, 2, 1)
+        target_id = server.state.add_guild("Target", 0, 0)
+        answers = [source_id, target_id, "1", "no", "no", "no"]
+        monkeypatch.setattr("builtins.input", lambda prompt: answers.pop(0))
+        main.main(["--record", path, "--api-base-url", server.api_base_url, "--cdn-base-url", server.base_url])
+        assert not answers
+
+    journal = tmp_path / main.journal_path(target_id)
+    recorded = journal.read_bytes()
+    answers = [source_id, target_id, "1", "no", "no", "no"]
+    main.main(["--replay", path, "--replay-speed", "fast"])
+
+    assert not answers
+    assert journal.read_bytes() == recorded
+    assert os.listdir(str(journal.parent)) == [journal.name]
+
+
+def test_unreadable_cassettes_are_rejected(tmp_path):
+    path = tmp_path / "broken.cassette"
+    path.write_bytes(b"not a cassette")
+    with pytest.raises(CassetteError):
+        CassettePlayer.from_file(str(path))
@@ -0,0 +1,367 @@
+"""
+Record and replay HTTP transports for the Discord Server Cloner.
+
+DiscordClient and AssetFetcher send every request through a requests
+transport adapter, pooled live connections by default. CassetteRecorder
+is a live adapter that also writes each request and its response, with
+the rate limit headers and timing, to a cassette file. CassettePlayer
+answers requests from a cassette without any network, either taking as
+long as the recorded responses did or as fast as possible, so clones of
+a production-shaped server can be profiled and compared offline:
+
+    python main.py --record clone.cassette
+    python main.py --replay clone.cassette --replay-speed fast
+
+A cassette is a gzip-compressed JSON Lines file like a snapshot: a
+versioned header, then one interaction per line. Request bodies are only
+kept as hashes, and request headers (with the bot token) are not kept.
+"""
+
+import base64
+import gzip
+import hashlib
+import io
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.client import responses as HTTP_REASONS
+from typing import Optional, Dict, List, Any, Set, Tuple
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+CASSETTE_FORMAT = "discord-http-cassette"
+CASSETTE_VERSION = 1
+
+DEFAULT_POOL_SIZE = 50
+
+# Response headers that describe the recorded bytes on the wire, not the content kept
+SKIPPED_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "connection", "set-cookie"}
+
+# Request errors that are recorded and raised again on replay
+REPLAYED_ERRORS = {
+    error.__name__: error for error in (
+        requests.exceptions.ConnectTimeout,
+        requests.exceptions.ReadTimeout,
+        requests.exceptions.Timeout,
+        requests.exceptions.ConnectionError
+    )
+}
+
+
+class CassetteError(Exception):
+    """Raised when a cassette file is missing, corrupt or of an unknown version."""
+
+
+def request_key(request: requests.PreparedRequest) -> Tuple[str, str, str]:
+    """
+    Get the key a request is matched on.
+
+    The host is left out, so a cassette recorded against one API base URL
+    replays against another, e.g. a local mock.
+
+    Args:
+        request: Request as sent
+
+    Returns:
+        Tuple of (method, path with query, hash of the body)
+    """
+    url = urlparse(request.url)
+    path = f"{url.path}?{url.query}" if url.query else url.path
+    body = request.body or b""
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    return request.method.upper(), path, hashlib.sha256(body).hexdigest()
+
+
+class CassetteRecorder(BaseAdapter):
+    """
+    Live transport that records every interaction to a cassette.
+
+    The cassette is written under a temporary name and moved into place by
+    save(), or when the recorder is used as a context manager, on exit. No
+    cassette is written if no request was sent.
+    """
+
+    def __init__(self, path: str, pool_size: int = DEFAULT_POOL_SIZE, inner: Optional[BaseAdapter] = None) -> None:
+        """
+        Create a recorder.
+
+        Args:
+            path: Cassette file to write
+            pool_size: Maximum number of pooled connections of the default
+                inner adapter
+            inner: Adapter sending the requests, pooled connections by default
+        """
+        super().__init__()
+        self.path = path
+        self.inner = inner or HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.recorded = 0
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self._temporary_path = f"{path}.tmp"
+        self._file: Optional[Any] = None
+        self._saved = False
+
+    def _write(self, record: Dict[str, Any]) -> None:
+        if self._file is None:
+            # Opened on first use, so a run that sends nothing leaves no file behind
+            self._file = gzip.open(self._temporary_path, "wt", encoding="utf-8")
+            self._write({
+                "format": CASSETTE_FORMAT,
+                "version": CASSETTE_VERSION,
+                "created_at": datetime.now(timezone.utc).isoformat()
+            })
+        self._file.write(json.dumps(record, separators=(",", ":")) + "\n")
+
+    def send(self, request: requests.PreparedRequest, **kwargs: Any) -> requests.Response:
+        """Send a request with the inner adapter and record it with its response or error."""
+        method, path, body_hash = request_key(request)
+        record: Dict[str, Any] = {"method": method, "path": path, "body": body_hash}
+        started = time.monotonic()
+        try:
+            response = self.inner.send(request, **kwargs)
+            # Read streamed downloads now, the response keeps the content for its reader
+            content = response.content
+        except requests.exceptions.RequestException as e:
+            record.update(started=round(started - self._started, 6),
+                          elapsed=round(time.monotonic() - started, 6), error=type(e).__name__)
+            self._record(record)
+            raise
+
+        record.update(
+            started=round(started - self._started, 6),
+            elapsed=round(time.monotonic() - started, 6),
+            status=response.status_code,
+            headers={name: value for name, value in response.headers.items() if name.lower() not in SKIPPED_HEADERS}
+        )
+        try:
+            record["content"] = content.decode("utf-8")
+        except UnicodeDecodeError:
+            record["content_base64"] = base64.b64encode(content).decode("ascii")
+        self._record(record)
+        return response
+
+    def _record(self, record: Dict[str, Any]) -> None:
+        with self._lock:
+            if self._saved:
+                return
+            self._write(record)
+            self.recorded += 1
+
+    def close(self) -> None:
+        """Close the pooled connections. The cassette stays open until save()."""
+        self.inner.close()
+
+    def save(self) -> None:
+        """Finish the cassette and move it into place."""
+        with self._lock:
+            if self._saved or self._file is None:
+                return
+            self._saved = True
+            self._file.close()
+        os.replace(self._temporary_path, self.path)
+        logging.info(f"Recorded {self.recorded} requests to {self.path}.")
+
+    def __enter__(self) -> "CassetteRecorder":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.save()
+
+
+def read_cassette(path: str) -> List[Dict[str, Any]]:
+    """
+    Read the interactions of a cassette file.
+
+    Args:
+        path: File to read
+
+    Returns:
+        Interactions in the order they were recorded
+
+    Raises:
+        CassetteError: If the file cannot be read, is not a cassette or was
+            written by a newer version
+    """
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as file:
+            header = json.loads(file.readline() or "null")
+            if not isinstance(header, dict) or header.get("format") != CASSETTE_FORMAT:
+                raise CassetteError(f"{path} is not an HTTP cassette.")
+            if header.get("version", 0) > CASSETTE_VERSION:
+                raise CassetteError(
+                    f"{path} is cassette version {header['version']}, "
+                    f"only versions up to {CASSETTE_VERSION} are supported."
+                )
+            return [json.loads(line) for line in file]
+    except (OSError, EOFError, ValueError) as e:
+        raise CassetteError(f"Could not read cassette {path}: {e}")
+
+
+class CassettePlayer(BaseAdapter):
+    """
+    Offline transport answering requests from a recorded cassette.
+
+    A request gets the next unused recorded response of the same method,
+    path and body. Once those are used up the last one is repeated, and a
+    request that was never recorded with that body gets an unused response
+    of the same method and path, so a changed cloner can still be replayed
+    and compared. Requests that were not recorded at all get a 404. Thread-
+    safe, so both engines can replay concurrently.
+    """
+
+    def __init__(self, interactions: List[Dict[str, Any]], realtime: bool = True) -> None:
+        """
+        Create a player.
+
+        Args:
+            interactions: Recorded interactions, from read_cassette()
+            realtime: Take as long as each recorded response did and keep the
+                recorded rate limit waits. False answers at once and clears
+                the waits, for request counts and CPU time.
+        """
+        super().__init__()
+        self.interactions = interactions
+        self.realtime = realtime
+        self.served: Dict[str, int] = {"exact": 0, "repeated": 0, "path": 0, "missing": 0}
+        self._lock = threading.Lock()
+        self._by_request: Dict[Tuple[str, str, str], List[int]] = {}
+        self._by_path: Dict[Tuple[str, str], List[int]] = {}
+        self._next: Dict[Tuple[str, str, str], int] = {}
+        self._used: Set[int] = set()
+        for index, interaction in enumerate(interactions):
+            method, path = interaction["method"], interaction["path"]
+            self._by_request.setdefault((method, path, interaction["body"]), []).append(index)
+            self._by_path.setdefault((method, path), []).append(index)
+        self._started_at = time.monotonic()
+        self._cpu_started_at = time.process_time()
+
+    @classmethod
+    def from_file(cls, path: str, realtime: bool = True) -> "CassettePlayer":
+        """
+        Create a player for a cassette file.
+
+        Args:
+            path: Cassette file
+            realtime: See __init__
+
+        Returns:
+            New player
+
+        Raises:
+            CassetteError: If the cassette cannot be read
+        """
+        return cls(read_cassette(path), realtime)
+
+    def _match(self, method: str, path: str, body_hash: str) -> Tuple[Optional[Dict[str, Any]], str]:
+        with self._lock:
+            key = (method, path, body_hash)
+            indexes = self._by_request.get(key)
+            if indexes:
+                position = self._next.get(key, 0)
+                while position < len(indexes) and indexes[position] in self._used:
+                    position += 1
+                if position < len(indexes):
+                    self._next[key] = position + 1
+                    self._used.add(indexes[position])
+                    return self.interactions[indexes[position]], "exact"
+                return self.interactions[indexes[-1]], "repeated"
+
+            for index in self._by_path.get((method, path), []):
+                if index not in self._used:
+                    self._used.add(index)
+                    return self.interactions[index], "path"
+            return None, "missing"
+
+    def send(self, request: requests.PreparedRequest, **kwargs: Any) -> requests.Response:
+        """Answer a request with its recorded response, or raise its recorded error."""
+        method, path, body_hash = request_key(request)
+        interaction, kind = self._match(method, path, body_hash)
+        with self._lock:
+            self.served[kind] += 1
+        if interaction is None:
+            logging.debug(f"No recorded response for {method} {path}.")
+            return self._build(request, 404, {}, json.dumps({"message": "Not in the cassette", "code": 0}).encode(), 0.0)
+
+        elapsed = interaction.get("elapsed", 0.0)
+        if self.realtime and elapsed:
+            time.sleep(elapsed)
+        if "error" in interaction:
+            raise REPLAYED_ERRORS.get(interaction["error"], requests.exceptions.ConnectionError)(
+                f"Recorded {interaction['error']}", request=request
+            )
+
+        headers = dict(interaction.get("headers") or {})
+        if "content_base64" in interaction:
+            content = base64.b64decode(interaction["content_base64"])
+        else:
+            content = (interaction.get("content") or "").encode("utf-8")
+        if not self.realtime:
+            headers, content = self._without_waits(interaction["status"], headers, content)
+        return self._build(request, interaction["status"], headers, content, elapsed)
+
+    @staticmethod
+    def _without_waits(status: int, headers: Dict[str, str], content: bytes) -> Tuple[Dict[str, str], bytes]:
+        """Clear the rate limit waits of a response, keeping its limits and bucket."""
+        headers = {
+            name: "0" if name.lower() in ("x-ratelimit-reset-after", "retry-after") else value
+            for name, value in headers.items()
+        }
+        if status == 429:
+            try:
+                body = json.loads(content)
+                if isinstance(body, dict) and "retry_after" in body:
+                    body["retry_after"] = 0
+                    content = json.dumps(body).encode("utf-8")
+            except ValueError:
+                pass
+        return headers, content
+
+    def _build(
+        self,
+        request: requests.PreparedRequest,
+        status: int,
+        headers: Dict[str, str],
+        content: bytes,
+        elapsed: float
+    ) -> requests.Response:
+        response = requests.Response()
+        response.status_code = status
+        response.reason = HTTP_REASONS.get(status, "")
+        response.headers = CaseInsensitiveDict(headers)
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.raw = io.BytesIO(content)
+        response.url = request.url
+        response.request = request
+        response.elapsed = timedelta(seconds=elapsed)
+        response.connection = self
+        return response
+
+    def close(self) -> None:
+        """Nothing to close, the player makes no connections."""
+
+    def log_summary(self) -> None:
+        """Log how the requests were answered and the time they took to replay."""
+        with self._lock:
+            served = dict(self.served)
+            unused = len(self.interactions) - len(self._used)
+        wall_time = time.monotonic() - self._started_at
+        cpu_time = time.process_time() - self._cpu_started_at
+        logging.info(
+            f"Replayed {sum(served.values())} requests in {wall_time:.2f}s ({cpu_time:.2f}s CPU): "
+            f"{served['exact']} as recorded, {served['repeated']} repeated, {served['path']} with another body, "
+            f"{served['missing']} not in the cassette. {unused} recorded responses were not used."
+        )
+
+    def __enter__(self) -> "CassettePlayer":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.log_summary()